@@ -0,0 +1,297 @@
+"""
+Approximate nearest neighbour index types for the vector stores, and a tuning utility.
+
+The flat index compares a query with every vector, so query time grows with
+the corpus. HNSW and IVF(-PQ) indexes trade a little recall for much faster
+queries on large corpora; `tune` reports that trade-off against the flat index.
+
+Usage:
+    python -m src.utils.ann_index tune [artifact_dir] [--k 10] [--queries 500]
+    python -m src.utils.ann_index tune --synthetic 200000 --dim 1536
+"""
+import sys
+import time
+import logging
+import argparse
+
+import faiss
+import numpy as np
+
+from typing import List, Dict, Any, Optional
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+VECTOR_DTYPE = np.float32
+# INDEX TYPES
+FLAT_INDEX = 'flat'
+HNSW_INDEX = 'hnsw'
+IVF_INDEX = 'ivf'
+IVFPQ_INDEX = 'ivfpq'
+# DEFAULT PARAMETERS
+HNSW_M = 32  # graph neighbours per vector
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+PQ_NBITS = 8
+PQ_DIMS_PER_SUBQUANTIZER = 16
+MIN_POINTS_PER_CENTROID = 39  # faiss warns below this many training points per cluster
+
+
+def _as_array(vectors) -> np.ndarray:
+    return np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE)
+
+
+def default_nlist(n_vectors: int) -> int:
+    """The usual number of IVF lists, about 4 sqrt(n), capped so every list can be trained."""
+    return int(max(1, min(4 * np.sqrt(n_vectors), n_vectors // MIN_POINTS_PER_CENTROID)))
+
+
+def default_pq_m(dim: int) -> int:
+    """The number of PQ sub-quantizers: about one per 16 dimensions, dividing the dimension."""
+    m = max(1, dim // PQ_DIMS_PER_SUBQUANTIZER)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_flat_index(vectors: np.ndarray) -> faiss.Index:
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+def build_hnsw_index(
+        vectors: np.ndarray,
+        M: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+) -> faiss.Index:
+    index = faiss.IndexHNSWFlat(vectors.shape[1], M)
+    index.hnsw.efConstruction = ef_construction
+    index.hnsw.efSearch = ef_search
+    index.add(vectors)
+    return index
+
+
+def build_ivf_index(
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        nprobe: int = IVF_NPROBE,
+) -> faiss.Index:
+    nlist = nlist or default_nlist(len(vectors))
+    quantizer = faiss.IndexFlatL2(vectors.shape[1])
+    index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist)
+    index.train(vectors)
+    index.add(vectors)
+    index.make_direct_map()  # so vectors can be reconstructed, e.g. to save the store
+    index.nprobe = min(nprobe, nlist)
+    return index
+
+
+def build_ivfpq_index(
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        m: Optional[int] = None,
+        nbits: int = PQ_NBITS,
+        nprobe: int = IVF_NPROBE,
+) -> faiss.Index:
+    if len(vectors) < 2 ** nbits:
+        raise ValueError(
+            f"IVF-PQ with {nbits} bit codes needs at least {2 ** nbits} vectors to train, got {len(vectors)}."
+        )
+    nlist = nlist or default_nlist(len(vectors))
+    quantizer = faiss.IndexFlatL2(vectors.shape[1])
+    index = faiss.IndexIVFPQ(quantizer, vectors.shape[1], nlist, m or default_pq_m(vectors.shape[1]), nbits)
+    index.train(vectors)
+    index.add(vectors)
+    index.make_direct_map()  # so vectors can be reconstructed, e.g. to save the store
+    index.nprobe = min(nprobe, nlist)
+    return index
+
+
+INDEX_BUILDERS = {
+    FLAT_INDEX: build_flat_index,
+    HNSW_INDEX: build_hnsw_index,
+    IVF_INDEX: build_ivf_index,
+    IVFPQ_INDEX: build_ivfpq_index,
+}
+
+
+def build_index(vectors, index_type: str = FLAT_INDEX, **params) -> faiss.Index:
+    """
+    Build a faiss index of a type over vectors.
+
+    :param vectors: The (n, dim) vectors.
+    :param index_type: One of INDEX_BUILDERS: 'flat', 'hnsw', 'ivf' or 'ivfpq'.
+    :param params: Builder parameters, e.g. M and ef_search for HNSW, nlist, m and nprobe for IVF(-PQ).
+    :return: The index, holding the vectors in input order.
+    :raises KeyError: If the index type is not supported.
+    """
+    if index_type not in INDEX_BUILDERS.keys():
+        raise KeyError(
+            f"The following index types: {list(INDEX_BUILDERS.keys())} are supported. "
+            f"Not {index_type}"
+        )
+    return INDEX_BUILDERS[index_type](_as_array(vectors), **params)
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Set the query time parameters of an index, ignoring those the index type does not have.
+
+    :param index: The faiss index.
+    :param nprobe: The number of IVF lists visited per query.
+    :param ef_search: The HNSW candidate list size per query.
+    """
+    index = faiss.downcast_index(index)
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def rebuild_vector_store(vector_store: Any, index_type: str = FLAT_INDEX, **params) -> Any:
+    """
+    Replace the index of a langchain FAISS vector store, built over the vectors it holds.
+
+    :param vector_store: The FAISS vector store, with an index that can reconstruct its vectors.
+    :param index_type: The new index type, see `build_index`.
+    :param params: Builder parameters, see `build_index`.
+    :return: The same vector store, now searching the new index.
+    """
+    if index_type == FLAT_INDEX and isinstance(vector_store.index, faiss.IndexFlat):
+        return vector_store
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    vector_store.index = build_index(vectors, index_type, **params)
+    logger.info(f'Built a {index_type} index over {len(vectors)} vectors.')
+    return vector_store
+
+
+def _latencies(index: faiss.Index, queries: np.ndarray, k: int) -> np.ndarray:
+    """Per query latencies in milliseconds, one query at a time as ContextRetrieval queries."""
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        index.search(queries[i:i + 1], k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    """The mean share of the true k nearest neighbours found, per query."""
+    k = truth.shape[1]
+    return float(np.mean([len(np.intersect1d(t, f[f >= 0])) / k for t, f in zip(truth, found)]))
+
+
+DEFAULT_GRID = [
+    (FLAT_INDEX, {}, [{}]),
+    (HNSW_INDEX, {'M': HNSW_M}, [{'ef_search': ef} for ef in (16, 32, 64, 128, 256)]),
+    (IVF_INDEX, {}, [{'nprobe': nprobe} for nprobe in (1, 4, 16, 64)]),
+    (IVFPQ_INDEX, {}, [{'nprobe': nprobe} for nprobe in (4, 16, 64)]),
+]
+
+
+def tune(
+        vectors,
+        queries=None,
+        k: int = 10,
+        n_queries: int = 500,
+        grid: Optional[List] = None,
+        seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Measure recall@k against the flat index and query latency for several index settings.
+
+    :param vectors: The (n, dim) corpus vectors, e.g. `Artifact.vectors`.
+    :param queries: Optional (n_queries, dim) query vectors. Defaults to corpus vectors
+                    with a little noise added, sampled at random.
+    :param k: The number of neighbours per query.
+    :param n_queries: The number of sampled queries if `queries` is None.
+    :param grid: A list of (index type, build params, [search params, ...]) entries.
+    :param seed: The query sampling seed.
+    :return: One dict per setting with the index type, parameters, build time (s),
+             recall@k and p50 / p99 latency (ms).
+    """
+    vectors = _as_array(vectors)
+    rng = np.random.default_rng(seed)
+    if queries is None:
+        sample = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+        scale = 0.1 * np.linalg.norm(sample, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+        queries = sample + rng.standard_normal(sample.shape).astype(VECTOR_DTYPE) * scale
+    queries = _as_array(queries)
+    k = min(k, len(vectors))
+
+    _, truth = build_flat_index(vectors).search(queries, k)
+
+    results = []
+    for index_type, build_params, search_grid in (grid or DEFAULT_GRID):
+        start = time.perf_counter()
+        try:
+            index = build_index(vectors, index_type, **build_params)
+        except (ValueError, RuntimeError) as e:
+            logger.warning(f'Skipping {index_type}: {e}')
+            continue
+        build_s = time.perf_counter() - start
+
+        for search_params in search_grid:
+            set_search_params(index, **search_params)
+            _, found = index.search(queries, k)
+            latencies = _latencies(index, queries, k)
+            results.append({
+                'index': index_type,
+                'params': {**build_params, **search_params},
+                'build_s': build_s,
+                f'recall@{k}': recall_at_k(truth, found),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+            })
+    return results
+
+
+def _synthetic_vectors(n_vectors: int, dim: int, n_clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim))
+    vectors = centers[rng.integers(n_clusters, size=n_vectors)] + 0.5 * rng.standard_normal((n_vectors, dim))
+    return _as_array(vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    tune_parser = subparsers.add_parser('tune', help='Report recall@k and latency of the index types.')
+    tune_parser.add_argument('artifact_dir', nargs='?', help='Artifact whose vectors are indexed.')
+    tune_parser.add_argument('--synthetic', type=int, help='Index this many synthetic vectors instead.')
+    tune_parser.add_argument('--dim', type=int, default=1536, help='Synthetic vector dimension.')
+    tune_parser.add_argument('--k', type=int, default=10)
+    tune_parser.add_argument('--queries', type=int, default=500)
+    options = parser.parse_args(argv)
+
+    if options.artifact_dir:
+        from src.utils.artifacts import Artifact
+        vectors = Artifact(options.artifact_dir).vectors
+        if vectors is None:
+            parser.error(f"Artifact {options.artifact_dir} holds no vectors.")
+    elif options.synthetic:
+        vectors = _synthetic_vectors(options.synthetic, options.dim)
+    else:
+        parser.error("Give an artifact directory or --synthetic N.")
+
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}")
+    for row in tune(vectors, k=options.k, n_queries=options.queries):
+        params = ', '.join(f"{key}={value}" for key, value in row['params'].items())
+        print(
+            f"{row['index']:>6} {params:<24} build {row['build_s']:8.2f}s  "
+            f"recall@{options.k} {row[f'recall@{options.k}']:.3f}  "
+            f"p50 {row['p50_ms']:7.3f}ms  p99 {row['p99_ms']:7.3f}ms"
+        )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
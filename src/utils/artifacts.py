@@ -0,0 +1,504 @@
+"""
+Versioned, memory-mappable on-disk format for ingestion outputs.
+
+An artifact is a directory holding:
+    manifest.json           format version, counts, vector shape and file listing
+    chunks.bin              UTF-8 chunk texts, concatenated
+    chunks_offsets.npy      int64 byte offsets of the chunks in chunks.bin (n + 1 values)
+    chunks_metadata.json    one metadata dict per chunk
+    vectors.npy             float32 (n, dim) chunk vectors, row i belongs to chunk i
+    index.faiss             optional faiss index, only written for non-flat indexes
+    embedding_idf.npy       optional float32 IDF weights of local hashing embeddings
+    output_<key>.bin/.npy   loader output string lists, stored like the chunks
+    output.json             the remaining loader output (metadata, tables, figures)
+
+Arrays are opened with memory mapping, so opening an artifact reads next to
+nothing and processes opening the same artifact share the page cache.
+
+Usage:
+    python -m src.utils.artifacts convert [pickle_dir faiss_dir output_dir]
+"""
+import os
+import sys
+import json
+import pickle
+import shutil
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator, Union
+
+from src.utils.tables import ColumnarTable
+from src.utils.local_embeddings import HashingEmbeddings
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+FORMAT_VERSION = 1
+ARTIFACT_DIR = './data/artifact_db'
+PICKLE_DIR = './data/pickle_db'
+FAISS_DIR = './data/faiss_db'
+PICKLE_EXTENSION = '.pkl'
+INPUTS_SUFFIX = '_inputs'
+VECTOR_DTYPE = np.float32
+OFFSET_DTYPE = np.int64
+MANIFEST_FILE = 'manifest.json'
+CHUNKS_NAME = 'chunks'
+CHUNKS_METADATA_FILE = 'chunks_metadata.json'
+VECTORS_FILE = 'vectors.npy'
+INDEX_FILE = 'index.faiss'
+EMBEDDING_IDF_FILE = 'embedding_idf.npy'
+OUTPUT_FILE = 'output.json'
+OUTPUT_PREFIX = 'output_'
+# Modules whose classes are still needed to read legacy pickles, everything else is stubbed.
+PICKLE_MODULES = ('builtins', 'copyreg', 'collections', 'datetime', 'numpy', 'faiss')
+# DICT KEYS
+VERSION_KEY = "format_version"
+CREATED_KEY = "created"
+N_CHUNKS_KEY = "n_chunks"
+DIM_KEY = "dim"
+STRING_LISTS_KEY = "string_lists"
+HAS_INDEX_KEY = "has_index"
+EMBEDDINGS_KEY = "embeddings"
+DATETIME_TAG = "__datetime__"
+TABLE_TAG = "__columnar_table__"
+
+
+def _encode(value: Any) -> Any:
+    """JSON fallback for the non-JSON values found in loader outputs and metadata."""
+    if isinstance(value, datetime):
+        return {DATETIME_TAG: value.isoformat()}
+    if isinstance(value, ColumnarTable):
+        return {TABLE_TAG: {'title': value.title, 'headers': list(value.headers), 'rows': value.rows()}}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict) -> Any:
+    if DATETIME_TAG in obj:
+        return datetime.fromisoformat(obj[DATETIME_TAG])
+    if TABLE_TAG in obj:
+        table = obj[TABLE_TAG]
+        return ColumnarTable(table['headers'], table['rows'], title=table['title'])
+    return obj
+
+
+def _write_json(path: str, value: Any):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, default=_encode, ensure_ascii=False)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f, object_hook=_decode)
+
+
+def write_strings(dir_path: str, name: str, strings: List[str]):
+    """
+    Store a list of strings as one flat UTF-8 buffer plus an array of byte offsets.
+
+    :param dir_path: The directory to write to.
+    :param name: The base name of the `.bin` and `_offsets.npy` files.
+    :param strings: The strings to store.
+    """
+    offsets = np.zeros(len(strings) + 1, dtype=OFFSET_DTYPE)
+    with open(os.path.join(dir_path, f"{name}.bin"), 'wb') as f:
+        for i, string in enumerate(strings):
+            encoded = string.encode('utf-8')
+            f.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    np.save(os.path.join(dir_path, f"{name}_offsets.npy"), offsets)
+
+
+class StringBuffer(object):
+    """
+    Read-only list of strings backed by a memory-mapped buffer written with
+    `write_strings`. Strings are decoded on access only.
+    """
+
+    def __init__(self, dir_path: str, name: str):
+        """
+        Initializes the StringBuffer object.
+
+        :param dir_path: The directory holding the buffer.
+        :param name: The base name of the `.bin` and `_offsets.npy` files.
+        """
+        self._offsets = np.load(os.path.join(dir_path, f"{name}_offsets.npy"), mmap_mode='r')
+        buffer_path = os.path.join(dir_path, f"{name}.bin")
+        if os.path.getsize(buffer_path) > 0:
+            self._buffer = np.memmap(buffer_path, dtype=np.uint8, mode='r')
+        else:  # empty files cannot be memory-mapped
+            self._buffer = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("StringBuffer index out of range")
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_artifact(
+        dir_path: str,
+        chunks: Optional[List[str]] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        vectors: Optional[np.ndarray] = None,
+        loader_output: Optional[Dict[str, Any]] = None,
+        index: Any = None,
+        embeddings: Optional[HashingEmbeddings] = None,
+) -> Dict[str, Any]:
+    """
+    Write an artifact directory. The directory is written next to its final
+    location and moved into place at the end, so readers never see a partially
+    written artifact.
+
+    :param dir_path: The artifact directory. Replaced if it exists.
+    :param chunks: The chunk texts.
+    :param metadata: One metadata dict per chunk.
+    :param vectors: The (n chunks, dim) chunk vectors.
+    :param loader_output: A loader output dict, e.g. the result of `doxc_load_all`. Lists
+                          of strings are stored as flat buffers, the rest as JSON.
+    :param index: Optional faiss index over the vectors. Only stored if it is not a
+                  flat index, which is rebuilt from the vectors instead.
+    :param embeddings: Optional local hashing embeddings the vectors were made with. Their
+                       parameters and IDF weights are stored, so queries against the loaded
+                       artifact are embedded exactly like the chunks.
+    :return: The manifest.
+    :raises ValueError: If the chunks, metadata and vectors do not line up.
+    """
+    chunks = chunks or []
+    n_chunks = len(chunks)
+    if metadata is not None and len(metadata) != n_chunks:
+        raise ValueError(f"Got {len(metadata)} metadata dicts for {n_chunks} chunks.")
+    if vectors is not None and len(vectors) != n_chunks:
+        raise ValueError(f"Got {len(vectors)} vectors for {n_chunks} chunks.")
+
+    parent = os.path.dirname(os.path.abspath(dir_path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+    try:
+        write_strings(tmp_dir, CHUNKS_NAME, chunks)
+        _write_json(os.path.join(tmp_dir, CHUNKS_METADATA_FILE), metadata or [{} for _ in chunks])
+
+        dim = None
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE)
+            dim = int(vectors.shape[1]) if vectors.ndim == 2 else 0
+            np.save(os.path.join(tmp_dir, VECTORS_FILE), vectors)
+
+        has_index = False
+        if index is not None and type(index).__name__ not in ('IndexFlatL2', 'IndexFlat'):
+            import faiss
+            faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+            has_index = True
+
+        embeddings_config = None
+        if embeddings is not None:
+            embeddings_config = embeddings.config()
+            if embeddings.is_fitted:
+                np.save(os.path.join(tmp_dir, EMBEDDING_IDF_FILE), np.asarray(embeddings.idf, dtype=VECTOR_DTYPE))
+
+        string_lists, output = [], {}
+        for key, value in (loader_output or {}).items():
+            if isinstance(value, list) and all(isinstance(item, str) for item in value):
+                write_strings(tmp_dir, f"{OUTPUT_PREFIX}{key}", value)
+                string_lists.append(key)
+            else:
+                output[key] = value
+        _write_json(os.path.join(tmp_dir, OUTPUT_FILE), output)
+
+        manifest = {
+            VERSION_KEY: FORMAT_VERSION,
+            CREATED_KEY: datetime.now().isoformat(),
+            N_CHUNKS_KEY: n_chunks,
+            DIM_KEY: dim,
+            STRING_LISTS_KEY: string_lists,
+            HAS_INDEX_KEY: has_index,
+            EMBEDDINGS_KEY: embeddings_config,
+        }
+        _write_json(os.path.join(tmp_dir, MANIFEST_FILE), manifest)
+
+        if os.path.exists(dir_path):
+            old_dir = tempfile.mkdtemp(prefix='.old-', dir=parent)
+            os.replace(dir_path, os.path.join(old_dir, 'artifact'))
+            os.replace(tmp_dir, dir_path)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, dir_path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f'Wrote artifact {dir_path} with {n_chunks} chunks.')
+    return manifest
+
+
+class Artifact(object):
+    """
+    A read-only view of an artifact directory. Chunk texts and vectors are
+    memory-mapped; the JSON parts are only parsed when first accessed.
+    """
+
+    def __init__(self, dir_path: str):
+        """
+        Initializes the Artifact object.
+
+        :param dir_path: The artifact directory.
+        :raises ValueError: If the artifact was written by a newer format version.
+        """
+        self.dir_path = dir_path
+        self.manifest = _read_json(os.path.join(dir_path, MANIFEST_FILE))
+        if self.manifest[VERSION_KEY] > FORMAT_VERSION:
+            raise ValueError(
+                f"Artifact {dir_path} has format version {self.manifest[VERSION_KEY]}, "
+                f"this code reads up to version {FORMAT_VERSION}."
+            )
+        self.chunks = StringBuffer(dir_path, CHUNKS_NAME)
+        self._metadata = None
+        self._loader_output = None
+        self._embeddings = None
+
+    def __len__(self) -> int:
+        return self.manifest[N_CHUNKS_KEY]
+
+    @property
+    def metadata(self) -> List[Dict[str, Any]]:
+        """Returns the metadata dict of every chunk."""
+        if self._metadata is None:
+            self._metadata = _read_json(os.path.join(self.dir_path, CHUNKS_METADATA_FILE))
+        return self._metadata
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        """Returns the memory-mapped (n chunks, dim) float32 vectors, or None if there are none."""
+        path = os.path.join(self.dir_path, VECTORS_FILE)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
+
+    @property
+    def loader_output(self) -> Dict[str, Any]:
+        """Returns the stored loader output. String lists are memory-mapped StringBuffers."""
+        if self._loader_output is None:
+            output = _read_json(os.path.join(self.dir_path, OUTPUT_FILE))
+            for key in self.manifest[STRING_LISTS_KEY]:
+                output[key] = StringBuffer(self.dir_path, f"{OUTPUT_PREFIX}{key}")
+            self._loader_output = output
+        return self._loader_output
+
+    @property
+    def embeddings(self) -> Optional[HashingEmbeddings]:
+        """Returns the stored local embeddings with their memory-mapped IDF weights, None if none are stored."""
+        config = self.manifest.get(EMBEDDINGS_KEY)
+        if config is None:
+            return None
+        if self._embeddings is None:
+            idf_path = os.path.join(self.dir_path, EMBEDDING_IDF_FILE)
+            idf = np.load(idf_path, mmap_mode='r') if os.path.exists(idf_path) else None
+            self._embeddings = HashingEmbeddings.from_config(config, idf)
+        return self._embeddings
+
+    def query_embeddings(self, embedding: Any = None) -> Any:
+        """
+        The embeddings to query the artifact with: the stored local embeddings if there
+        are any, as other hashing embeddings would weight terms differently, else `embedding`.
+
+        :param embedding: The embeddings used for queries, e.g. OpenAIEmbeddings.
+        :return: The query embeddings.
+        :raises ValueError: If no embeddings are given or stored.
+        """
+        stored = self.embeddings
+        if stored is not None and (embedding is None or isinstance(embedding, HashingEmbeddings)):
+            return stored
+        if embedding is None:
+            raise ValueError(f"Artifact {self.dir_path} stores no embeddings, pass the query embeddings.")
+        return embedding
+
+    def load_index(self):
+        """
+        Returns the faiss index: the stored one, or a flat L2 index built from the vectors.
+        """
+        import faiss
+        index_path = os.path.join(self.dir_path, INDEX_FILE)
+        if self.manifest[HAS_INDEX_KEY]:
+            return faiss.read_index(index_path)
+        if self.manifest[DIM_KEY] is None:
+            raise ValueError(f"Artifact {self.dir_path} holds no vectors.")
+
+        index = faiss.IndexFlatL2(self.manifest[DIM_KEY])
+        if len(self):
+            index.add(np.ascontiguousarray(self.vectors))
+        return index
+
+    def to_vector_store(self, embedding: Any = None):
+        """
+        Build a langchain FAISS vector store from the artifact.
+
+        :param embedding: The embeddings used for queries, e.g. OpenAIEmbeddings. Optional
+                          if the artifact stores its embeddings, see `query_embeddings`.
+        :return: A FAISS vector store.
+        """
+        embedding = self.query_embeddings(embedding)
+        from langchain.docstore.document import Document
+        from langchain.docstore.in_memory import InMemoryDocstore
+        from langchain.vectorstores import FAISS
+
+        index_to_docstore_id = {i: str(i) for i in range(len(self))}
+        docstore = InMemoryDocstore({
+            str(i): Document(page_content=text, metadata=metadata)
+            for i, (text, metadata) in enumerate(zip(self.chunks, self.metadata))
+        })
+        return FAISS(embedding.embed_query, self.load_index(), docstore, index_to_docstore_id)
+
+
+def save_vector_store(
+        vector_store: Any,
+        dir_path: str,
+        loader_output: Optional[Dict[str, Any]] = None,
+        embeddings: Optional[HashingEmbeddings] = None,
+) -> Dict:
+    """
+    Write a langchain FAISS vector store, and optionally the loader output it was built from, as an artifact.
+
+    :param vector_store: The FAISS vector store.
+    :param dir_path: The artifact directory.
+    :param loader_output: Optional loader output dict.
+    :param embeddings: The local hashing embeddings of the store, see `write_artifact`. Taken
+                       from the store's embedding function if not given.
+    :return: The manifest.
+    """
+    if embeddings is None:
+        embeddings = getattr(vector_store.embedding_function, '__self__', None)
+        if not isinstance(embeddings, HashingEmbeddings):
+            embeddings = None
+    index = vector_store.index
+    docs = [
+        vector_store.docstore._dict[vector_store.index_to_docstore_id[i]]
+        for i in range(index.ntotal)
+    ]
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d))
+    return write_artifact(
+        dir_path,
+        chunks=[doc.page_content for doc in docs],
+        metadata=[doc.metadata for doc in docs],
+        vectors=vectors,
+        loader_output=loader_output,
+        index=index,
+        embeddings=embeddings,
+    )
+
+
+class _PickledObject(object):
+    """
+    Stand-in for the classes of a legacy pickle that cannot be imported any more
+    (e.g. embedding clients of an older openai release). Keeps the pickled state
+    so that plain attributes such as `page_content` can still be read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        self.__dict__['_state'] = state
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        state = self.__dict__.get('_state')
+        if isinstance(state, tuple):  # (dict state, slot state)
+            state = state[0] or {}
+        fields = state.get('__dict__', state) if isinstance(state, dict) else {}
+        return fields.get(name)
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+
+    def find_class(self, module: str, name: str):
+        if module.split('.')[0] in PICKLE_MODULES:
+            return super().find_class(module, name)
+        return type(name, (_PickledObject,), {'__module__': module})
+
+
+def _load_legacy_pickle(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return _LegacyUnpickler(f).load()
+
+
+def _pickle_names(dir_path: str) -> List[str]:
+    if not os.path.isdir(dir_path):
+        return []
+    return sorted(
+        os.path.splitext(file_name)[0] for file_name in os.listdir(dir_path)
+        if file_name.endswith(PICKLE_EXTENSION)
+    )
+
+
+def convert_pickles(
+        pickle_dir: str = PICKLE_DIR,
+        faiss_dir: str = FAISS_DIR,
+        output_dir: str = ARTIFACT_DIR,
+) -> List[str]:
+    """
+    Convert the legacy pickles into artifacts, one per report.
+
+    Vector stores in `faiss_dir` give the chunks, metadata and vectors; loader
+    outputs in `pickle_dir` ('<report>_inputs.pkl') are stored alongside the
+    vector store of the same report, or on their own if there is none. The
+    pickles are read without importing the embedding classes they reference,
+    so pickles written with older langchain or openai releases still convert.
+
+    :param pickle_dir: The directory of pickled loader outputs.
+    :param faiss_dir: The directory of pickled FAISS vector stores.
+    :param output_dir: The directory the artifacts are written to.
+    :return: The paths of the written artifacts.
+    """
+    names = {}
+    for name in _pickle_names(pickle_dir):
+        report = name[:-len(INPUTS_SUFFIX)] if name.endswith(INPUTS_SUFFIX) else name
+        names.setdefault(report, {})['inputs'] = os.path.join(pickle_dir, f"{name}{PICKLE_EXTENSION}")
+    for name in _pickle_names(faiss_dir):
+        names.setdefault(name, {})['store'] = os.path.join(faiss_dir, f"{name}{PICKLE_EXTENSION}")
+
+    written = []
+    for report, paths in sorted(names.items()):
+        dir_path = os.path.join(output_dir, report)
+        loader_output = _load_legacy_pickle(paths['inputs']) if 'inputs' in paths else None
+        if 'store' in paths:
+            save_vector_store(_load_legacy_pickle(paths['store']), dir_path, loader_output)
+        else:
+            write_artifact(dir_path, loader_output=loader_output)
+        written.append(dir_path)
+    return written
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['convert'])
+    parser.add_argument('pickle_dir', nargs='?', default=PICKLE_DIR)
+    parser.add_argument('faiss_dir', nargs='?', default=FAISS_DIR)
+    parser.add_argument('output_dir', nargs='?', default=ARTIFACT_DIR)
+    options = parser.parse_args(argv)
+
+    for dir_path in convert_pickles(options.pickle_dir, options.faiss_dir, options.output_dir):
+        print(dir_path)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
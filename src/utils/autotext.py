@@ -0,0 +1,267 @@
+import os
+import re
+import json
+import time
+import queue
+import logging
+import multiprocessing
+
+from typing import List, Dict, Callable, Optional, Tuple
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+SELECTION_FILE_NAME = 'text_backends.json'
+BACKEND_TIMEOUT = 120.  # seconds
+ACCEPT_SCORE = 0.9  # a result this good cannot be beaten by more than 1 - ACCEPT_SCORE
+TARGET_CHARS_PER_PAGE = 1200  # a typical, fully extracted report page
+MIN_PAGE_CHARS = 20  # pages with fewer non-whitespace characters count as empty
+GARBAGE_PATTERN = re.compile(
+    r"\(cid:\d+\)"  # unmapped glyph ids emitted by pdfminer
+    r"|[\ufffd\ue000-\uf8ff]"  # replacement character and private use area glyphs
+    r"|[\x00-\x08\x0b\x0e-\x1f\x7f]"  # control characters other than whitespace
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+FAMILY_PATTERN = re.compile(r"[\d\s_.-]+")
+# DICT KEYS
+BACKEND_KEY = "backend"
+SCORE_KEY = "score"
+SECONDS_KEY = "seconds"
+ERROR_KEY = "error"
+RUNS_KEY = "runs"
+
+
+def score_text(pages: List[str]) -> float:
+    """
+    Score extracted text between 0 and 1 on characters per page, the ratio of
+    garbage glyphs and the share of empty pages.
+
+    :param pages: The extracted text, one string per page.
+    :return: The quality score, higher is better.
+    """
+    if not pages:
+        return 0.
+
+    n_chars, n_garbage, n_empty = 0, 0, 0
+    for page in pages:
+        page = page if isinstance(page, str) else ''
+        page_chars = len(WHITESPACE_PATTERN.sub('', page))
+        n_chars += page_chars
+        n_garbage += sum(len(match) for match in GARBAGE_PATTERN.findall(page))
+        n_empty += page_chars < MIN_PAGE_CHARS
+
+    density = min(1., n_chars / len(pages) / TARGET_CHARS_PER_PAGE)
+    garbage_ratio = min(1., n_garbage / n_chars) if n_chars else 1.
+    empty_ratio = n_empty / len(pages)
+    return density * (1. - garbage_ratio) * (1. - empty_ratio)
+
+
+def document_family(file_path: str) -> str:
+    """
+    Derive a document family from a file name by dropping years, numbers and
+    separators, e.g. 'Colruyt_Group_annual-report-2022-2023.pdf' -> 'colruyt_group_annual_report'.
+
+    :param file_path: The path to the document.
+    :return: The document family.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0].lower()
+    return FAMILY_PATTERN.sub('_', name).strip('_')
+
+
+def _run_backend(key: str, loader: Callable, file_path: str, results: multiprocessing.Queue):
+    """Worker process: run one text backend and report its pages, or its error, with the timing."""
+    start = time.perf_counter()
+    try:
+        pages = loader(file_path)
+        results.put((key, pages, None, time.perf_counter() - start))
+    except Exception as e:
+        results.put((key, None, f"{type(e).__name__}: {e}", time.perf_counter() - start))
+
+
+def race_backends(
+        file_path: str,
+        loaders: Dict[str, Callable],
+        timeouts: Optional[Dict[str, float]] = None,
+        accept_score: float = ACCEPT_SCORE,
+) -> Tuple[Optional[str], Optional[List[str]], Dict[str, Dict]]:
+    """
+    Run text backends concurrently, each in its own worker process with its own
+    timeout, and keep the best scoring output. A backend past its timeout is
+    terminated and recorded as timed out.
+
+    The best output so far is taken as clearly ahead, and returned without
+    waiting for the slower backends, once it scores at least `accept_score`:
+    the scores of the running backends are unknown but at most 1, so none of
+    them can beat it by more than 1 - `accept_score`. The slower backends
+    are then terminated.
+
+    :param file_path: The path to the document.
+    :param loaders: Text loaders keyed by backend name, called with the file path.
+    :param timeouts: Optional per backend timeouts in seconds. Defaults to BACKEND_TIMEOUT.
+    :param accept_score: The score at which a result is accepted without waiting for the rest.
+    :return: A (best backend, best pages, runs) tuple, where runs holds the score,
+             timing and error of every backend. The backend and pages are None if all failed.
+    """
+    timeouts = timeouts or {}
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    start = time.monotonic()
+
+    processes, deadlines = {}, {}
+    for key, loader in loaders.items():
+        loader = getattr(loader, '__func__', loader)  # staticmethods are not picklable
+        processes[key] = context.Process(
+            target=_run_backend, args=(key, loader, file_path, results), daemon=True
+        )
+        deadlines[key] = start + timeouts.get(key, BACKEND_TIMEOUT)
+        processes[key].start()
+
+    runs, outputs = {}, {}
+    best_key = None
+    try:
+        while len(runs) < len(processes):
+            pending = [key for key in processes if key not in runs]
+            wait = min(deadlines[key] for key in pending) - time.monotonic()
+            try:
+                key, pages, error, seconds = results.get(timeout=max(wait, 0.))
+            except queue.Empty:
+                now = time.monotonic()
+                for key in pending:
+                    if deadlines[key] <= now:
+                        processes[key].terminate()
+                        runs[key] = {SCORE_KEY: 0., SECONDS_KEY: now - start, ERROR_KEY: 'timeout'}
+                        logger.warning(f'Text backend {key} timed out on {file_path}.')
+                continue
+            if key in runs:
+                continue  # finished just after its deadline, the timeout stands
+
+            runs[key] = {
+                SCORE_KEY: score_text(pages) if error is None else 0.,
+                SECONDS_KEY: seconds,
+                ERROR_KEY: error,
+            }
+            if error is None:
+                outputs[key] = pages
+                if best_key is None or runs[key][SCORE_KEY] > runs[best_key][SCORE_KEY]:
+                    best_key = key
+            if best_key is not None and runs[best_key][SCORE_KEY] >= accept_score:
+                break  # clearly ahead, don't wait for the slower backends
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        results.close()
+
+    return best_key, outputs.get(best_key), runs
+
+
+class BackendSelector(object):
+    """
+    Picks the text backend for a document with `race_backends` and remembers,
+    per document family, which backend gave a good result the fastest. The next
+    document of that family tries the remembered backend alone first and only
+    races the others if its result is not good enough.
+
+    The choices are kept in memory, and only persisted when a selection file
+    is given, e.g. next to an ExtractionCache (see `PDFLoader`).
+    """
+
+    def __init__(
+            self,
+            selection_file: Optional[str] = None,
+            timeouts: Optional[Dict[str, float]] = None,
+            accept_score: float = ACCEPT_SCORE,
+    ):
+        """
+        Initializes the BackendSelector object.
+
+        :param selection_file: Optional JSON file where backend choices and timings are recorded,
+                               shared by every selector using it. Nothing is written if None.
+        :param timeouts: Optional per backend timeouts in seconds.
+        :param accept_score: The score at which a backend's output is accepted.
+        """
+        self._selection_file = selection_file
+        self._selections = {}
+        self._timeouts = timeouts
+        self._accept_score = accept_score
+
+    def _read(self) -> Dict[str, Dict]:
+        if self._selection_file is None:
+            return self._selections
+        if not os.path.exists(self._selection_file):
+            return {}
+        with open(self._selection_file, 'r') as f:
+            return json.load(f)
+
+    def _record(self, family: str, backend: Optional[str], runs: Dict[str, Dict]):
+        selections = self._read()
+        record = selections.get(family, {RUNS_KEY: {}})
+        record[RUNS_KEY].update(runs)
+
+        # Remember the fastest backend whose output was good enough, else the best scoring one.
+        good = [key for key, run in record[RUNS_KEY].items() if run[SCORE_KEY] >= self._accept_score]
+        if good:
+            record[BACKEND_KEY] = min(good, key=lambda key: record[RUNS_KEY][key][SECONDS_KEY])
+        elif backend is not None:
+            record[BACKEND_KEY] = backend
+        selections[family] = record
+        if self._selection_file is None:
+            return
+
+        directory = os.path.dirname(self._selection_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = f"{self._selection_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(selections, f, indent=2)
+        os.replace(tmp_file, self._selection_file)
+
+    def remembered_backend(self, file_path: str) -> Optional[str]:
+        """Returns the backend remembered for the document family of a file, if any."""
+        return self._read().get(document_family(file_path), {}).get(BACKEND_KEY)
+
+    def select(self, file_path: str, loaders: Dict[str, Callable]) -> Tuple[str, List[str]]:
+        """
+        Extract text with the best backend for a document.
+
+        :param file_path: The path to the document.
+        :param loaders: Candidate text loaders keyed by backend name.
+        :return: A (backend, pages) tuple.
+        :raises RuntimeError: If every backend failed or timed out.
+        """
+        family = document_family(file_path)
+        runs = {}
+
+        remembered = self.remembered_backend(file_path)
+        if remembered in loaders:
+            backend, pages, runs = race_backends(
+                file_path, {remembered: loaders[remembered]}, self._timeouts, self._accept_score
+            )
+            if backend is not None and runs[backend][SCORE_KEY] >= self._accept_score:
+                logger.info(f'Using remembered {backend} backend for {family} ({runs[backend]}).')
+                self._record(family, backend, runs)
+                return backend, pages
+            loaders = {key: loader for key, loader in loaders.items() if key != remembered}
+            fallback = (backend, pages)
+        else:
+            fallback = (None, None)
+
+        backend, pages, race_runs = race_backends(file_path, loaders, self._timeouts, self._accept_score)
+        runs.update(race_runs)
+        if fallback[0] is not None and (
+                backend is None or runs[fallback[0]][SCORE_KEY] >= runs[backend][SCORE_KEY]
+        ):
+            backend, pages = fallback
+
+        self._record(family, backend, runs)
+        if backend is None:
+            raise RuntimeError(f"All text backends failed for {file_path}: {runs}")
+
+        logger.info(f'Selected {backend} backend for {family}: {runs}')
+        return backend, pages
@@ -0,0 +1,283 @@
+"""
+Micro-benchmarks for the ingestion and retrieval hot paths.
+
+Usage:
+    python -m src.utils.benchmark figures [path/to/report.doxc]
+    python -m src.utils.benchmark embeddings [n_texts]
+    python -m src.utils.benchmark splitter [n_pages]
+"""
+import sys
+import time
+import random
+import asyncio
+import hashlib
+import zipfile
+import argparse
+import threading
+
+from aiohttp import web
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Callable, Any
+
+from src.utils.loader import is_potential_figure_data, classify_figure_data
+from src.utils.doxc_parser import iter_body, document_part_name, paragraph_text, W_P
+from src.utils.embedding_scheduler import AsyncBatchEmbeddings
+from src.utils.token_splitter import TokenSpanSplitter, encoding_for_model
+
+
+SYNTHETIC_WORDS = [
+    'Emissions', 'scope', '2', 'CO2e', '12 kg', '45%', '3.5', '-', 'Energy',
+    'consumption', '2022', 'GHG', '10m', 'tonnes', 'target', '1.61', 'baseline',
+]
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    """Return the best wall-clock time of `repeat` runs of fn, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _synthetic_paragraphs(n_paragraphs: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    return [
+        ' '.join(rnd.choice(SYNTHETIC_WORDS) for _ in range(rnd.randint(1, 12)))
+        for _ in range(n_paragraphs)
+    ]
+
+
+def _doxc_paragraphs(file_path: str) -> List[str]:
+    with zipfile.ZipFile(file_path) as archive:
+        return [
+            paragraph_text(elem)
+            for elem, _ in iter_body(archive, document_part_name(archive))
+            if elem.tag == W_P
+        ]
+
+
+def benchmark_figure_classifier(
+        file_path: str = None,
+        n_paragraphs: int = 200000,
+        repeat: int = 3,
+) -> Dict[str, float]:
+    """
+    Compare per-paragraph `is_potential_figure_data` calls with one batch
+    `classify_figure_data` call over all paragraphs of a document.
+
+    :param file_path: Optional .doxc file to take paragraphs from. Synthetic
+                      ESG-like paragraphs are generated if None.
+    :param n_paragraphs: The number of synthetic paragraphs.
+    :param repeat: The number of timed runs, the best one is reported.
+    :return: A dict with the scalar and batch timings (seconds) and the speed-up.
+    """
+    texts = _doxc_paragraphs(file_path) if file_path else _synthetic_paragraphs(n_paragraphs)
+
+    scalar = [is_potential_figure_data(text) for text in texts]
+    if classify_figure_data(texts) != scalar:
+        raise AssertionError("Batch and scalar figure classifiers disagree.")
+
+    scalar_time = _best_of(lambda: [is_potential_figure_data(text) for text in texts], repeat)
+    batch_time = _best_of(lambda: classify_figure_data(texts), repeat)
+    return {
+        'paragraphs': len(texts),
+        'scalar_s': scalar_time,
+        'batch_s': batch_time,
+        'speedup': scalar_time / batch_time,
+    }
+
+
+class StandInEmbeddingServer(object):
+    """
+    A local stand-in for the OpenAI /embeddings endpoint, for offline benchmarks.
+
+    Every request takes `latency` seconds plus `latency_per_input` per input.
+    Requests beyond `requests_per_second` within a one second window get a 429
+    with a Retry-After, like the real API. Vectors are derived from the text
+    hash, so callers can check that results come back in input order.
+    """
+
+    def __init__(
+            self,
+            dim: int = 8,
+            latency: float = 0.05,
+            latency_per_input: float = 0.0002,
+            requests_per_second: float = 40.,
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.latency_per_input = latency_per_input
+        self.requests_per_second = requests_per_second
+        self.n_requests = 0
+        self.n_rate_limited = 0
+        self._window = []
+        self._loop = None
+        self._runner = None
+        self.url = None
+
+    @staticmethod
+    def vector(text: str, dim: int) -> List[float]:
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return [byte / 255. for byte in digest[:dim]]
+
+    async def _embeddings(self, request: web.Request) -> web.Response:
+        self.n_requests += 1
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.]
+        if len(self._window) >= self.requests_per_second:
+            self.n_rate_limited += 1
+            retry_after_ms = (1. - (now - self._window[0])) * 1000
+            return web.json_response(
+                {'error': {'message': 'Rate limit reached'}}, status=429,
+                headers={'retry-after-ms': f"{retry_after_ms:.0f}"},
+            )
+        self._window.append(now)
+
+        body = await request.json()
+        texts = body['input']
+        await asyncio.sleep(self.latency + self.latency_per_input * len(texts))
+        data = [
+            {'object': 'embedding', 'index': i, 'embedding': self.vector(text, self.dim)}
+            for i, text in enumerate(texts)
+        ]
+        return web.json_response({'object': 'list', 'data': data, 'model': body['model']})
+
+    def __enter__(self) -> 'StandInEmbeddingServer':
+        started = threading.Event()
+
+        async def _start():
+            app = web.Application()
+            app.router.add_post('/v1/embeddings', self._embeddings)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, '127.0.0.1', 0)
+            await site.start()
+            port = self._runner.addresses[0][1]
+            self.url = f"http://127.0.0.1:{port}/v1"
+            started.set()
+
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(_start(), self._loop)
+        started.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def benchmark_embedding_scheduler(n_texts: int = 5000, batch_tokens: int = 500) -> Dict[str, float]:
+    """
+    Embed synthetic chunks against a local stand-in embedding server, one batch
+    at a time and with the concurrent scheduler, and check the result order.
+
+    :param n_texts: The number of synthetic chunks.
+    :param batch_tokens: The token budget of one request.
+    :return: A dict with both throughputs (texts per second), the speed-up and
+             the number of rate limited requests.
+    """
+    n_texts, batch_tokens = int(n_texts), int(batch_tokens)
+    texts = _synthetic_paragraphs(n_texts, seed=1)
+    token_len = lambda text: len(text) // 4 + 1  # no tokenizer download needed offline
+
+    results = {'texts': n_texts}
+    for name, max_concurrency in (('sequential', 1), ('concurrent', 16)):
+        with StandInEmbeddingServer() as server:
+            embeddings = AsyncBatchEmbeddings(
+                model='stand-in', api_base=server.url, api_key='stand-in',
+                batch_tokens=batch_tokens, max_concurrency=max_concurrency,
+                requests_per_minute=60 * server.requests_per_second * 2,  # overshoot to exercise 429s
+                token_len=token_len,
+            )
+            start = time.perf_counter()
+            vectors = embeddings.embed_documents(texts)
+            seconds = time.perf_counter() - start
+            if vectors != [server.vector(text, server.dim) for text in texts]:
+                raise AssertionError("Embeddings came back out of order.")
+            results[f'{name}_texts_per_s'] = n_texts / seconds
+            results[f'{name}_rate_limited'] = server.n_rate_limited
+
+    results['speedup'] = results['concurrent_texts_per_s'] / results['sequential_texts_per_s']
+    return results
+
+
+def _synthetic_report(n_pages: int, paragraphs_per_page: int = 60, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    paragraphs = _synthetic_paragraphs(n_pages * paragraphs_per_page, seed=seed)
+    pages = []
+    for page in range(n_pages):
+        lines = paragraphs[page * paragraphs_per_page:(page + 1) * paragraphs_per_page]
+        # a blank line between some paragraphs, so every separator level is used
+        pages.append(''.join(line + ('\n\n' if rnd.random() < 0.2 else '\n') for line in lines))
+    return '\n'.join(pages)
+
+
+def benchmark_splitter(
+        n_pages: int = 500,
+        chunk_size: int = 240,
+        chunk_overlap: int = 24,
+        model: str = 'gpt-3.5-turbo',
+) -> Dict[str, float]:
+    """
+    Compare RecursiveCharacterTextSplitter with a tiktoken `length_function`, as
+    DocumentVectorizer used to split, with TokenSpanSplitter on a synthetic report.
+
+    :param n_pages: The number of report pages.
+    :param chunk_size: The chunk size in tokens.
+    :param chunk_overlap: The chunk overlap in tokens.
+    :param model: The tokenizer model.
+    :return: A dict with both timings (seconds), the speed-up, the chunk counts
+             and the share of identical chunks.
+    """
+    n_pages, chunk_size, chunk_overlap = int(n_pages), int(chunk_size), int(chunk_overlap)
+    text = _synthetic_report(n_pages)
+    encoding = encoding_for_model(model)
+
+    def _token_len(chunk: str) -> int:
+        return len(encoding.encode(chunk, disallowed_special=()))
+
+    start = time.perf_counter()
+    old_chunks = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=_token_len,
+    ).split_text(text)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_chunks = TokenSpanSplitter(chunk_size, chunk_overlap, encoding=encoding).split_text(text)
+    new_time = time.perf_counter() - start
+
+    return {
+        'pages': n_pages,
+        'characters': len(text),
+        'recursive_s': old_time,
+        'token_span_s': new_time,
+        'speedup': old_time / new_time,
+        'recursive_chunks': len(old_chunks),
+        'token_span_chunks': len(new_chunks),
+        'identical_share': len(set(old_chunks) & set(new_chunks)) / max(len(old_chunks), 1),
+    }
+
+
+BENCHMARKS = {
+    'figures': benchmark_figure_classifier,
+    'embeddings': benchmark_embedding_scheduler,
+    'splitter': benchmark_splitter,
+}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=BENCHMARKS.keys())
+    parser.add_argument('args', nargs='*', help='Positional arguments passed to the benchmark.')
+    options = parser.parse_args(argv)
+
+    results = BENCHMARKS[options.benchmark](*options.args)
+    for key, value in results.items():
+        print(f"{key:>16}: {value:.4f}" if isinstance(value, float) else f"{key:>16}: {value}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
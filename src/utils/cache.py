@@ -0,0 +1,213 @@
+import os
+import glob
+import pickle
+import hashlib
+import inspect
+import logging
+import importlib
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+CACHE_DIR = './data/cache_db'
+MAX_CACHE_BYTES = 1024 ** 3  # 1 GiB
+EXTRACTION_VERSION = 1  # bump to invalidate every cached extraction
+HASH_BLOCK_SIZE = 1024 ** 2
+CACHE_EXTENSION = '.pkl'
+VERSION_LENGTH = 16
+PACKAGE = __name__.split('.')[0]
+
+
+def file_hash(file_path: str) -> str:
+    """
+    Hash the content of a file, so that renamed or copied reports share cache entries.
+
+    :param file_path: The path to the file.
+    :return: The hex sha256 digest of the file content.
+    """
+    stat = os.stat(file_path)
+    return _file_hash(os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _file_hash(file_path: str, size: int, mtime_ns: int) -> str:
+    # size and mtime are part of the lru key, so an edited file is hashed again.
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_version(loader: Callable) -> str:
+    """
+    Fingerprint the extraction code behind a loader: the source of the module
+    defining it and of every package module that module depends on. Any edit
+    to that code changes the version and therefore the cache key.
+
+    :param loader: The loader function.
+    :return: A short hex digest.
+    """
+    loader = getattr(loader, '__func__', loader)  # unwrap staticmethods
+    return _module_version(loader.__module__)
+
+
+@lru_cache(maxsize=None)
+def _module_version(module_name: str) -> str:
+    module = importlib.import_module(module_name)
+    sources = {inspect.getsourcefile(module)}
+    for value in vars(module).values():
+        dependency = value if inspect.ismodule(value) else inspect.getmodule(value)
+        if dependency is not None and dependency.__name__.split('.')[0] == PACKAGE:
+            sources.add(inspect.getsourcefile(dependency))
+
+    digest = hashlib.sha256(str(EXTRACTION_VERSION).encode())
+    for source in sorted(s for s in sources if s is not None):
+        with open(source, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:VERSION_LENGTH]
+
+
+class ExtractionCache(object):
+    """
+    A persistent, size-bounded cache of loader outputs.
+
+    Entries are keyed on (file content hash, loader key, loader code version)
+    and stored as one pickle per entry. Reads refresh the entry's modification
+    time, which is used to evict the least recently used entries once the
+    cache grows past its size limit. Entries written by an older version of
+    the extraction code are dropped as soon as the same file and loader key
+    are requested again.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        """
+        Initializes the ExtractionCache object.
+
+        :param cache_dir: The directory where cache entries are stored.
+        :param max_bytes: The maximum total size of the cache on disk.
+        """
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def cache_dir(self) -> str:
+        return self._cache_dir
+
+    def _entry_path(self, content_hash: str, key: str, version: str) -> str:
+        return os.path.join(self._cache_dir, f"{content_hash}_{key}_{version}{CACHE_EXTENSION}")
+
+    def _drop_stale(self, content_hash: str, key: str, version: str):
+        """Remove entries for the same file and loader key written by other code versions."""
+        current = self._entry_path(content_hash, key, version)
+        pattern = self._entry_path(glob.escape(content_hash), glob.escape(key), '?' * VERSION_LENGTH)
+        for path in glob.glob(pattern):
+            if path != current:
+                logger.info(f'Dropping stale cache entry {path}.')
+                _remove(path)
+
+    def _evict(self):
+        """Evict least recently used entries until the cache fits within its size limit."""
+        entries = []
+        total = 0
+        with os.scandir(self._cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(CACHE_EXTENSION):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    def get(self, file_path: str, key: str, loader: Callable) -> Tuple[bool, Any]:
+        """
+        Look up a cached extraction.
+
+        :param file_path: The path to the extracted file.
+        :param key: The loader key, unique per loader and extraction options.
+        :param loader: The loader function, used to version the entry.
+        :return: A (hit, value) tuple.
+        """
+        path = self._entry_path(file_hash(file_path), key, code_version(loader))
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+        os.utime(path)  # mark as recently used
+        return True, value
+
+    def put(self, file_path: str, key: str, loader: Callable, value: Any):
+        """
+        Store an extraction, dropping stale versions of the same entry and
+        evicting old entries if the size limit is exceeded.
+
+        :param file_path: The path to the extracted file.
+        :param key: The loader key, unique per loader and extraction options.
+        :param loader: The loader function, used to version the entry.
+        :param value: The loader output. Must be picklable.
+        """
+        content_hash, version = file_hash(file_path), code_version(loader)
+        self._drop_stale(content_hash, key, version)
+
+        path = self._entry_path(content_hash, key, version)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # atomic, safe across worker processes
+
+        self._evict()
+
+    def get_or_compute(
+            self, file_path: str, key: str, loader: Callable, *args: Any, **kwargs: Any
+    ) -> Any:
+        """
+        Return the cached output of `loader(*args, **kwargs)` for a file,
+        running and caching the loader on a miss.
+
+        :param file_path: The path to the extracted file.
+        :param key: The loader key, unique per loader and extraction options.
+        :param loader: The loader function.
+        :return: The loader output.
+        """
+        hit, value = self.get(file_path, key, loader)
+        if hit:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader(*args, **kwargs)
+        self.put(file_path, key, loader, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of cache hits and misses served by this instance."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        for path in glob.glob(os.path.join(glob.escape(self._cache_dir), f"*{CACHE_EXTENSION}")):
+            _remove(path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:  # removed concurrently by another process
+        pass
@@ -0,0 +1,332 @@
+import re
+import zipfile
+import posixpath
+
+from datetime import datetime, timedelta
+from typing import List, Dict, Iterator, Tuple, Optional
+from xml.etree.ElementTree import iterparse, parse, Element
+
+
+W_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+REL_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CORE_NAMESPACES = {
+    'cp': 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'dcterms': 'http://purl.org/dc/terms/',
+}
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+CORE_PROPERTIES_REL = 'http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties'
+FOOTNOTES_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/footnotes'
+DEFAULT_DOCUMENT_PART = 'word/document.xml'
+DEFAULT_TITLE = 'Word Document'  # python-docx default when a document has no core properties
+W3CDTF_TEMPLATES = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%Y-%m', '%Y')
+W3CDTF_OFFSET_PATTERN = re.compile(r'([+-])(\d\d):(\d\d)')
+BODY_CHILD_DEPTH = 3  # w:document > w:body > child
+
+
+def _qn(tag: str) -> str:
+    return f'{{{W_NAMESPACE}}}{tag}'
+
+
+W_BODY = _qn('body')
+W_P = _qn('p')
+W_R = _qn('r')
+W_T = _qn('t')
+W_TAB = _qn('tab')
+W_BR = _qn('br')
+W_CR = _qn('cr')
+W_TBL = _qn('tbl')
+W_TR = _qn('tr')
+W_TC = _qn('tc')
+W_TCPR = _qn('tcPr')
+W_GRID_SPAN = _qn('gridSpan')
+W_V_MERGE = _qn('vMerge')
+W_TBL_GRID = _qn('tblGrid')
+W_GRID_COL = _qn('gridCol')
+W_FOOTNOTE = _qn('footnote')
+W_FOOTNOTE_REFERENCE = _qn('footnoteReference')
+W_VAL = _qn('val')
+W_ID = _qn('id')
+W_TYPE = _qn('type')
+W_LAST_RENDERED_PAGE_BREAK = _qn('lastRenderedPageBreak')
+W_PAGE_BREAK_BEFORE = _qn('pageBreakBefore')
+V_MERGE_CONTINUE = 'continue'
+BR_TYPE_PAGE = 'page'
+
+
+def paragraph_text(p: Element) -> str:
+    """
+    Text of a w:p element, following python-docx: the concatenated text of its
+    direct runs, with tabs and breaks mapped to '\\t' and '\\n'.
+    """
+    text = ''
+    for r in p.iterfind(W_R):
+        for child in r:
+            if child.tag == W_T:
+                text += child.text if child.text is not None else ''
+            elif child.tag == W_TAB:
+                text += '\t'
+            elif child.tag in (W_BR, W_CR):
+                text += '\n'
+    return text
+
+
+def cell_text(tc: Element) -> str:
+    """Text of a w:tc element: the text of its direct paragraphs joined by newlines."""
+    return '\n'.join(paragraph_text(p) for p in tc.iterfind(W_P))
+
+
+def table_rows(tbl: Element) -> List[List[str]]:
+    """
+    Cell texts of a w:tbl element, row by row, laid out on the table grid the
+    way python-docx's `table.rows[i].cells` does: horizontally spanned cells
+    are repeated and vertically merged cells continue the cell above.
+    """
+    tbl_grid = tbl.find(W_TBL_GRID)
+    col_count = len(tbl_grid.findall(W_GRID_COL)) if tbl_grid is not None else 0
+
+    cells = []
+    for tr in tbl.iterfind(W_TR):
+        for tc in tr.iterfind(W_TC):
+            tc_pr = tc.find(W_TCPR)
+            grid_span, v_merge = 1, None
+            if tc_pr is not None:
+                grid_span_elem = tc_pr.find(W_GRID_SPAN)
+                if grid_span_elem is not None:
+                    grid_span = int(grid_span_elem.get(W_VAL))
+                v_merge_elem = tc_pr.find(W_V_MERGE)
+                if v_merge_elem is not None:
+                    v_merge = v_merge_elem.get(W_VAL, V_MERGE_CONTINUE)
+
+            for grid_span_idx in range(grid_span):
+                if v_merge == V_MERGE_CONTINUE:
+                    cells.append(cells[-col_count])
+                elif grid_span_idx > 0:
+                    cells.append(cells[-1])
+                else:
+                    cells.append(cell_text(tc))
+
+    n_rows = len(tbl.findall(W_TR))
+    return [cells[i * col_count:(i + 1) * col_count] for i in range(n_rows)]
+
+
+def footnote_ids(elem: Element) -> List[str]:
+    """Ids of the footnotes referenced anywhere within an element, in document order."""
+    return [ref.get(W_ID) for ref in elem.iter(W_FOOTNOTE_REFERENCE)]
+
+
+def _part_targets(archive: zipfile.ZipFile, source_part: str) -> Dict[str, str]:
+    """Map relationship types to part names for the relationships of a package part."""
+    source_dir, source_name = posixpath.split(source_part)
+    rels_part = posixpath.join(source_dir, '_rels', f'{source_name}.rels')
+    if rels_part not in archive.namelist():
+        return {}
+
+    with archive.open(rels_part) as f:
+        relationships = parse(f).getroot()
+
+    targets = {}
+    for rel in relationships.iter(f'{{{REL_NAMESPACE}}}Relationship'):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target')
+        if target.startswith('/'):
+            part = target.lstrip('/')
+        else:
+            part = posixpath.normpath(posixpath.join(source_dir, target))
+        targets[rel.get('Type')] = part
+    return targets
+
+
+def _parse_w3cdtf(w3cdtf_str: str) -> Optional[datetime]:
+    """Parse a W3CDTF date the way python-docx does, returning None if it is invalid."""
+    parseable_part, offset_str = w3cdtf_str[:19], w3cdtf_str[19:]
+    dt = None
+    for template in W3CDTF_TEMPLATES:
+        try:
+            dt = datetime.strptime(parseable_part, template)
+            break
+        except ValueError:
+            continue
+    if dt is None:
+        return None
+
+    if len(offset_str) == 6:
+        match = W3CDTF_OFFSET_PATTERN.match(offset_str)
+        if match is None:
+            return None
+        sign, hours, minutes = match.groups()
+        sign_factor = -1 if sign == '+' else 1
+        dt += timedelta(hours=int(hours) * sign_factor, minutes=int(minutes) * sign_factor)
+    return dt
+
+
+def read_core_properties(archive: zipfile.ZipFile) -> Dict:
+    """
+    Read the title, author and creation date of a .doxc package.
+
+    :param archive: The opened .doxc package.
+    :return: A dict with 'title', 'author' and 'created' keys.
+    """
+    core_part = _part_targets(archive, '').get(CORE_PROPERTIES_REL)
+    if core_part is None or core_part not in archive.namelist():
+        return {'title': DEFAULT_TITLE, 'author': '', 'created': None}
+
+    with archive.open(core_part) as f:
+        core = parse(f).getroot()
+
+    def _text_of(tag: str) -> str:
+        elem = core.find(tag, CORE_NAMESPACES)
+        return elem.text if elem is not None and elem.text is not None else ''
+
+    created = core.find('dcterms:created', CORE_NAMESPACES)
+    return {
+        'title': _text_of('dc:title'),
+        'author': _text_of('dc:creator'),
+        'created': _parse_w3cdtf(created.text) if created is not None and created.text else None,
+    }
+
+
+def read_footnotes(archive: zipfile.ZipFile, document_part: str) -> Dict[str, str]:
+    """
+    Read the footnotes of a .doxc package once, keyed by footnote id.
+
+    :param archive: The opened .doxc package.
+    :param document_part: The name of the main document part.
+    :return: A dict mapping footnote ids to footnote text.
+    """
+    footnotes_part = _part_targets(archive, document_part).get(FOOTNOTES_REL)
+    if footnotes_part is None or footnotes_part not in archive.namelist():
+        return {}
+
+    footnotes = {}
+    with archive.open(footnotes_part) as f:
+        for _, elem in iterparse(f):
+            if elem.tag == W_FOOTNOTE:
+                text = '\n'.join(paragraph_text(p) for p in elem.iterfind(W_P))
+                footnotes[elem.get(W_ID)] = text.strip()
+                elem.clear()
+    return footnotes
+
+
+def document_part_name(archive: zipfile.ZipFile) -> str:
+    """Name of the main document part of a .doxc package, usually 'word/document.xml'."""
+    return _part_targets(archive, '').get(OFFICE_DOCUMENT_REL, DEFAULT_DOCUMENT_PART)
+
+
+def iter_body(archive: zipfile.ZipFile, document_part: str) -> Iterator[Tuple[Element, Optional[Element]]]:
+    """
+    Stream the children of w:body as (current, next) element pairs, parsing the
+    document XML incrementally. Each element is released once the consumer has
+    moved past it, so memory stays bounded by the size of the largest element
+    rather than the size of the document.
+
+    :param archive: The opened .doxc package.
+    :param document_part: The name of the main document part.
+    :return: An iterator of (current element, next element) tuples. The next
+             element of the last body child is None.
+    """
+    body, previous = None, None
+    depth = 0
+    with archive.open(document_part) as f:
+        for event, elem in iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if elem.tag == W_BODY:
+                    body = elem
+                continue
+
+            if depth == BODY_CHILD_DEPTH and body is not None:
+                if previous is not None:
+                    yield previous, elem
+                    body.remove(previous)
+                previous = elem
+            depth -= 1
+
+    if previous is not None:
+        yield previous, None
+
+
+def page_breaks(elem: Element, explicit_pending: bool = False) -> Tuple[int, int, bool]:
+    """
+    Count the page breaks within a body element, in document order.
+
+    Word marks where it paginated the document when it was last saved with
+    w:lastRenderedPageBreak, and also writes one right after every explicit
+    page break (w:br w:type="page", w:pageBreakBefore). A rendered break that
+    follows an explicit one before any text is therefore not counted again.
+
+    :param elem: A child of w:body.
+    :param explicit_pending: Whether the previous element ended with an explicit
+                             page break not yet matched by a rendered one.
+    :return: A (leading breaks, total breaks, explicit pending) tuple, where
+             leading breaks come before the first text of the element, i.e.
+             the element starts on a later page.
+    """
+    leading, total = 0, 0
+    seen_text = False
+    for child in elem.iter():
+        tag = child.tag
+        if tag == W_T:
+            if child.text:
+                seen_text = True
+                explicit_pending = False
+            continue
+
+        explicit = (
+            (tag == W_BR and child.get(W_TYPE) == BR_TYPE_PAGE)
+            or (tag == W_PAGE_BREAK_BEFORE and child.get(W_VAL, 'true') not in ('0', 'false'))
+        )
+        if explicit:
+            explicit_pending = True
+        elif tag == W_LAST_RENDERED_PAGE_BREAK and explicit_pending:
+            explicit_pending = False
+            continue
+        elif tag != W_LAST_RENDERED_PAGE_BREAK:
+            continue
+
+        total += 1
+        leading += not seen_text
+    return leading, total, explicit_pending
+
+
+def iter_numbered_body_pages(
+        archive: zipfile.ZipFile, document_part: str, pages: Tuple[int, Optional[int]]
+) -> Iterator[Tuple[int, Element, Optional[Element]]]:
+    """
+    Stream the children of w:body that start within a page range, as
+    `iter_body` does for the whole body, with the page every child starts on.
+    Page numbers follow the page breaks Word recorded in the document (see
+    `page_breaks`).
+
+    Elements before the range are only tokenized, not processed, and the
+    document is not read past the first element starting after the range.
+
+    :param archive: The opened .doxc package.
+    :param document_part: The name of the main document part.
+    :param pages: (first, last) page numbers, 1-based and inclusive. last may be None.
+    :return: An iterator of (start page, current element, next element) tuples.
+    """
+    first, last = pages
+    page, explicit_pending = 1, False
+    for current_elem, next_elem in iter_body(archive, document_part):
+        leading, total, explicit_pending = page_breaks(current_elem, explicit_pending)
+        start_page = page + leading
+        page += total
+        if last is not None and start_page > last:
+            return
+        if start_page >= first:
+            yield start_page, current_elem, next_elem
+
+
+def iter_body_pages(
+        archive: zipfile.ZipFile, document_part: str, pages: Tuple[int, Optional[int]]
+) -> Iterator[Tuple[Element, Optional[Element]]]:
+    """
+    Stream the children of w:body that start within a page range, see
+    `iter_numbered_body_pages`.
+
+    :return: An iterator of (current element, next element) tuples.
+    """
+    for _, current_elem, next_elem in iter_numbered_body_pages(archive, document_part, pages):
+        yield current_elem, next_elem
@@ -0,0 +1,210 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import unicodedata
+
+import numpy as np
+
+from typing import List, Dict, Optional
+from langchain.embeddings.base import Embeddings
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+EMBEDDING_DB = './data/cache_db/embeddings.sqlite'
+MAX_ENTRIES = 500000  # ~3 GiB of ada-002 vectors
+VECTOR_DTYPE = np.float32  # what FAISS stores anyway
+SQLITE_BATCH = 500  # stay below SQLite's host parameter limit
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+LAST_USED_INDEX = "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing: NFC unicode and single spaces between words."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def embedding_key(model: str, text: str) -> bytes:
+    """
+    The cache key of a text: the sha256 digest of the model name and the normalized text.
+
+    :param model: The embedding model name.
+    :param text: The embedded text.
+    :return: A 32 byte digest.
+    """
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode('utf-8')).digest()
+
+
+class EmbeddingCache(object):
+    """
+    A persistent SQLite store of embeddings, keyed on (model, normalized text).
+
+    Lookups refresh the entries' last use time, which is used to evict the
+    least recently used entries once the store holds more than `max_entries`.
+    The connection is opened lazily and per process, so the cache can be
+    pickled along with a vector store and shared by worker processes.
+    """
+
+    def __init__(self, db_path: str = EMBEDDING_DB, max_entries: int = MAX_ENTRIES):
+        """
+        Initializes the EmbeddingCache object.
+
+        :param db_path: The SQLite database file.
+        :param max_entries: The maximum number of stored embeddings.
+        """
+        self._db_path = db_path
+        self._max_entries = max_entries
+        self._connection = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Returns this process' connection to the database, creating the schema if needed."""
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self._db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self._db_path, timeout=30.)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(SCHEMA)
+            self._connection.execute(LAST_USED_INDEX)
+            self._pid = os.getpid()
+        return self._connection
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up the embeddings of several texts.
+
+        :param model: The embedding model name.
+        :param texts: The texts.
+        :return: One embedding per text, None for texts that are not cached.
+        """
+        keys = [embedding_key(model, text) for text in texts]
+        found = {}
+        for start in range(0, len(keys), SQLITE_BATCH):
+            batch = list(set(keys[start:start + SQLITE_BATCH]))
+            placeholders = ','.join('?' * len(batch))
+            rows = self.connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            found.update((key, vector) for key, vector in rows)
+
+        if found:
+            now = time.time()
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+
+        vectors = [
+            np.frombuffer(found[key], dtype=VECTOR_DTYPE).tolist() if key in found else None
+            for key in keys
+        ]
+        n_hits = sum(vector is not None for vector in vectors)
+        self.hits += n_hits
+        self.misses += len(vectors) - n_hits
+        return vectors
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """
+        Store the embeddings of several texts, evicting the least recently used
+        entries if the store grows past its limit.
+
+        :param model: The embedding model name.
+        :param texts: The texts.
+        :param vectors: One embedding per text.
+        """
+        now = time.time()
+        rows = [
+            (embedding_key(model, text), model, np.asarray(vector, dtype=VECTOR_DTYPE).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            n_entries = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if n_entries > self._max_entries:
+                self.connection.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (n_entries - self._max_entries,)
+                )
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of cache hits and misses served by this instance."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Remove every embedding from the store."""
+        with self.connection:
+            self.connection.execute("DELETE FROM embeddings")
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that go through an EmbeddingCache and only send cache misses to
+    the wrapped embeddings. Texts that occur several times are embedded once.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str):
+        """
+        Initializes the CachedEmbeddings object.
+
+        :param embeddings: The embeddings used for cache misses, e.g. OpenAIEmbeddings.
+        :param cache: The embedding cache.
+        :param model: The embedding model name, part of the cache key.
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model, texts)
+        n_hits = sum(vector is not None for vector in vectors)
+
+        missing = {}  # normalized text -> first text, so duplicates are embedded once
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(text), text)
+        if missing:
+            new_texts = list(missing.values())
+            new_vectors = self.embeddings.embed_documents(new_texts)
+            self.cache.put_many(self.model, new_texts, new_vectors)
+            embedded = dict(zip(missing.keys(), new_vectors))
+            vectors = [
+                vector if vector is not None else embedded[normalize_text(text)]
+                for text, vector in zip(texts, vectors)
+            ]
+
+        logger.info(
+            f'Embedded {len(texts)} texts with {self.model}: '
+            f'{n_hits} from cache, {len(missing)} sent to the model.'
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_many(self.model, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model, [text], [vector])
+        return vector
@@ -0,0 +1,297 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+
+import aiohttp
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Callable, Coroutine, Any
+from langchain.embeddings.base import Embeddings
+from src.utils.token_splitter import encoding_for_model
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+API_BASE = 'https://api.openai.com/v1'
+EMBEDDING_MODEL = 'text-embedding-ada-002'
+BATCH_TOKENS = 20000  # tokens per request
+BATCH_ITEMS = 2048  # inputs per request, the API maximum
+MAX_CONCURRENCY = 8  # requests in flight
+TOKENS_PER_MINUTE = 1000000
+REQUESTS_PER_MINUTE = 3000
+MAX_RETRIES = 8
+REQUEST_TIMEOUT = 60.  # seconds
+BACKOFF_BASE = 1.  # seconds, doubled on every retry without a Retry-After header
+BACKOFF_MAX = 60.
+RATE_DECREASE = 0.5  # multiplicative rate decrease on a 429
+RATE_INCREASE = 1.05  # multiplicative rate recovery on a success
+MIN_RATE_FRACTION = 0.05
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def run_sync(coroutine: Coroutine) -> Any:
+    """
+    Run a coroutine to completion from synchronous code, also when an event loop
+    is already running in this thread (e.g. in a notebook).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def pack_batches(
+        lengths: List[int], max_tokens: int = BATCH_TOKENS, max_items: int = BATCH_ITEMS
+) -> List[List[int]]:
+    """
+    Pack consecutive texts into batches of at most `max_tokens` tokens and
+    `max_items` texts, so that batch order is input order. A text longer than
+    `max_tokens` gets a batch of its own.
+
+    :param lengths: The token count of every text.
+    :param max_tokens: The token budget of a batch.
+    :param max_items: The maximum number of texts in a batch.
+    :return: A list of batches, each a list of text indices.
+    """
+    batches, batch, batch_tokens = [], [], 0
+    for i, n_tokens in enumerate(lengths):
+        if batch and (batch_tokens + n_tokens > max_tokens or len(batch) >= max_items):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += n_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class TokenBucket(object):
+    """
+    An asyncio token bucket: `rate` tokens per second, bursts of up to `capacity`.
+
+    The rate adapts to the server: `throttle` halves it and can pause the
+    bucket until a server-given time, `recover` raises it by a few percent
+    per success back towards the configured rate.
+
+    Tokens are reserved when they are asked for and the caller then sleeps
+    until they have been refilled, so callers are served first come, first
+    served. The state is guarded by a thread lock rather than an asyncio
+    lock, so one bucket can be shared by every event loop and thread.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initializes the TokenBucket object.
+
+        :param rate: The refill rate in tokens per second.
+        :param capacity: The bucket size. Defaults to one second of tokens.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1.) -> float:
+        """
+        Reserve `tokens` and return the seconds until they are refilled. Requests larger
+        than the capacity only wait for a full bucket and leave it in debt.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            needed = min(tokens, self.capacity)
+            wait = max((needed - self._tokens) / self.rate, self._paused_until - now, 0.)
+            self._tokens -= tokens
+            return wait
+
+    async def acquire(self, tokens: float = 1.):
+        """Wait until `tokens` are available and take them, see `wait_time`."""
+        wait = self.wait_time(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttle(self, retry_after: Optional[float] = None):
+        """Slow down after a rate limit response, pausing for `retry_after` seconds if given."""
+        with self._lock:
+            self.rate = max(self.rate * RATE_DECREASE, self.max_rate * MIN_RATE_FRACTION)
+            self._tokens = min(self._tokens, 0.)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def recover(self):
+        """Speed back up after a successful request."""
+        with self._lock:
+            self.rate = min(self.rate * RATE_INCREASE, self.max_rate)
+
+
+def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+    """Seconds to wait as asked by the server, from retry-after-ms or Retry-After."""
+    for header, scale in (('retry-after-ms', 1e-3), ('Retry-After', 1.)):
+        value = response.headers.get(header)
+        if value is not None:
+            try:
+                return float(value) * scale
+            except ValueError:  # an HTTP date, fall back to backoff
+                return None
+    return None
+
+
+class AsyncBatchEmbeddings(Embeddings):
+    """
+    Embeddings computed with concurrent, token-budgeted requests to an OpenAI
+    compatible /embeddings endpoint.
+
+    Texts are packed in input order into batches of `batch_tokens` tokens, up
+    to `max_concurrency` batches are in flight at once, and two token buckets
+    keep the request and token rates within the account limits. 429 and 5xx
+    responses are retried after the server's Retry-After time (or exponential
+    backoff) and lower the bucket rates, so the scheduler settles just below
+    the rate the server accepts. Results are returned in input order.
+
+    The buckets belong to the instance, so the rate limits and what was
+    learned from 429 responses hold across calls, e.g. the batches of
+    `DocumentVectorizer.vectorize_pages`, and across concurrent callers.
+    """
+
+    def __init__(
+            self,
+            model: str = EMBEDDING_MODEL,
+            api_base: Optional[str] = None,
+            api_key: Optional[str] = None,
+            batch_tokens: int = BATCH_TOKENS,
+            max_concurrency: int = MAX_CONCURRENCY,
+            tokens_per_minute: float = TOKENS_PER_MINUTE,
+            requests_per_minute: float = REQUESTS_PER_MINUTE,
+            max_retries: int = MAX_RETRIES,
+            timeout: float = REQUEST_TIMEOUT,
+            token_len: Optional[Callable[[str], int]] = None,
+    ):
+        """
+        Initializes the AsyncBatchEmbeddings object.
+
+        :param model: The embedding model name.
+        :param api_base: The API base URL. Defaults to $OPENAI_API_BASE or the OpenAI API.
+        :param api_key: The API key. Defaults to $OPENAI_API_KEY.
+        :param batch_tokens: The token budget of one request.
+        :param max_concurrency: The maximum number of requests in flight.
+        :param tokens_per_minute: The account's token rate limit.
+        :param requests_per_minute: The account's request rate limit.
+        :param max_retries: Retries per batch before giving up.
+        :param timeout: The timeout of one request in seconds.
+        :param token_len: Optional token counter. Defaults to the model's tiktoken encoding.
+        """
+        self.model = model
+        self.api_base = (api_base or os.getenv('OPENAI_API_BASE') or API_BASE).rstrip('/')
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.batch_tokens = batch_tokens
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._token_len = token_len
+        self._requests = TokenBucket(requests_per_minute / 60., capacity=max_concurrency)
+        self._tokens = TokenBucket(tokens_per_minute / 60.)
+        self.n_requests = 0
+        self.n_retries = 0
+
+    def token_len(self, text: str) -> int:
+        if self._token_len is not None:
+            return self._token_len(text)
+        return len(encoding_for_model(self.model).encode(text, disallowed_special=()))
+
+    async def _post(
+            self,
+            session: aiohttp.ClientSession,
+            texts: List[str],
+            n_tokens: int,
+    ) -> List[List[float]]:
+        requests, tokens = self._requests, self._tokens
+        backoff = BACKOFF_BASE
+        for attempt in range(self.max_retries + 1):
+            await requests.acquire(1)
+            await tokens.acquire(n_tokens)
+            self.n_requests += 1
+            try:
+                async with session.post(
+                        f"{self.api_base}/embeddings", json={'model': self.model, 'input': texts}
+                ) as response:
+                    if response.status == 200:
+                        data = (await response.json())['data']
+                        requests.recover()
+                        tokens.recover()
+                        return [item['embedding'] for item in sorted(data, key=lambda item: item['index'])]
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                    retry_after = _retry_after(response)
+                    if response.status == 429:
+                        requests.throttle(retry_after)
+                        tokens.throttle(retry_after)
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                retry_after, error = None, f"{type(e).__name__}: {e}"
+
+            if attempt == self.max_retries:
+                raise RuntimeError(f"Embedding request failed after {attempt + 1} attempts: {error}")
+            self.n_retries += 1
+            delay = retry_after if retry_after is not None else backoff * (1 + random.random())
+            backoff = min(backoff * 2, BACKOFF_MAX)
+            logger.debug(f'Retrying a batch of {len(texts)} texts in {delay:.2f}s after {error}.')
+            await asyncio.sleep(delay)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with concurrent batched requests, returning vectors in input order."""
+        if not texts:
+            return []
+        lengths = [max(self.token_len(text), 1) for text in texts]
+        batches = pack_batches(lengths, self.batch_tokens)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        headers = {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+        vectors = [None] * len(texts)
+
+        async with aiohttp.ClientSession(
+                headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout)
+        ) as session:
+
+            async def _run(batch: List[int]):
+                async with semaphore:
+                    batch_vectors = await self._post(
+                        session, [texts[i] for i in batch], sum(lengths[i] for i in batch)
+                    )
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+
+            await asyncio.gather(*(_run(batch) for batch in batches))
+
+        logger.info(
+            f'Embedded {len(texts)} texts in {len(batches)} batches '
+            f'({self.n_requests} requests, {self.n_retries} retries so far).'
+        )
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return run_sync(self.aembed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,320 @@
+import hashlib
+import logging
+import threading
+
+import faiss
+import numpy as np
+
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from langchain.docstore.document import Document
+from langchain.docstore.in_memory import InMemoryDocstore
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores import FAISS
+
+from src.utils.embedding_cache import normalize_text
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+COMPACT_RATIO = 0.25  # compact once this share of the index rows is deleted
+VECTOR_DTYPE = np.float32
+# METADATA KEYS
+DOC_ID_KEY = 'Document ID'
+CHUNK_HASH_KEY = 'Chunk Hash'
+# EVENTS
+ADD_EVENT = 'add'
+DELETE_EVENT = 'delete'
+COMPACT_EVENT = 'compact'
+
+
+def chunk_hash(text: str) -> str:
+    """The hex sha256 digest of a normalized chunk text."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class IndexManager(object):
+    """
+    A mutable vector index of many documents, e.g. the reports of several companies.
+
+    Chunks are keyed by document id and chunk hash. Adding or upserting a
+    document only embeds the chunks the index does not hold yet for that
+    document, and deleting a document only marks its rows as deleted, so
+    every change costs time proportional to the changed document. Deleted
+    rows are skipped by searches and dropped by `compact`, which runs on its
+    own once `compact_ratio` of the rows are deleted.
+
+    The manager answers `similarity_search` like a langchain FAISS store, so
+    it can be passed to ContextRetrieval as the vector store. Listeners
+    registered with `add_listener` are called after every change, e.g. to
+    invalidate cached query results.
+    """
+
+    def __init__(self, embedding: Embeddings, compact_ratio: float = COMPACT_RATIO):
+        """
+        Initializes the IndexManager object.
+
+        :param embedding: The embeddings of chunks and queries.
+        :param compact_ratio: The share of deleted rows that triggers a compaction.
+        """
+        self.embedding = embedding
+        self.compact_ratio = compact_ratio
+        self._index = None
+        self._documents = []  # per index row, None once deleted
+        self._rows = {}  # document id -> {chunk hash: index row}
+        self._n_deleted = 0
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        """Returns the number of live chunks."""
+        return len(self._documents) - self._n_deleted
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def document_ids(self) -> List[str]:
+        """Returns the ids of the indexed documents."""
+        return list(self._rows.keys())
+
+    def add_listener(self, listener: Callable[[str, Optional[str]], None]):
+        """
+        Register a callback run after every change with the event name
+        (ADD_EVENT, DELETE_EVENT or COMPACT_EVENT) and the document id, None
+        for compactions.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, doc_id: Optional[str]):
+        for listener in self._listeners:
+            listener(event, doc_id)
+
+    def _add_rows(self, vectors: np.ndarray, documents: List[Document]) -> List[int]:
+        if self._index is None:
+            self._index = faiss.IndexFlatL2(vectors.shape[1])
+        first = len(self._documents)
+        self._index.add(vectors)
+        self._documents.extend(documents)
+        return list(range(first, first + len(documents)))
+
+    def _delete_rows(self, rows: List[int]):
+        for row in rows:
+            if self._documents[row] is not None:
+                self._documents[row] = None
+                self._n_deleted += 1
+
+    def upsert_document(
+            self,
+            doc_id: str,
+            texts: List[str],
+            metadatas: Optional[List[Dict[str, Any]]] = None,
+            vectors: Optional[List[List[float]]] = None,
+    ) -> Dict[str, int]:
+        """
+        Make the index hold exactly the given chunks for a document.
+
+        Chunks already indexed for the document keep their vectors and take the
+        new metadata, new chunks are embedded and added, and chunks no longer
+        in `texts` are deleted. A chunk repeated within a document is indexed once.
+
+        :param doc_id: The document id, e.g. the report file name.
+        :param texts: The chunks of the document.
+        :param metadatas: Optional metadata dict per chunk.
+        :param vectors: Optional precomputed vector per chunk, skips embedding.
+        :return: A dict with the number of added, kept and deleted chunks.
+        :raises ValueError: If the lengths of texts, metadatas and vectors do not match.
+        """
+        for name, values in (('metadatas', metadatas), ('vectors', vectors)):
+            if values is not None and len(values) != len(texts):
+                raise ValueError(
+                    f"Length of texts: {len(texts)} does not match length of {name}: {len(values)}"
+                )
+
+        chunks = {}  # chunk hash -> position in texts, first occurrence wins
+        for i, text in enumerate(texts):
+            chunks.setdefault(chunk_hash(text), i)
+
+        with self._lock:
+            existing = self._rows.get(doc_id, {})
+            new = [(key, i) for key, i in chunks.items() if key not in existing]
+            kept = {key: row for key, row in existing.items() if key in chunks}
+            deleted = [row for key, row in existing.items() if key not in chunks]
+
+            for key, row in kept.items():
+                i = chunks[key]
+                metadata = {**(metadatas[i] if metadatas else {}), DOC_ID_KEY: doc_id, CHUNK_HASH_KEY: key}
+                self._documents[row] = Document(page_content=texts[i], metadata=metadata)
+
+            rows = dict(kept)
+            if new:
+                new_texts = [texts[i] for _, i in new]
+                if vectors is not None:
+                    new_vectors = [vectors[i] for _, i in new]
+                else:
+                    new_vectors = self.embedding.embed_documents(new_texts)
+                documents = [
+                    Document(
+                        page_content=texts[i],
+                        metadata={**(metadatas[i] if metadatas else {}), DOC_ID_KEY: doc_id, CHUNK_HASH_KEY: key},
+                    )
+                    for key, i in new
+                ]
+                new_rows = self._add_rows(np.asarray(new_vectors, dtype=VECTOR_DTYPE), documents)
+                rows.update(zip((key for key, _ in new), new_rows))
+
+            self._delete_rows(deleted)
+            if rows:
+                self._rows[doc_id] = rows
+            else:
+                self._rows.pop(doc_id, None)
+
+        counts = {'added': len(new), 'kept': len(kept), 'deleted': len(deleted)}
+        logger.info(f'Upserted document {doc_id}: {counts}')
+        self._notify(ADD_EVENT, doc_id)
+        self._maybe_compact()
+        return counts
+
+    def add_document(
+            self,
+            doc_id: str,
+            texts: List[str],
+            metadatas: Optional[List[Dict[str, Any]]] = None,
+            vectors: Optional[List[List[float]]] = None,
+    ) -> Dict[str, int]:
+        """
+        Add a new document, see `upsert_document`.
+
+        :raises ValueError: If the document is already indexed.
+        """
+        if doc_id in self._rows:
+            raise ValueError(f"Document {doc_id} is already indexed, use upsert_document to replace it.")
+        return self.upsert_document(doc_id, texts, metadatas, vectors)
+
+    def delete_document(self, doc_id: str) -> int:
+        """
+        Delete every chunk of a document.
+
+        :param doc_id: The document id.
+        :return: The number of deleted chunks.
+        :raises KeyError: If the document is not indexed.
+        """
+        with self._lock:
+            if doc_id not in self._rows:
+                raise KeyError(f"Document {doc_id} is not indexed.")
+            rows = list(self._rows.pop(doc_id).values())
+            self._delete_rows(rows)
+
+        logger.info(f'Deleted document {doc_id} ({len(rows)} chunks).')
+        self._notify(DELETE_EVENT, doc_id)
+        self._maybe_compact()
+        return len(rows)
+
+    def _maybe_compact(self):
+        if self._documents and self._n_deleted / len(self._documents) >= self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """Rebuild the index without the deleted rows."""
+        with self._lock:
+            if not self._n_deleted:
+                return
+            live = [row for row, document in enumerate(self._documents) if document is not None]
+            vectors = self._index.reconstruct_n(0, self._index.ntotal)[live]
+            index = faiss.IndexFlatL2(self._index.d)
+            index.add(vectors)
+
+            new_row = {row: i for i, row in enumerate(live)}
+            self._rows = {
+                doc_id: {key: new_row[row] for key, row in rows.items()}
+                for doc_id, rows in self._rows.items()
+            }
+            self._documents = [self._documents[row] for row in live]
+            self._index = index
+            n_deleted, self._n_deleted = self._n_deleted, 0
+
+        logger.info(f'Compacted the index: dropped {n_deleted} deleted rows, {len(live)} remain.')
+        self._notify(COMPACT_EVENT, None)
+
+    @property
+    def embedding_function(self) -> Callable[[str], List[float]]:
+        """The query embedding function, like a langchain FAISS store's."""
+        return self.embedding.embed_query
+
+    def similarity_search_with_score_by_vector(
+            self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        """
+        Return the k live chunks closest to a vector, with their L2 distances.
+
+        Deleted rows are over-fetched and skipped, so results are exact.
+        """
+        with self._lock:
+            if self._index is None or not len(self):
+                return []
+            n_fetch = min(k + self._n_deleted, self._index.ntotal)
+            distances, rows = self._index.search(np.asarray([embedding], dtype=VECTOR_DTYPE), n_fetch)
+            results = []
+            for distance, row in zip(distances[0], rows[0]):
+                if row == -1 or self._documents[row] is None:
+                    continue
+                results.append((self._documents[row], float(distance)))
+                if len(results) == k:
+                    break
+            return results
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def to_vector_store(self) -> Optional[FAISS]:
+        """
+        Compact the index and return it as a langchain FAISS vector store, e.g. to
+        save it with `artifacts.save_vector_store`. The store shares the index.
+
+        :return: The FAISS vector store, None if nothing was indexed yet.
+        """
+        self.compact()
+        with self._lock:
+            if self._index is None:
+                return None
+            docstore = InMemoryDocstore({str(row): document for row, document in enumerate(self._documents)})
+            index_to_docstore_id = {row: str(row) for row in range(len(self._documents))}
+            return FAISS(self.embedding.embed_query, self._index, docstore, index_to_docstore_id)
+
+    @classmethod
+    def from_vector_store(
+            cls, vector_store: FAISS, embedding: Embeddings, doc_id_key: str = DOC_ID_KEY, **kwargs
+    ) -> 'IndexManager':
+        """
+        Build a manager from an existing FAISS vector store without re-embedding.
+
+        :param vector_store: The FAISS vector store, with a flat index.
+        :param embedding: The embeddings of chunks and queries.
+        :param doc_id_key: The metadata key holding the document id of a chunk,
+                           e.g. a source file name key for stores built by DocumentVectorizer.
+        :param kwargs: Options passed to IndexManager.
+        :return: The IndexManager.
+        :raises KeyError: If a chunk has no `doc_id_key` metadata.
+        """
+        manager = cls(embedding, **kwargs)
+        vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+        by_doc = {}
+        for row in range(vector_store.index.ntotal):
+            document = vector_store.docstore.search(vector_store.index_to_docstore_id[row])
+            doc_id = document.metadata[doc_id_key]
+            texts, metadatas, rows = by_doc.setdefault(doc_id, ([], [], []))
+            texts.append(document.page_content)
+            metadatas.append(document.metadata)
+            rows.append(row)
+        for doc_id, (texts, metadatas, rows) in by_doc.items():
+            manager.upsert_document(doc_id, texts, metadatas, vectors=vectors[rows])
+        return manager
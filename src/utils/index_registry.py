@@ -0,0 +1,275 @@
+import os
+import json
+import logging
+import threading
+
+import faiss
+import numpy as np
+
+from typing import List, Dict, Any, Optional, Tuple, Union
+from langchain.docstore.base import Docstore
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores import FAISS
+
+from src.utils.artifacts import Artifact, MANIFEST_FILE, INDEX_FILE, CREATED_KEY, HAS_INDEX_KEY
+from src.utils.lexical_index import BM25Index
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+SEARCH_BLOCK = 65536  # vectors scored per block, bounds the temporary memory of a search
+
+_STORES = {}  # real artifact path -> (artifact version, SharedIndex)
+_STORES_LOCK = threading.Lock()
+
+
+class MmapFlatIndex(object):
+    """
+    A read-only exact L2 index searching the memory-mapped vectors of an artifact.
+
+    faiss.IndexFlatL2 copies every vector into its own memory. This index
+    scores queries straight against the mapped file instead, so every
+    process using the artifact shares one copy of the vectors through the
+    OS page cache. It implements the parts of the faiss index interface used
+    by langchain's FAISS store and by this repo.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        """
+        Initializes the MmapFlatIndex object.
+
+        :param vectors: The (n, dim) float32 vectors, e.g. `Artifact.vectors`.
+        """
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+        self._norms = None
+
+    @property
+    def norms(self) -> np.ndarray:
+        """The squared L2 norm of every vector, computed on the first search."""
+        if self._norms is None:
+            norms = np.zeros(self.ntotal, dtype=np.float32)
+            for start in range(0, self.ntotal, SEARCH_BLOCK):
+                block = self.vectors[start:start + SEARCH_BLOCK]
+                norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+            self._norms = norms
+        return self._norms
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest vectors of every query, like faiss.Index.search.
+
+        :param queries: The (n queries, dim) float32 queries.
+        :param k: The number of neighbours.
+        :return: (distances, indices) arrays of shape (n queries, k), padded with
+                 inf and -1 if the index holds fewer than k vectors.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        n_queries = len(queries)
+        distances = np.full((n_queries, k), np.inf, dtype=np.float32)
+        indices = np.full((n_queries, k), -1, dtype=np.int64)
+        if not self.ntotal or not k:
+            return distances, indices
+
+        query_norms = np.einsum('ij,ij->i', queries, queries)[:, None]
+        norms = self.norms
+        for start in range(0, self.ntotal, SEARCH_BLOCK):
+            block = self.vectors[start:start + SEARCH_BLOCK]
+            block_distances = norms[start:start + len(block)] - 2 * queries @ block.T + query_norms
+            # merge this block's best k into the running best k
+            merged_distances = np.concatenate([distances, block_distances], axis=1)
+            merged_indices = np.concatenate(
+                [indices, np.broadcast_to(np.arange(start, start + len(block)), block_distances.shape)], axis=1
+            )
+            best = np.argpartition(merged_distances, k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(merged_distances, best, axis=1)
+            indices = np.take_along_axis(merged_indices, best, axis=1)
+
+        order = np.argsort(distances, axis=1)
+        distances = np.maximum(np.take_along_axis(distances, order, axis=1), 0)
+        return distances.astype(np.float32), np.take_along_axis(indices, order, axis=1)
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        return np.array(self.vectors[start:start + n])
+
+    def add(self, vectors: np.ndarray):
+        raise TypeError("Shared artifact indexes are read-only, rebuild the artifact to add vectors.")
+
+
+class ArtifactDocstore(Docstore):
+    """
+    A read-only docstore over the chunks of an artifact, keyed by row number.
+
+    Chunk texts stay in the memory-mapped chunk buffer and Documents are only
+    created for search results, instead of one Document per chunk per process.
+    """
+
+    def __init__(self, artifact: Artifact):
+        self.artifact = artifact
+
+    def search(self, search: Union[str, int]) -> Union[str, Document]:
+        try:
+            row = int(search)
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= row < len(self.artifact):
+            return f"ID {search} not found."
+        return Document(page_content=self.artifact.chunks[row], metadata=dict(self.artifact.metadata[row]))
+
+
+class _RowIds(object):
+    """The index row to docstore id mapping of an artifact: the identity, without a dict per row."""
+
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+
+    def __getitem__(self, row: int) -> int:
+        if not 0 <= row < self.n_rows:
+            raise KeyError(row)
+        return int(row)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def get(self, row: int, default: Any = None) -> Any:
+        try:
+            return self[row]
+        except KeyError:
+            return default
+
+
+class SharedIndex(object):
+    """The read-only, process-wide parts of a vector store: index, docstore and row ids."""
+
+    def __init__(self, dir_path: str):
+        """
+        Initializes the SharedIndex object.
+
+        :param dir_path: The artifact directory.
+        :raises ValueError: If the artifact holds no vectors.
+        """
+        self.artifact = Artifact(dir_path)
+        if self.artifact.manifest[HAS_INDEX_KEY]:
+            self.index = _read_index_mmap(os.path.join(dir_path, INDEX_FILE))
+        elif self.artifact.vectors is not None:
+            self.index = MmapFlatIndex(self.artifact.vectors)
+        else:
+            raise ValueError(f"Artifact {dir_path} holds no vectors.")
+        self.docstore = ArtifactDocstore(self.artifact)
+        self.index_to_docstore_id = _RowIds(len(self.artifact))
+        self._lexical_index = None
+        self._table_index = None
+        self._lexical_lock = threading.Lock()
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        """The BM25 index of the chunks, built on first use and shared like the vector index."""
+        with self._lexical_lock:
+            if self._lexical_index is None:
+                self._lexical_index = BM25Index.from_texts(self.artifact.chunks)
+            return self._lexical_index
+
+    @property
+    def table_index(self):
+        """The search.TableIndex of the table chunks, built on first use and shared like the vector index."""
+        from src.utils.search import TableIndex
+        with self._lexical_lock:
+            if self._table_index is None:
+                self._table_index = TableIndex.from_texts(self.artifact.chunks, self.index)
+            return self._table_index
+
+    @property
+    def version(self) -> str:
+        return self.artifact.manifest[CREATED_KEY]
+
+    def vector_store(self, embedding: Optional[Embeddings] = None) -> FAISS:
+        """
+        A FAISS vector store over the shared parts, cheap enough to create per session.
+        Artifacts storing local embeddings are queried with those, see `Artifact.query_embeddings`.
+        """
+        embedding = self.artifact.query_embeddings(embedding)
+        return FAISS(embedding.embed_query, self.index, self.docstore, self.index_to_docstore_id)
+
+
+def _read_index_mmap(path: str):
+    """Read a faiss index memory-mapped where the index type allows it, else into memory."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def _artifact_version(dir_path: str) -> str:
+    with open(os.path.join(dir_path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)[CREATED_KEY]
+
+
+def shared_index(dir_path: str) -> SharedIndex:
+    """
+    Return this process' shared index of an artifact, loading it on first use.
+
+    The artifact is loaded again if it was rewritten since, e.g. after a
+    re-ingestion; sessions holding the previous version keep using it.
+
+    :param dir_path: The artifact directory.
+    :return: The SharedIndex.
+    """
+    path = os.path.realpath(dir_path)
+    version = _artifact_version(path)
+    with _STORES_LOCK:
+        entry = _STORES.get(path)
+        if entry is None or entry[0] != version:
+            entry = (version, SharedIndex(path))
+            _STORES[path] = entry
+            logger.info(f'Loaded shared index {path} ({len(entry[1].artifact)} chunks).')
+        return entry[1]
+
+
+def get_vector_store(dir_path: str, embedding: Optional[Embeddings] = None) -> FAISS:
+    """
+    A FAISS vector store over the shared, memory-mapped index of an artifact.
+
+    Every call after the first returns in microseconds and shares the index,
+    chunk texts and vectors with all other sessions of the process, and
+    through the page cache with other processes mapping the same artifact.
+    The store is read-only.
+
+    :param dir_path: The artifact directory.
+    :param embedding: The query embeddings. Defaults to the embeddings stored with the
+                      artifact, else to the deployment's embedding backend.
+    :return: The FAISS vector store, e.g. for ContextRetrieval.
+    """
+    shared = shared_index(dir_path)
+    if embedding is None and shared.artifact.embeddings is None:
+        from src.utils.search import embedding_backend
+        embedding = embedding_backend()
+    return shared.vector_store(embedding)
+
+
+def preload(dir_paths: List[str]) -> Dict[str, int]:
+    """
+    Load the shared indexes of several artifacts, e.g. at server start, so no
+    session pays for loading them. Also computes the flat index norms.
+
+    :param dir_paths: The artifact directories.
+    :return: The number of chunks per artifact.
+    """
+    counts = {}
+    for dir_path in dir_paths:
+        index = shared_index(dir_path)
+        if isinstance(index.index, MmapFlatIndex):
+            index.index.norms
+        counts[dir_path] = len(index.artifact)
+    return counts
+
+
+def clear():
+    """Forget every shared index of this process."""
+    with _STORES_LOCK:
+        _STORES.clear()
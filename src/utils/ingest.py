@@ -0,0 +1,191 @@
+import os
+import logging
+
+from typing import List, Dict, Any, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils.loader import (
+    PDFLoader, DOXCLoader, dataframe_rows,
+    PYPDF2_KEY, TABULA_KEY, TEXT_KEY, TABLE_KEY,
+)
+from src.utils.tabula_batch import TabulaBatch
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+PDF_EXTENSION = '.pdf'
+DOXC_EXTENSION = '.doxc'
+PAGES_PER_TASK = 16
+# DICT KEYS
+FILE_KEY = "file"
+ERROR_KEY = "error"
+
+
+def _count_pages(file_path: str) -> int:
+    return PDFLoader.count_pages(file_path)
+
+
+def _extract_page_range(file_path: str, key: str, pages: Tuple[int, int]) -> List[str]:
+    return [text for _, text in PDFLoader.TEXT_ITERATORS[key](file_path, pages)]
+
+
+def _extract_tables(file_path: str, key: str) -> Any:
+    return PDFLoader.TABLE_LOADERS[key](file_path)
+
+
+def _extract_doxc(file_path: str) -> Dict:
+    loader = DOXCLoader(os.path.basename(file_path), dir_path=os.path.dirname(file_path))
+    return loader.doxc_load_all()
+
+
+def _page_ranges(n_pages: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    """Split pages 1..n_pages into consecutive (first, last) ranges, 1-based and inclusive."""
+    return [
+        (first, min(first + pages_per_task - 1, n_pages))
+        for first in range(1, n_pages + 1, pages_per_task)
+    ]
+
+
+def _error_message(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def list_reports(dir_path: str) -> List[str]:
+    """
+    List the PDF and DOXC reports in a directory, sorted by name so that
+    batch outputs come back in a deterministic order.
+
+    :param dir_path: The directory holding the reports.
+    :return: A list of file names.
+    """
+    return sorted(
+        file_name for file_name in os.listdir(dir_path)
+        if os.path.isfile(os.path.join(dir_path, file_name))
+        and os.path.splitext(file_name)[1].lower() in (PDF_EXTENSION, DOXC_EXTENSION)
+    )
+
+
+def ingest_directory(
+        dir_path: str,
+        file_names: Optional[List[str]] = None,
+        text_key: str = PYPDF2_KEY,
+        table_key: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        pages_per_task: int = PAGES_PER_TASK,
+) -> List[Dict[str, Any]]:
+    """
+    Extract a directory of PDF and DOXC reports on a process pool.
+
+    PDFs are split into ranges of `pages_per_task` pages so that long reports
+    are spread over all workers rather than pinning a single core; DOXC files
+    are extracted whole with `DOXCLoader.doxc_load_all`. Tabula tables of all
+    PDFs are extracted by a single tabula-java run (see `TabulaBatch`) while
+    the pool extracts text. A failure in one file is recorded under
+    `ERROR_KEY` for that file and does not abort the batch.
+
+    :param dir_path: The directory holding the reports.
+    :param file_names: The files to ingest. Defaults to every report in `dir_path`.
+    :param text_key: The PDF text loader key, must have a registered text iterator.
+    :param table_key: Optional PDF table loader key. Tables are skipped if None.
+    :param max_workers: The number of worker processes. Defaults to the CPU count.
+    :param pages_per_task: The number of PDF pages extracted per task.
+    :return: One dict per file, in the order of `file_names`, holding `FILE_KEY`,
+             `ERROR_KEY` and the extracted content. PDF text is a list of page strings.
+    """
+    if text_key not in PDFLoader.TEXT_ITERATORS.keys():
+        raise KeyError(
+            f"The following text iterators: {[PDFLoader.TEXT_ITERATORS.keys()]} are supported. "
+            f"Not {text_key}"
+        )
+    if table_key is not None and table_key not in PDFLoader.TABLE_LOADERS.keys():
+        raise KeyError(
+            f"The following table loaders: {[PDFLoader.TABLE_LOADERS.keys()]} are supported. "
+            f"Not {table_key}"
+        )
+
+    if file_names is None:
+        file_names = list_reports(dir_path)
+
+    results = [{FILE_KEY: file_name, ERROR_KEY: None} for file_name in file_names]
+    paths = [os.path.join(dir_path, file_name) for file_name in file_names]
+    is_pdf = [path.lower().endswith(PDF_EXTENSION) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Page counts first, so that page ranges can be scheduled across workers.
+        page_counts = {
+            i: executor.submit(_count_pages, path)
+            for i, path in enumerate(paths) if is_pdf[i]
+        }
+
+        text_futures, other_futures = {}, {}
+        for i, path in enumerate(paths):
+            if not is_pdf[i]:
+                other_futures[i] = executor.submit(_extract_doxc, path)
+                continue
+            if table_key is not None and table_key != TABULA_KEY:
+                other_futures[i] = executor.submit(_extract_tables, path, table_key)
+
+        for i, future in page_counts.items():
+            try:
+                n_pages = future.result()
+            except Exception as e:
+                results[i][ERROR_KEY] = _error_message(e)
+                continue
+            text_futures[i] = [
+                executor.submit(_extract_page_range, paths[i], text_key, pages)
+                for pages in _page_ranges(n_pages, pages_per_task)
+            ]
+
+        if table_key == TABULA_KEY:
+            # One JVM for every PDF, running alongside the text workers.
+            pdf_indices = [i for i in range(len(paths)) if is_pdf[i]]
+            n_done = 0
+            try:
+                tabula_batch = TabulaBatch()
+                for i in pdf_indices:
+                    tabula_batch.submit(paths[i])
+                for i, (_, _, dfs, error) in zip(pdf_indices, tabula_batch.run()):
+                    n_done += 1
+                    if error is not None:
+                        results[i][ERROR_KEY] = results[i][ERROR_KEY] or error
+                        continue
+                    results[i][TABLE_KEY] = dataframe_rows(dfs)
+            except Exception as e:
+                # e.g. no Java runtime: every PDF without tables yet fails, the other files are still ingested
+                for i in pdf_indices[n_done:]:
+                    results[i][ERROR_KEY] = results[i][ERROR_KEY] or _error_message(e)
+
+        # Collect in submission order, so output order never depends on scheduling.
+        for i, futures in text_futures.items():
+            text = []
+            try:
+                for future in futures:
+                    text.extend(future.result())
+            except Exception as e:
+                results[i][ERROR_KEY] = _error_message(e)
+                continue
+            results[i][TEXT_KEY] = text
+
+        for i, future in other_futures.items():
+            try:
+                content = future.result()
+            except Exception as e:
+                results[i][ERROR_KEY] = results[i][ERROR_KEY] or _error_message(e)
+                continue
+            if is_pdf[i]:
+                results[i][TABLE_KEY] = content
+            else:
+                results[i].update(content)
+
+    failed = [result[FILE_KEY] for result in results if result[ERROR_KEY] is not None]
+    logger.info(
+        f'Ingested {len(results) - len(failed)} of {len(results)} files from {dir_path}.'
+    )
+    if failed:
+        logger.warning(f'Failed to ingest: {failed}')
+    return results
@@ -0,0 +1,160 @@
+import re
+import math
+import logging
+
+import numpy as np
+
+from typing import List, Tuple, Iterable, Optional
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+# words, numbers and codes such as co2e, 305-1, 1,234.5 or tco2/mwh
+TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[.,\-/][a-z0-9]+)*")
+CODE_PATTERN = re.compile(r"^(?=.*\d)\S+$|^[A-Z][A-Z0-9\-/]+$")  # holds a digit, or all capitals: CO2e, 305-1, GRI
+QUOTED_PATTERN = re.compile(r'^\s*"[^"]+"\s*$')
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # rank constant of reciprocal rank fusion
+LEXICAL_MAX_WORDS = 4
+
+
+def terms(text: str, bigrams: bool = True) -> List[str]:
+    """
+    The lower case terms of a text, followed by its adjacent term pairs, so
+    phrases such as "scope 2" match as a whole.
+    """
+    words = TERM_PATTERN.findall(text.lower())
+    if not bigrams:
+        return words
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def is_lexical_query(query: str) -> bool:
+    """
+    Whether a query asks for exact terms rather than a meaning: a quoted
+    query, or a few words that are all codes, numbers or acronyms, e.g.
+    'CO2e', 'GRI 305-1' or '"market-based"'.
+    """
+    if QUOTED_PATTERN.match(query):
+        return True
+    words = query.split()
+    return 0 < len(words) <= LEXICAL_MAX_WORDS and all(CODE_PATTERN.match(word) for word in words)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = RRF_K) -> List[int]:
+    """
+    Fuse several rankings of the same ids: every id scores the sum of
+    1 / (k + rank) over the rankings it appears in.
+
+    :param rankings: Lists of ids, best first.
+    :param k: The rank constant, damping the weight of the top ranks.
+    :return: The ids of all rankings, best fused score first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking, start=1):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index(object):
+    """
+    An inverted index ranking chunks with Okapi BM25.
+
+    Rows are numbered in the order texts are added, which is the row order of
+    the FAISS store built from the same texts, so lexical and vector hits can
+    be fused by row. A query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, bigrams: bool = True):
+        """
+        Initializes the BM25Index object.
+
+        :param k1: The term frequency saturation.
+        :param b: The document length normalisation, 0 (none) to 1 (full).
+        :param bigrams: Whether adjacent term pairs are indexed as well.
+        """
+        self.k1 = k1
+        self.b = b
+        self.bigrams = bigrams
+        self._postings = {}  # term -> ([row, ...], [term frequency, ...])
+        self._lengths = []
+        self._arrays = {}  # term -> (rows, frequencies) arrays, built on first query
+        self._norm = None  # per row length normalisation, built on first query
+
+    def __len__(self) -> int:
+        """Returns the number of indexed rows."""
+        return len(self._lengths)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], **kwargs) -> 'BM25Index':
+        index = cls(**kwargs)
+        index.add(texts)
+        return index
+
+    def add(self, texts: Iterable[str]) -> List[int]:
+        """
+        Index texts as the next rows.
+
+        :param texts: The chunk texts.
+        :return: The rows of the texts.
+        """
+        first = len(self._lengths)
+        for row, text in enumerate(texts, start=first):
+            counts = {}
+            for term in terms(text, self.bigrams):
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                rows, frequencies = self._postings.setdefault(term, ([], []))
+                rows.append(row)
+                frequencies.append(count)
+            self._lengths.append(sum(counts.values()))
+        self._arrays, self._norm = {}, None
+        return list(range(first, len(self._lengths)))
+
+    def _posting(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if term not in self._arrays:
+            if term not in self._postings:
+                return None
+            rows, frequencies = self._postings[term]
+            self._arrays[term] = (np.array(rows, dtype=np.int64), np.array(frequencies, dtype=np.float32))
+        return self._arrays[term]
+
+    def scores(self, query: str) -> np.ndarray:
+        """The BM25 score of every row for a query, 0 for rows sharing no term with it."""
+        scores = np.zeros(len(self._lengths), dtype=np.float32)
+        if not self._lengths:
+            return scores
+        if self._norm is None:
+            lengths = np.asarray(self._lengths, dtype=np.float32)
+            self._norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        n_rows, norm = len(self._lengths), self._norm
+        for term in set(terms(query, self.bigrams)):
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            rows, frequencies = posting
+            idf = math.log(1 + (n_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norm[rows])
+        return scores
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """
+        Return the k best scoring rows of a query.
+
+        :param query: The query.
+        :param k: The maximum number of rows.
+        :return: (row, score) tuples, best first, only rows sharing a term with the query.
+        """
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        return [(int(row), float(scores[row])) for row in hits]
@@ -1,16 +1,34 @@
 import os
 import re
+import inspect
+import zipfile
 # import camelot
 import tabula
 import PyPDF2
 # import pdfplumber
 import slate3k as slate
 import docx
+import numpy as np
 
-from typing import List, Dict
+from io import StringIO
+from functools import partial
+from itertools import islice
+from typing import List, Dict, Iterator, Tuple, Optional
 from tqdm.auto import tqdm
 # from pdfminer.high_level import extract_text
 from docx2python import docx2python
+from src.utils.cache import ExtractionCache
+from src.utils.tables import ColumnarTable
+from src.utils.autotext import BackendSelector, SELECTION_FILE_NAME
+from src.utils.doxc_parser import (
+    W_P, W_TBL, iter_body, iter_body_pages, iter_numbered_body_pages, paragraph_text, table_rows, footnote_ids,
+    document_part_name, read_core_properties, read_footnotes,
+)
+from slate3k.classes import (
+    PDFParser, PDFDocument, PDFResourceManager,
+    PDFPageInterpreter as SlatePageInterpreter,
+    TextConverter, LAParams,
+)
 
 
 PYPDF2_KEY = 'pypdf2'
@@ -24,13 +42,24 @@ REGEX_KEY = 'regex'
 OCR_KEY = 'ocr'
 DOXC_KEY = 'doxc'
 DOXC2PYTHON_KEY = 'doxc2python'
+AUTO_KEY = 'auto'
 FIGURE_THRESHOLD = 0.1
 EPSILON = 1e-10
 REPEAT_THRESHOLD = 4
 MAX_CHAR_COUNT_FOR_FIGURE = 20
 FIGURE_RELATED_CHARS = r"[0123456789.%-]"
 COMMON_UNITS = ["kg", "m", "s", "h", "g", "cm", "mm", "l", "ml"]
+FIGURE_TEXT_ENDINGS = ('.', ':', ';', ',')
+SLATE_LAPARAMS = {'char_margin': 1.0, 'line_margin': 0.1, 'word_margin': 0.1}  # slate.PDF defaults
 DOCX_NAMESPACE = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+# Precompiled figure-data patterns, shared by the scalar and batch classifiers.
+# Patterns like '123 kg', '123kg', '0.5 m', '0.5m', etc.
+UNIT_PATTERN = re.compile(r'\d\s?(?:' + '|'.join(map(re.escape, COMMON_UNITS)) + r')(?![a-zA-Z])')
+FIGURE_CHAR_PATTERN = re.compile(FIGURE_RELATED_CHARS)
+# Footnote references, either bracketed ('[2]') or a bare number not directly preceded or followed by a digit.
+FOOTNOTE_REF_PATTERN = re.compile(r'\[([0-9]+)\]|(?<![0-9])([0-9]+)(?![0-9])')
+FIGURE_CHAR_LOOKUP = np.zeros(128, dtype=bool)  # ASCII code point -> is figure related
+FIGURE_CHAR_LOOKUP[[ord(char) for char in "0123456789.%-"]] = True
 # DICT KEYS
 METADATA_KEY = "metadata"
 COMP_KEY = "company"
@@ -47,53 +76,51 @@ def read_txt(filename: str):
     return contents
 
 
-def extract_footnotes_from_para(para, next_para=None):
-    """Extract footnote references and actual footnotes from a paragraph."""
-    footnotes = []
+def extract_footnotes_from_para(para, next_para=None, footnote_dict=None):
+    """
+    Extract footnote references and actual footnotes from a paragraph.
 
-    footnote_refs = para._element.findall('.//w:footnoteReference', namespaces=DOCX_NAMESPACE)
+    Pass the document's footnote id -> text map as `footnote_dict` (see
+    `doxc_parser.read_footnotes`) to avoid resolving it again for every paragraph.
+    """
+    if footnote_dict is None:
+        footnote_dict = {
+            footnote_id: footnote.text
+            for footnote_id, footnote in para.part.footnotes_part.footnote_dict.items()
+        }
 
-    for ref in footnote_refs:
-        footnote_id = ref.get("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}id")
-        footnote = para.part.footnotes_part.footnote_dict[footnote_id]
-        footnotes.append(footnote.text)
+    footnotes = [footnote_dict[footnote_id] for footnote_id in footnote_ids(para._element)]
 
     # Check in the next paragraph for footnotes if provided
-    if next_para:
-        next_footnote_refs = next_para._element.findall('.//w:footnoteReference', namespaces=DOCX_NAMESPACE)
-        for ref in next_footnote_refs:
-            footnote_id = ref.get("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}id")
-            footnote = next_para.part.footnotes_part.footnote_dict[footnote_id]
-            footnotes.append(footnote.text)
+    if next_para is not None and next_para._element is not None:
+        footnotes.extend(footnote_dict[footnote_id] for footnote_id in footnote_ids(next_para._element))
 
     return footnotes
 
 
 def process_footnotes(text, footnotes):
-    """Process and embed footnotes into the text."""
+    """
+    Process and embed footnotes into the text.
+
+    Footnote i (1-based) replaces both '[i]' and a bare 'i' that has no digit
+    directly before or after it, e.g. after words or at the end of sentences.
+    All references are substituted in a single regex pass over the text.
+    """
+    if not footnotes:
+        return text
 
-    # Existing replacement for footnotes within brackets
-    for idx, footnote in enumerate(footnotes, 1):
-        text = re.sub(r"\[{}\]".format(idx), "[{}]".format(footnote), text)
+    replacements = {str(idx): "[{}]".format(footnote) for idx, footnote in enumerate(footnotes, 1)}
 
-    # New addition: replace footnotes appearing directly after words or at the end of sentences
-    for idx, footnote in enumerate(footnotes, 1):
-        # This regex will look for a number that doesn't have another number directly before
-        # it (to differentiate from normal numbers within the text)
-        pattern = r'(?<![0-9])' + str(idx) + r'(?![0-9])'
-        replacement = "[{}]".format(footnote)
-        text = re.sub(pattern, replacement, text)
+    def _replace(match):
+        number = match.group(1) if match.group(1) is not None else match.group(2)
+        return replacements.get(number, match.group(0))
 
-    return text
+    return FOOTNOTE_REF_PATTERN.sub(_replace, text)
 
 
 def contains_unit(text):
     """Check if text contains a common unit following a number."""
-    for unit in COMMON_UNITS:
-        # Check for patterns like '123 kg', '123kg', '0.5 m', '0.5m', etc.
-        if re.search(r'\d\s?' + re.escape(unit) + r'(?![a-zA-Z])', text):
-            return True
-    return False
+    return UNIT_PATTERN.search(text) is not None
 
 
 def is_potential_figure_data(text):
@@ -101,7 +128,7 @@ def is_potential_figure_data(text):
         return False
 
     text_count = len(text) - text.count(' ')
-    figure_char_count = len(re.findall(FIGURE_RELATED_CHARS, text))
+    figure_char_count = len(FIGURE_CHAR_PATTERN.findall(text))
     char_count = text_count - figure_char_count
 
     # New: Check for units
@@ -110,7 +137,7 @@ def is_potential_figure_data(text):
     # New: Check for percentage patterns
     contains_percentage = "%" in text and any(char.isdigit() for char in text)
 
-    if (text_count == 0) or text.endswith(('.', ':', ';', ',')) or (char_count > MAX_CHAR_COUNT_FOR_FIGURE):
+    if (text_count == 0) or text.endswith(FIGURE_TEXT_ENDINGS) or (char_count > MAX_CHAR_COUNT_FOR_FIGURE):
         return False
 
     if (char_count == 0) or (figure_char_count / (
@@ -120,6 +147,52 @@ def is_potential_figure_data(text):
     return False
 
 
+def classify_figure_data(texts: List[Optional[str]]) -> List[bool]:
+    """
+    Batch version of `is_potential_figure_data`, returning the same decision for
+    every text of a document at once.
+
+    Character classes are counted over a single code point array of all texts,
+    so the per-text work left in Python is limited to the few candidates that
+    are not already decided by their figure-character ratio.
+
+    :param texts: The texts to classify. None is never figure data.
+    :return: A list of booleans, one per text.
+    """
+    decisions = [False] * len(texts)
+    indexes = [i for i, text in enumerate(texts) if text is not None]
+    if not indexes:
+        return decisions
+
+    strings = [texts[i] for i in indexes]
+    codes = np.frombuffer(''.join(strings).encode('utf-32-le'), dtype=np.uint32)
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    is_figure_char = np.zeros(len(codes), dtype=bool)
+    is_ascii = codes < len(FIGURE_CHAR_LOOKUP)
+    is_figure_char[is_ascii] = FIGURE_CHAR_LOOKUP[codes[is_ascii]]
+    figure_cumsum = np.concatenate(([0], np.cumsum(is_figure_char)))
+    space_cumsum = np.concatenate(([0], np.cumsum(codes == ord(' '))))
+
+    text_count = lengths - (space_cumsum[ends] - space_cumsum[starts])
+    figure_char_count = figure_cumsum[ends] - figure_cumsum[starts]
+    char_count = text_count - figure_char_count
+
+    is_candidate = (text_count != 0) & (char_count <= MAX_CHAR_COUNT_FOR_FIGURE)
+    is_numeric = (char_count == 0) | (figure_char_count / (char_count + EPSILON) > FIGURE_THRESHOLD)
+
+    for j in np.flatnonzero(is_candidate):
+        text = strings[j]
+        if text.endswith(FIGURE_TEXT_ENDINGS):
+            continue
+        decisions[indexes[j]] = bool(is_numeric[j]) or contains_unit(text.lower()) or (
+            "%" in text and any(char.isdigit() for char in text)
+        )
+    return decisions
+
+
 def repeated_artifact_check(line, artifact_dict):
     """Check if a line is a repeated artifact and update its count."""
     if line in artifact_dict:
@@ -131,21 +204,81 @@ def repeated_artifact_check(line, artifact_dict):
     return False
 
 
+def dataframe_rows(dfs) -> List[str]:
+    """
+    Flatten the DataFrames extracted by Tabula into table rows.
+
+    :param dfs: A list of DataFrames.
+    :return: A list of strings, where each string represents a table row.
+    """
+    result = []
+    for df in dfs:
+        for index, row in df.iterrows():
+            result.append(' '.join(row.astype(str)))
+    return result
+
+
 def _is_empty(text):
     return len(text) == 0
 
 
+def _page_bounds(pages: Optional[Tuple[int, int]], n_pages: Optional[int] = None) -> Tuple[int, Optional[int]]:
+    """
+    Resolve an optional (first, last) page range, 1-based and inclusive, against
+    the page count of a document (if known).
+    """
+    if pages is None:
+        return 1, n_pages
+
+    first, last = pages
+    if first < 1 or (last is not None and last < first):
+        raise ValueError(f"Invalid page range: {pages}")
+
+    if n_pages is not None:
+        last = n_pages if last is None else min(last, n_pages)
+    return first, last
+
+
 class Loader(object):
 
     TEXT_LOADERS = {}
+    TEXT_ITERATORS = {}
     TABLE_LOADERS = {}
     FIGURE_LOADERS = {}
+    TEXT_PER_PAGE = True  # whether the text loaders return one text per page
 
-    def __init__(self, file_path: str, dir_path: str):
+    def __init__(self, file_path: str, dir_path: str, cache: Optional[ExtractionCache] = None):
         self._path = None  # Initialize _path to None
         self.path = os.path.join(dir_path, file_path)
+        self.cache = cache
 
-    def load_tables(self, key: str):
+    def _load(self, loader, cache_key: str, pages: Optional[Tuple[int, int]] = None, **kwargs):
+        """
+        Run a loader on the file, going through the extraction cache if one is set.
+
+        :param loader: The loader function, called with the file path.
+        :param cache_key: The key identifying the loader within the cache.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive,
+                      passed on to the loader. Only loaders with a `pages` argument
+                      support page ranges.
+        :param kwargs: Options passed on to the loader that do not change its output,
+                       so they are not part of the cache key.
+        :return: The loader output.
+        """
+        if pages is None:
+            args = (self.path,)
+        else:
+            if 'pages' not in inspect.signature(getattr(loader, '__func__', loader)).parameters:
+                raise ValueError(f"The {cache_key} loader does not support page ranges.")
+            _page_bounds(pages)  # validate before extracting anything
+            args = (self.path, pages)
+            cache_key = f"{cache_key}-p{pages[0]}-{pages[1]}"
+
+        if self.cache is None:
+            return loader(*args, **kwargs)
+        return self.cache.get_or_compute(self.path, cache_key, loader, *args, **kwargs)
+
+    def load_tables(self, key: str, pages: Optional[Tuple[int, int]] = None):
 
         if key not in self.TABLE_LOADERS.keys():
             raise KeyError(
@@ -153,9 +286,9 @@ class Loader(object):
                 f"Not {key}"
             )
 
-        return self.TABLE_LOADERS[key](self.path)
+        return self._load(self.TABLE_LOADERS[key], f"{TABLE_KEY}-{key}", pages)
 
-    def load_text(self, key: str):
+    def load_text(self, key: str, pages: Optional[Tuple[int, int]] = None):
 
         if key not in self.TEXT_LOADERS.keys():
             raise KeyError(
@@ -163,9 +296,32 @@ class Loader(object):
                 f"Not {key}"
             )
 
-        return self.TEXT_LOADERS[key](self.path)
+        return self._load(self.TEXT_LOADERS[key], f"{TEXT_KEY}-{key}", pages)
+
+    def iter_text(self, key: str, pages: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily extract text one page at a time, so that downstream chunking can
+        start before the whole document has been parsed.
+
+        Backends without a registered streaming iterator fall back to
+        enumerating the output of the corresponding text loader. Where the
+        loader does not return one text per page, the page is unknown.
 
-    def load_figure(self, key: str):
+        :param key: The text loader key.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :return: An iterator of (page number, text) tuples. Page numbers start at 1,
+                 and are None if the backend does not know the pages.
+        """
+        if key in self.TEXT_ITERATORS.keys():
+            return self.TEXT_ITERATORS[key](self.path, pages)
+
+        first, _ = _page_bounds(pages)
+        texts = self.load_text(key, pages)
+        if not self.TEXT_PER_PAGE:
+            return ((None, text) for text in texts)
+        return enumerate(texts, start=first)
+
+    def load_figure(self, key: str, pages: Optional[Tuple[int, int]] = None):
 
         if key not in self.FIGURE_LOADERS.keys():
             raise KeyError(
@@ -173,14 +329,14 @@ class Loader(object):
                 f"Not {key}"
             )
 
-        return self.FIGURE_LOADERS[key](self.path)
+        return self._load(self.FIGURE_LOADERS[key], f"{FIGURE_KEY}-{key}", pages)
 
 
 # TODO: Finalise, text, table, and figure loaders
 class DOXCLoader(Loader):
 
-    def __init__(self, file_path, dir_path='./data/doxc_db'):
-        super().__init__(file_path=file_path, dir_path=dir_path)
+    def __init__(self, file_path, dir_path='./data/doxc_db', cache=None):
+        super().__init__(file_path=file_path, dir_path=dir_path, cache=cache)
 
     @property
     def path(self):
@@ -199,13 +355,15 @@ class DOXCLoader(Loader):
 
         self._path = new_path
 
-    def docx2python_text_loader(self) -> List[str]:
+    @staticmethod
+    def docx2python_text_loader(file_path: str) -> List[str]:
         """
         Extract text from a .doxc file using docx2python.
+        :param file_path: The path to the DOXC file.
         :return: A list of strings, where each string represents a block of text.
         """
         # Extract the .doxc content
-        docx_content = docx2python(self.path)
+        docx_content = docx2python(file_path)
         text_content = []
 
         # docx2python represents the docx as a list of lists.
@@ -222,73 +380,132 @@ class DOXCLoader(Loader):
 
         return text_content
 
-    def doxc_text_loader(self) -> List[str]:
+    @staticmethod
+    def iter_page_elements(file_path: str, pages: Tuple[int, int]) -> Iterator:
+        """
+        Stream the paragraph and table elements of a .doxc file that start within a
+        page range, without parsing the document past the end of the range.
+        :param file_path: The path to the DOXC file.
+        :param pages: (first, last) page numbers, 1-based and inclusive.
+        :return: An iterator of w:p and w:tbl elements.
+        """
+        with zipfile.ZipFile(file_path) as archive:
+            for elem, _ in iter_body_pages(archive, document_part_name(archive), _page_bounds(pages)):
+                yield elem
+
+    @staticmethod
+    def _paragraph_texts(file_path: str, pages: Optional[Tuple[int, int]] = None) -> List[str]:
+        if pages is None:
+            return [paragraph.text for paragraph in docx.Document(file_path).paragraphs]
+        return [
+            paragraph_text(elem) for elem in DOXCLoader.iter_page_elements(file_path, pages)
+            if elem.tag == W_P
+        ]
+
+    @staticmethod
+    def doxc_text_loader(file_path: str, pages: Optional[Tuple[int, int]] = None) -> List[str]:
         """
         Extract text from a .doxc file.
+        :param file_path: The path to the DOXC file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
         :return: A list of strings, where each string represents a block of text.
         """
-        doc = docx.Document(self.path)
         text_content = []
-        for paragraph in doc.paragraphs:
-            processed_text = paragraph.text.strip()
+        for text in DOXCLoader._paragraph_texts(file_path, pages):
+            processed_text = text.strip()
             if not _is_empty(processed_text):
                 text_content.append(processed_text)
         return text_content
 
-    def doxc_fig_loader(self) -> List[Dict]:
+    @staticmethod
+    def doxc_text_iterator(
+            file_path: str, pages: Optional[Tuple[int, int]] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily extract text from a .doxc file, one page at a time. Pages follow the
+        page breaks Word recorded in the document, see `doxc_parser.page_breaks`.
+        :param file_path: The path to the DOXC file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :return: An iterator of (page number, text) tuples, the paragraphs of a page
+                 joined by line breaks. Pages without text are skipped.
+        """
+        page_number, texts = None, []
+        with zipfile.ZipFile(file_path) as archive:
+            for page, elem, _ in iter_numbered_body_pages(
+                    archive, document_part_name(archive), _page_bounds(pages)
+            ):
+                if elem.tag != W_P:
+                    continue
+                text = paragraph_text(elem).strip()
+                if _is_empty(text):
+                    continue
+                if page != page_number and texts:
+                    yield page_number, '\n'.join(texts)
+                    texts = []
+                page_number = page
+                texts.append(text)
+        if texts:
+            yield page_number, '\n'.join(texts)
+
+    @staticmethod
+    def doxc_fig_loader(file_path: str, pages: Optional[Tuple[int, int]] = None) -> List[Dict]:
         """
         Extract figures from a .doxc file.
+        :param file_path: The path to the DOXC file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
         :return: A list of dicts, each containing the title and data of a figure.
         """
-        doc = docx.Document(self.path)
         figures = []
         figure_data_group = {'title': None, 'data': []}
         previous_text = None
 
-        for paragraph in doc.paragraphs:
-            processed_text = paragraph.text.strip()
-            if not _is_empty(processed_text):
-                current_is_figure_data = is_potential_figure_data(processed_text)
-                if current_is_figure_data:
-                    if not figure_data_group['title']:
-                        figure_data_group['title'] = previous_text
-                    figure_data_group['data'].append(processed_text)
-                else:
-                    if figure_data_group['data']:
-                        figures.append(figure_data_group)
-                        figure_data_group = {'title': None, 'data': []}
-                previous_text = processed_text
+        texts = [text.strip() for text in DOXCLoader._paragraph_texts(file_path, pages)]
+        texts = [text for text in texts if not _is_empty(text)]
+        for processed_text, current_is_figure_data in zip(texts, classify_figure_data(texts)):
+            if current_is_figure_data:
+                if not figure_data_group['title']:
+                    figure_data_group['title'] = previous_text
+                figure_data_group['data'].append(processed_text)
+            else:
+                if figure_data_group['data']:
+                    figures.append(figure_data_group)
+                    figure_data_group = {'title': None, 'data': []}
+            previous_text = processed_text
         return figures
 
-    def doxc_table_loader(self) -> List[Dict]:
+    @staticmethod
+    def doxc_table_loader(file_path: str, pages: Optional[Tuple[int, int]] = None) -> List[ColumnarTable]:
         """
         Extract tables from a .doxc file.
-        :return: A list of dicts, each containing the title, column headers, and rows of a table.
+        :param file_path: The path to the DOXC file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :return: A list of ColumnarTable, each containing the title, column headers, and columns of a table.
         """
-        doc = docx.Document(self.path)
+        if pages is None:
+            doc_tables = [
+                [[cell.text for cell in row.cells] for row in table.rows]
+                for table in docx.Document(file_path).tables
+            ]
+        else:
+            doc_tables = [
+                table_rows(elem) for elem in DOXCLoader.iter_page_elements(file_path, pages)
+                if elem.tag == W_TBL
+            ]
         tables = []
         previous_text = None
 
-        for table in doc.tables:
-            headers = [cell.text.strip() for cell in table.rows[0].cells]
-            rows = []
-
-            for row in table.rows[1:]:
-                row_data = {headers[j]: cell.text.strip() for j, cell in enumerate(row.cells)}
-                rows.append(row_data)
+        for table in doc_tables:
+            headers = [cell.strip() for cell in table[0]]
+            rows = [[cell.strip() for cell in row] for row in table[1:]]
 
-            tables.append({
-                'title': previous_text,
-                'col_headers': headers,
-                TABLE_ROWS_KEY: rows
-            })
+            tables.append(ColumnarTable(headers, rows, title=previous_text))
 
             # Reset the previous_text if the title was just used
             previous_text = None
 
             # Update the previous_text with the last cell's text of the last row if it's not empty
             if rows and rows[-1]:
-                last_cell_text = list(rows[-1].values())[-1]
+                last_cell_text = list(dict(zip(headers, rows[-1])).values())[-1]
                 if last_cell_text.strip():
                     previous_text = last_cell_text
 
@@ -296,21 +513,89 @@ class DOXCLoader(Loader):
 
     def doxc_load_all(
             self,
+            pages: Optional[Tuple[int, int]] = None,
     ) -> dict:
+        """
+        Extract text, tables and potential figures from the .doxc file in a single pass.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :return: A dict holding the document metadata, text, tables and potential figures.
+        """
+        return self._load(self.doxc_all_loader, f"all-{DOXC_KEY}", pages)
 
-        def _is_empty(text):
-            if len(text) == 0:
-                return True
-            return False
+    @staticmethod
+    def doxc_all_loader(
+            file_path: str,
+            pages: Optional[Tuple[int, int]] = None,
+    ) -> dict:
+        """
+        Extract text, tables and potential figures from a .doxc file in a single pass.
+        :param file_path: The path to the DOXC file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive. Pages
+                      follow the page breaks recorded in the document; parsing stops
+                      at the end of the range.
+        :return: A dict holding the document metadata, text, tables and potential figures.
+        """
+
+        with zipfile.ZipFile(file_path) as archive:
+            document_part = document_part_name(archive)
+            footnote_dict = read_footnotes(archive, document_part)
+            metadata = read_core_properties(archive)
+
+            # Single streaming pass over the body, looking one element ahead. Only
+            # the compact (text, next text) / table records are kept.
+            blocks = []
+            artifact_dict = {}
+            lookahead_elem, lookahead_ids = None, []
+            if pages is None:
+                body = iter_body(archive, document_part)
+            else:
+                body = iter_body_pages(archive, document_part, _page_bounds(pages))
+            for current_elem, next_elem in tqdm(body):
 
-        doc = docx.Document(self.path)
+                # Paragraph
+                if current_elem.tag.endswith('p'):
+
+                    processed_text = paragraph_text(current_elem).strip()
+                    # Ignore empty lines or repeated lines
+                    if _is_empty(processed_text) or repeated_artifact_check(processed_text, artifact_dict):
+                        continue
+                    next_text = paragraph_text(next_elem) if (
+                        next_elem is not None and next_elem.tag == W_P
+                    ) else None
+
+                    # Process footnotes, reusing the references found when this element was
+                    # the look-ahead, so that every element is scanned only once.
+                    if current_elem is not lookahead_elem:
+                        lookahead_ids = footnote_ids(current_elem)
+                    current_ids = lookahead_ids
+                    lookahead_elem = next_elem
+                    lookahead_ids = footnote_ids(next_elem) if next_elem is not None else []
+
+                    footnotes = [footnote_dict[footnote_id] for footnote_id in current_ids + lookahead_ids]
+                    processed_text = process_footnotes(processed_text, footnotes)
+
+                    blocks.append((TEXT_KEY, processed_text, next_text))
+
+                # Table: parsed straight from its element, no lookup in a list of all tables.
+                elif current_elem.tag.endswith('tbl'):
+                    cells = table_rows(current_elem)
+
+                    headers = [cell.strip() for cell in cells[0]]
+                    rows = [[cell.strip() for cell in row] for row in cells[1:]]
+
+                    blocks.append((TABLE_KEY, headers, rows))
+                else:
+                    print(f"Ignoring {current_elem.tag}.")
+
+        # Classify every paragraph, and the paragraph following it, in one batch.
+        texts = [block[1] for block in blocks if block[0] == TEXT_KEY]
+        next_texts = [block[2] for block in blocks if block[0] == TEXT_KEY]
+        decisions = classify_figure_data(texts + next_texts)
+        current_decisions = iter(decisions[:len(texts)])
+        next_decisions = iter(decisions[len(texts):])
 
         result = {
-            METADATA_KEY: {
-                'title': doc.core_properties.title,
-                'author': doc.core_properties.author,
-                'created': doc.core_properties.created,
-            },
+            METADATA_KEY: metadata,
             TEXT_KEY: [],
             TABLE_KEY: [],
             FIGURE_KEY: [],
@@ -320,33 +605,16 @@ class DOXCLoader(Loader):
         current_is_figure_data = False
         previous_text = None
 
-        artifact_dict = {}
-
-        for current_elem, next_elem in tqdm(zip(doc.element.body, doc.element.body[1:] + [None])):
+        for block_type, *content in blocks:
 
             # Paragraph
-            if current_elem.tag.endswith('p'):
-
-                current_para = docx.text.paragraph.Paragraph(current_elem, None)
-                next_para = docx.text.paragraph.Paragraph(next_elem, None)
-
-                processed_text = current_para.text.strip()
-                # Ignore empty lines or repeated lines
-                if _is_empty(processed_text) or repeated_artifact_check(processed_text, artifact_dict):
-                    continue
-                try:
-                    next_text = next_para.text
-                except AttributeError:
-                    next_text = None
-
-                # Process footnotes
-                footnotes = extract_footnotes_from_para(current_para, next_para)
-                processed_text = process_footnotes(processed_text, footnotes)
+            if block_type == TEXT_KEY:
+                processed_text, _ = content
 
                 # Identify if the current line is potential figure data
                 previous_was_figure_data = current_is_figure_data  # Move the window forward
-                current_is_figure_data = is_potential_figure_data(processed_text)
-                next_is_figure_data = is_potential_figure_data(next_text)
+                current_is_figure_data = next(current_decisions)
+                next_is_figure_data = next(next_decisions)
 
                 if current_is_figure_data:
 
@@ -378,24 +646,9 @@ class DOXCLoader(Loader):
                 previous_text = processed_text
 
             # Table
-            elif current_elem.tag.endswith('tbl'):
-                table_index = [tbl._element for tbl in doc.tables].index(current_elem)
-                table = doc.tables[table_index]
-
-                headers = [cell.text.strip() for cell in table.rows[0].cells]
-
-                rows = []
-                for row in table.rows[1:]:
-                    row_data = {headers[j]: cell.text.strip() for j, cell in enumerate(row.cells)}
-                    rows.append(row_data)
-
-                result[TABLE_KEY].append({
-                    'title': previous_text,
-                    'col_headers': headers,
-                    TABLE_ROWS_KEY: rows
-                })
             else:
-                print(f"Ignoring {current_elem.tag}.")
+                headers, rows = content
+                result[TABLE_KEY].append(ColumnarTable(headers, rows, title=previous_text))
 
         return result
 
@@ -403,6 +656,10 @@ class DOXCLoader(Loader):
         DOXC_KEY: doxc_text_loader,
         DOXC2PYTHON_KEY: docx2python_text_loader,
     }
+    TEXT_ITERATORS = {
+        DOXC_KEY: doxc_text_iterator,
+    }
+    TEXT_PER_PAGE = False  # one text per block
     TABLE_LOADERS = {
         DOXC_KEY: doxc_table_loader,
     }
@@ -413,8 +670,12 @@ class DOXCLoader(Loader):
 
 class PDFLoader(Loader):
 
-    def __init__(self, file_path, dir_path='./data/pdf_db'):
-        super().__init__(file_path=file_path, dir_path=dir_path)
+    def __init__(self, file_path, dir_path='./data/pdf_db', cache=None):
+        super().__init__(file_path=file_path, dir_path=dir_path, cache=cache)
+        # the auto backend remembers its choices next to the extraction cache, if any
+        self.selector = BackendSelector(
+            os.path.join(cache.cache_dir, SELECTION_FILE_NAME) if cache is not None else None
+        )
 
     @property
     def path(self):
@@ -433,21 +694,49 @@ class PDFLoader(Loader):
 
         self._path = new_path
 
+    def load_text(self, key: str, pages: Optional[Tuple[int, int]] = None):
+        if key == AUTO_KEY:
+            return self._load(self.TEXT_LOADERS[key], f"{TEXT_KEY}-{key}", pages, selector=self.selector)
+        return super().load_text(key, pages)
+
+    @staticmethod
+    def count_pages(file_path: str) -> int:
+        """
+        Count the pages of a PDF file without extracting any content.
+
+        :param file_path: The path to the PDF file.
+        :return: The number of pages.
+        """
+        with open(file_path, 'rb') as f:
+            return len(PyPDF2.PdfReader(f).pages)
+
     @staticmethod
-    def pypdf2_text_loader(file_path: str) -> List[str]:
+    def pypdf2_text_iterator(
+            file_path: str, pages: Optional[Tuple[int, int]] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily extract text from a PDF file using PyPDF2, one page at a time.
+
+        :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :return: An iterator of (page number, text) tuples. Page numbers start at 1.
+        """
+        with open(file_path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            first, last = _page_bounds(pages, len(reader.pages))
+            for page_num in range(first - 1, last):
+                yield page_num + 1, reader.pages[page_num].extract_text()
+
+    @staticmethod
+    def pypdf2_text_loader(file_path: str, pages: Optional[Tuple[int, int]] = None) -> List[str]:
         """
         Extract text from a PDF file using PyPDF2.
 
         :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
         :return: A list of strings, where each string represents the text content of a page.
         """
-        with open(file_path, 'rb') as f:
-            reader = PyPDF2.PdfFileReader(f)
-            text_content = []
-            for page_num in range(reader.getNumPages()):
-                page = reader.getPage(page_num)
-                text_content.append(page.extract_text())
-        return text_content
+        return [text for _, text in PDFLoader.pypdf2_text_iterator(file_path, pages)]
 
     # @staticmethod
     # def pdfminer_text_loader(file_path: str) -> List[str]:
@@ -461,19 +750,82 @@ class PDFLoader(Loader):
     #     return text_content.split('\n')  # Splitting by newline to get a list of lines
 
     @staticmethod
-    def slate_text_loader(file_path) -> List[str]:
+    def slate_text_iterator(
+            file_path: str, pages: Optional[Tuple[int, int]] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Lazily extract text from a PDF file using slate, one page at a time.
+
+        slate.PDF renders every page in its constructor, so the page loop is
+        driven here with slate's own interpreter and layout parameters instead.
+
+        :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :return: An iterator of (page number, text) tuples. Page numbers start at 1.
+        """
+        with open(file_path, 'rb') as f:
+            parser = PDFParser(f)
+            doc = PDFDocument()
+            parser.set_document(doc)
+            doc.set_parser(parser)
+            doc.initialize('')
+            if not doc.is_extractable:
+                return
+
+            resource_manager = PDFResourceManager()
+            device = TextConverter(
+                resource_manager, outfp=StringIO(), laparams=LAParams(**SLATE_LAPARAMS)
+            )
+            interpreter = SlatePageInterpreter(resource_manager, device)
+            first, last = _page_bounds(pages)
+            page_range = islice(doc.get_pages(), first - 1, last)
+            for page_num, page in enumerate(page_range, start=first):
+                yield page_num, interpreter.process_page(page)
+
+    @staticmethod
+    def slate_text_loader(file_path, pages: Optional[Tuple[int, int]] = None) -> List[str]:
         """
         Extract text from a PDF file using slate.
 
         :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive. Only
+                      those pages are interpreted.
         :return: A list of strings, where each string represents the text content of a page.
         """
+        if pages is not None:
+            return [text for _, text in PDFLoader.slate_text_iterator(file_path, pages)]
+
         with open(file_path, 'rb') as f:
             doc = slate.PDF(f)
         text_content = [page for page in doc]
         # You would need additional logic here to separate tables from text
         return text_content
 
+    @staticmethod
+    def auto_text_loader(
+            file_path: str, pages: Optional[Tuple[int, int]] = None, selector: Optional[BackendSelector] = None
+    ) -> List[str]:
+        """
+        Extract text from a PDF file with whichever registered backend works best for it.
+
+        The backends run concurrently in worker processes, each with its own timeout,
+        and their outputs are scored on characters per page, garbage glyphs and empty
+        pages. The choice and timings are recorded per document family, so that the
+        fastest good backend is tried first on the next report of the same family.
+
+        :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+        :param selector: Optional BackendSelector holding the recorded choices. A new
+                         selector, which does not persist its choices, is used if None.
+        :return: A list of strings, where each string represents the text content of a page.
+        """
+        loaders = {
+            key: partial(getattr(loader, '__func__', loader), pages=pages)
+            for key, loader in PDFLoader.TEXT_LOADERS.items() if key != AUTO_KEY
+        }
+        _, text_content = (selector or BackendSelector()).select(file_path, loaders)
+        return text_content
+
     @staticmethod
     def regex_table_loader(file_path) -> List[str]:
         """
@@ -525,11 +877,12 @@ class PDFLoader(Loader):
     #     return result
 
     @staticmethod
-    def pypdf2_table_loader(file_path) -> List[str]:
+    def pypdf2_table_loader(file_path, pages: Optional[Tuple[int, int]] = None) -> List[str]:
         """
         Extract text and tables from a PDF file using an enhanced version of PyPDF2.
 
         :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
         :return: A list of pages, where each page is represented as a list of strings.
                  Strings represent either lines of text or detected table rows.
         """
@@ -561,12 +914,10 @@ class PDFLoader(Loader):
                 return True
             return False
 
-        with open(file_path, 'rb') as f:
-            reader = PyPDF2.PdfFileReader(f)
-            text_content = []
-            for page_num in range(reader.getNumPages()):
-                page = reader.getPage(page_num)
-                text_content.append(enhanced_text_analysis(page.extract_text()))
+        text_content = [
+            enhanced_text_analysis(text)
+            for _, text in PDFLoader.pypdf2_text_iterator(file_path, pages)
+        ]
 
         # Convert the tables to list of strings
         result = []
@@ -596,19 +947,21 @@ class PDFLoader(Loader):
     #     return result
 
     @staticmethod
-    def tabula_table_loader(file_path: str) -> List[str]:
+    def tabula_table_loader(file_path: str, pages: Optional[Tuple[int, int]] = None) -> List[str]:
         """
         Extract tables from a PDF file using Tabula.
 
         :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
         :return: A list of strings, where each string represents a table row.
         """
-        dfs = tabula.read_pdf(file_path, pages='all', multiple_tables=True)
-        result = []
-        for df in dfs:
-            for index, row in df.iterrows():
-                result.append(' '.join(row.astype(str)))
-        return result
+        if pages is None:
+            tabula_pages = 'all'
+        else:
+            first, last = _page_bounds(pages, PDFLoader.count_pages(file_path))
+            tabula_pages = f"{first}-{last}"
+        dfs = tabula.read_pdf(file_path, pages=tabula_pages, multiple_tables=True)
+        return dataframe_rows(dfs)
 
     @staticmethod
     def ocr_loader(file_path) -> List[str]:
@@ -618,10 +971,16 @@ class PDFLoader(Loader):
     TEXT_LOADERS = {
         PYPDF2_KEY: pypdf2_text_loader,
         SLATE_KEY: slate_text_loader,
+        AUTO_KEY: auto_text_loader,
         # PLUMBER_KEY: pdfplumber_text_loader,
         # MINER_KEY: pdfminer_text_loader,
     }
 
+    TEXT_ITERATORS = {
+        PYPDF2_KEY: pypdf2_text_iterator,
+        SLATE_KEY: slate_text_iterator,
+    }
+
     # TODO: Consider LayoutLM (by Microsoft)
     TABLE_LOADERS = {
         # CAMELOT_KEY: camelot_table_loader,
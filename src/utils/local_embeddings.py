@@ -0,0 +1,178 @@
+import re
+import zlib
+import logging
+
+import numpy as np
+
+from typing import List, Dict, Any, Optional
+from langchain.embeddings.base import Embeddings
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w+\b")
+N_FEATURES = 2 ** 20  # hashed term buckets
+DIMENSIONS = 1024
+PROJECTIONS = 16  # non-zero entries per bucket in the random projection
+BATCH_SIZE = 1024  # texts per NumPy batch
+NGRAM_RANGE = (1, 1)  # words only, bigrams double the projection noise per term
+SEED = 0
+# splitmix64 constants, used to derive the projection of a bucket without storing the matrix
+_MIX_1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX_2 = np.uint64(0x94d049bb133111eb)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """The splitmix64 finalizer: a cheap, well spread 64-bit hash of uint64 values."""
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local CPU embeddings: hashed TF-IDF terms reduced by a sparse random projection.
+
+    Lowercased words (or word n-grams) are hashed into `n_features` buckets and
+    weighted with sublinear term frequency times the inverse document frequency
+    learned by `fit` (1 until fitted). Every bucket is projected onto
+    `projections` signed dimensions picked by a hash of the bucket, so the
+    projection matrix is never stored, and the vectors are L2 normalized:
+    FAISS L2 distances then rank like cosine similarity.
+
+    No network and no model download is needed, and a query is embedded in
+    well under a millisecond. Quality is lexical, so paraphrases match less
+    well than with a neural model.
+    """
+
+    def __init__(
+            self,
+            dimensions: int = DIMENSIONS,
+            n_features: int = N_FEATURES,
+            projections: int = PROJECTIONS,
+            ngram_range: tuple = NGRAM_RANGE,
+            seed: int = SEED,
+    ):
+        """
+        Initializes the HashingEmbeddings object.
+
+        :param dimensions: The embedding size.
+        :param n_features: The number of hashed term buckets.
+        :param projections: The number of dimensions each bucket is projected onto.
+        :param ngram_range: The (min, max) word n-gram sizes.
+        :param seed: The projection seed. Vectors are only comparable for equal seeds.
+        """
+        self.dimensions = dimensions
+        self.n_features = n_features
+        self.projections = projections
+        self.ngram_range = ngram_range
+        self.seed = seed
+        self.idf = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.idf is not None
+
+    def config(self) -> Dict[str, Any]:
+        """The JSON serializable parameters, which with the IDF weights reproduce these embeddings."""
+        return {
+            'dimensions': self.dimensions,
+            'n_features': self.n_features,
+            'projections': self.projections,
+            'ngram_range': list(self.ngram_range),
+            'seed': self.seed,
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], idf: Optional[np.ndarray] = None) -> 'HashingEmbeddings':
+        """
+        Recreate embeddings from `config` and their fitted IDF weights, e.g. when an index is loaded.
+
+        :param config: The parameters returned by `config`.
+        :param idf: The fitted IDF weights, None for unfitted embeddings.
+        :return: The HashingEmbeddings.
+        """
+        embeddings = cls(**{**config, 'ngram_range': tuple(config['ngram_range'])})
+        embeddings.idf = idf
+        return embeddings
+
+    def _terms(self, text: str) -> List[str]:
+        words = TOKEN_PATTERN.findall(text.lower())
+        low, high = self.ngram_range
+        terms = []
+        for n in range(low, high + 1):
+            terms.extend(' '.join(words[i:i + n]) for i in range(len(words) - n + 1))
+        return terms
+
+    def _buckets(self, text: str) -> np.ndarray:
+        return np.fromiter(
+            (zlib.crc32(term.encode('utf-8')) for term in self._terms(text)), dtype=np.int64
+        ) % self.n_features
+
+    def fit(self, texts: List[str]) -> 'HashingEmbeddings':
+        """
+        Learn the inverse document frequency of every bucket from a corpus.
+
+        :param texts: The corpus, e.g. the chunks that are about to be indexed.
+        :return: self
+        """
+        df = np.zeros(self.n_features, dtype=np.int64)
+        for text in texts:
+            df[np.unique(self._buckets(text))] += 1
+        # smoothed, as if one extra document held every term
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        logger.info(f'Fitted hashed IDF weights on {len(texts)} texts.')
+        return self
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        buckets = [self._buckets(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(b) for b in buckets])
+        keys, counts = np.unique(rows * self.n_features + np.concatenate(buckets), return_counts=True)
+        rows, buckets = keys // self.n_features, keys % self.n_features
+
+        weights = 1 + np.log(counts)
+        if self.idf is not None:
+            weights = weights * self.idf[buckets]
+
+        # projection j of bucket b: hash(b, j) picks the dimension (low bits) and the sign (top bit)
+        hashes = _mix(
+            buckets.astype(np.uint64)[:, None] * np.uint64(self.projections)
+            + np.arange(self.projections, dtype=np.uint64)
+            + np.uint64(self.seed * self.n_features * self.projections)
+        )
+        dims = (hashes % np.uint64(self.dimensions)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1., 1.)
+
+        vectors = np.bincount(
+            (rows[:, None] * self.dimensions + dims).ravel(),
+            weights=(weights[:, None] * signs).ravel(),
+            minlength=len(texts) * self.dimensions,
+        ).reshape(len(texts), self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1.)).astype(np.float32)
+
+    def embed_array(self, texts: List[str], batch_size: Optional[int] = BATCH_SIZE) -> np.ndarray:
+        """
+        Embed texts into an (n, dimensions) float32 array.
+
+        :param texts: The texts.
+        :param batch_size: The number of texts embedded per NumPy batch.
+        :return: One L2 normalized row per text.
+        """
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.concatenate([
+            self._embed_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
@@ -0,0 +1,238 @@
+import time
+import logging
+import threading
+
+import numpy as np
+
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Hashable
+
+from src.utils.embedding_cache import normalize_text
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+MAX_QUERIES = 1024
+QUERY_TTL = 3600.0  # seconds
+
+
+def query_key(query: str) -> str:
+    """The cache key of a query: its normalized, case folded text."""
+    return normalize_text(query).casefold()
+
+
+def store_version(vector_store: Any) -> Optional[Hashable]:
+    """
+    The version of a vector store's contents, which changes whenever search results may.
+
+    :param vector_store: The vector store, e.g. a langchain FAISS store or a ShardedRetriever.
+    :return: The store's own `version` if it has one, else its faiss index with the number
+             of vectors, which changes when the store is rebuilt or vectors are added. None
+             for stores not exposing an index, e.g. IndexManager, which notifies listeners.
+    """
+    if hasattr(vector_store, 'version'):
+        return vector_store.version
+    index = getattr(vector_store, 'index', None)
+    if index is None:
+        return None
+    # the index itself, not its id, so a new index can never take the version of a collected one
+    return index, index.ntotal
+
+
+class _Entry(object):
+    __slots__ = ('vector', 'results', 'created', 'row')
+
+    def __init__(self, created: float):
+        self.vector = None
+        self.results = {}  # search parameters -> documents
+        self.created = created
+        self.row = None  # row of the normalized vector in the similarity matrix
+
+
+class QueryCache(object):
+    """
+    An in-memory LRU cache of query embeddings and search results, for one vector store.
+
+    Queries are looked up by their normalized text first. With a
+    `similarity_threshold`, a query missing from the cache is embedded and
+    takes the results of the most similar cached query if their cosine
+    similarity reaches the threshold, which skips the search. Entries expire
+    after `ttl` seconds, and `invalidate` drops them all; it takes the
+    arguments of an IndexManager listener, so it can be registered with
+    `IndexManager.add_listener` to run whenever the index changes. Stores
+    without listeners are versioned instead, see `check_version`.
+
+    Query vectors are kept normalized in a matrix preallocated for
+    `max_entries` rows, so finding the most similar query is one
+    matrix-vector product.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = MAX_QUERIES,
+            ttl: Optional[float] = QUERY_TTL,
+            similarity_threshold: Optional[float] = None,
+    ):
+        """
+        Initializes the QueryCache object.
+
+        :param max_entries: The number of queries kept, least recently used dropped first.
+        :param ttl: The lifetime of an entry in seconds, None for no expiry.
+        :param similarity_threshold: Optional cosine similarity above which a query reuses
+                                     the results of a cached query, e.g. 0.97.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # query key -> _Entry
+        self._lock = threading.Lock()
+        self._version = None
+        self._matrix = None  # (max_entries, dimensions) normalized query vectors, allocated on first use
+        self._row_keys = [None] * max_entries  # matrix row -> query key
+        self._free_rows = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.row is not None:
+            self._row_keys[entry.row] = None
+            self._free_rows.append(entry.row)
+
+    def _entry(self, query: str, create: bool = False) -> Optional[_Entry]:
+        key = query_key(query)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry, now):
+            self._drop(key)
+            entry = None
+        if entry is None and create:
+            entry = self._entries[key] = _Entry(now)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store_row(self, key: str, entry: _Entry, vector: List[float]):
+        """Write the normalized vector of an entry into its row of the similarity matrix."""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            if self._matrix is not None:
+                logger.warning('Query embedding size changed, dropping the cached vectors.')
+                for other in self._entries.values():
+                    other.row = None
+                self._row_keys = [None] * self.max_entries
+                self._free_rows = list(range(self.max_entries - 1, -1, -1))
+            self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+        if entry.row is None:
+            entry.row = self._free_rows.pop()
+            self._row_keys[entry.row] = key
+        self._matrix[entry.row] = vector / (np.linalg.norm(vector) + 1e-12)
+
+    def vector(self, query: str) -> Optional[List[float]]:
+        """Returns the cached embedding of a query, None if it is not cached."""
+        with self._lock:
+            entry = self._entry(query)
+            return entry.vector if entry is not None else None
+
+    def put_vector(self, query: str, vector: List[float]):
+        with self._lock:
+            entry = self._entry(query, create=True)
+            entry.vector = vector
+            if self.similarity_threshold is not None:
+                self._store_row(query_key(query), entry, vector)
+
+    def results(self, query: str, params: Hashable) -> Optional[List[Any]]:
+        """
+        Returns the cached results of a query, None if they are not cached.
+
+        :param query: The query.
+        :param params: The search parameters the results were found with, e.g. (n, max_n).
+        """
+        with self._lock:
+            entry = self._entry(query)
+            results = entry.results.get(params) if entry is not None else None
+            if results is not None:
+                self.hits += 1
+            return results
+
+    def put_results(self, query: str, params: Hashable, results: List[Any]):
+        with self._lock:
+            self._entry(query, create=True).results[params] = list(results)
+
+    def similar_results(self, vector: List[float], params: Hashable) -> Optional[List[Any]]:
+        """
+        Returns the results of the cached query most similar to a query embedding,
+        if their cosine similarity reaches the threshold, else None.
+
+        :param vector: The query embedding.
+        :param params: The search parameters, see `results`.
+        """
+        with self._lock:
+            query = np.asarray(vector, dtype=np.float32)
+            if (
+                    self.similarity_threshold is None or self._matrix is None
+                    or self._matrix.shape[1] != len(query)
+            ):
+                self.misses += 1
+                return None
+            similarities = self._matrix @ (query / (np.linalg.norm(query) + 1e-12))
+            rows = np.flatnonzero(similarities >= self.similarity_threshold)
+            now = time.monotonic()
+            # most similar first, skipping free rows and entries without these results
+            for row in rows[np.argsort(-similarities[rows], kind='stable')]:
+                key = self._row_keys[row]
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None and params in entry.results and not self._expired(entry, now):
+                    self.near_hits += 1
+                    return entry.results[params]
+            self.misses += 1
+            return None
+
+    def miss(self):
+        """Count a lookup that found nothing without a similarity search."""
+        with self._lock:
+            self.misses += 1
+
+    def invalidate(self, *args: Any):
+        """Drop every entry, e.g. after the index changed. Accepts and ignores listener arguments."""
+        with self._lock:
+            self._clear()
+        logger.info('Query cache invalidated.')
+
+    def _clear(self):
+        self._entries.clear()
+        self._row_keys = [None] * self.max_entries
+        self._free_rows = list(range(self.max_entries - 1, -1, -1))
+
+    def check_version(self, version: Optional[Hashable]):
+        """
+        Drop every entry if the version of the store differs from the last one seen, e.g. after a
+        FAISS store was rebuilt or an artifact was reloaded. None versions are ignored.
+
+        :param version: The store version, see `store_version`.
+        """
+        if version is None:
+            return
+        with self._lock:
+            if self._version is not None and self._version != version:
+                self._clear()
+                logger.info('Query cache invalidated, the vector store changed.')
+            self._version = version
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of exact hits, near-duplicate hits and misses."""
+        return {'hits': self.hits, 'near_hits': self.near_hits, 'misses': self.misses}
@@ -1,11 +1,24 @@
+import os
 import re
 import logging
+import threading
+
+import faiss
 import tiktoken
+import numpy as np
 
-from typing import Dict, Any, List, Union
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Union, Optional, Iterable, Iterator, Tuple
+from langchain.embeddings.base import Embeddings
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import FAISS  # facebook AI similarity search
+from src.utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.ann_index import FLAT_INDEX, rebuild_vector_store, set_search_params
+from src.utils.lexical_index import BM25Index, is_lexical_query, reciprocal_rank_fusion
+from src.utils.query_cache import QueryCache, store_version
+from src.utils.sharded_retrieval import ShardedRetriever, SHARD_KEY
+from src.utils.token_splitter import TokenSpanSplitter, encoding_for_model, iter_page_chunks
 
 
 # Create a logger object
@@ -18,6 +31,141 @@ logger.addHandler(handler)
 
 TABLE_PATTERN = r"<<T(\d+)>>:"  # must include \d+ in the pattern - important for search.
 FIGURE_PATTERN = r"<<F(\d+)>>:"
+# PLACEHOLDER KINDS
+TABLE_PLACEHOLDER = 'table'
+FIGURE_PLACEHOLDER = 'figure'
+PLACEHOLDER_PATTERNS = {
+    TABLE_PLACEHOLDER: re.compile(TABLE_PATTERN),
+    FIGURE_PLACEHOLDER: re.compile(FIGURE_PATTERN),
+}
+PLACEHOLDERS_KEY = 'Placeholders'  # chunk metadata, hidden from the context
+EMBEDDING_MODEL = 'text-embedding-ada-002'
+STREAM_BATCH = 256  # chunks per embedding request batch when streaming
+# EMBEDDING BACKENDS
+OPENAI_BACKEND = 'openai'
+HASHING_BACKEND = 'hashing'
+DEFAULT_BACKEND = os.getenv('EMBEDDING_BACKEND', OPENAI_BACKEND)  # choose per deployment
+# SEARCH MODES
+VECTOR_SEARCH = 'vector'
+LEXICAL_SEARCH = 'lexical'
+HYBRID_SEARCH = 'hybrid'
+SEARCH_MODES = [VECTOR_SEARCH, LEXICAL_SEARCH, HYBRID_SEARCH]
+HYBRID_CANDIDATES = 4  # candidates fetched per ranking, per result of a hybrid search
+
+
+def _openai_embeddings(embedding_model: str) -> Embeddings:
+    return OpenAIEmbeddings(model=embedding_model)
+
+
+def _hashing_embeddings(embedding_model: str) -> Embeddings:
+    return HashingEmbeddings()
+
+
+EMBEDDING_BACKENDS = {
+    OPENAI_BACKEND: _openai_embeddings,
+    HASHING_BACKEND: _hashing_embeddings,
+}
+
+
+def embedding_backend(backend: Optional[str] = None, embedding_model: str = EMBEDDING_MODEL) -> Embeddings:
+    """
+    Create the embeddings of a backend.
+
+    :param backend: The backend key, one of EMBEDDING_BACKENDS. Defaults to
+                    $EMBEDDING_BACKEND, else the OpenAI API.
+    :param embedding_model: The embedding model name, for backends serving several models.
+    :return: The embeddings.
+    :raises KeyError: If the backend is not supported.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in EMBEDDING_BACKENDS.keys():
+        raise KeyError(
+            f"The following embedding backends: {list(EMBEDDING_BACKENDS.keys())} are supported. "
+            f"Not {backend}"
+        )
+    return EMBEDDING_BACKENDS[backend](embedding_model)
+
+
+def find_placeholders(text: str) -> List[List[Any]]:
+    """
+    Resolve the table and figure placeholders of a chunk, e.g. once when it is vectorized.
+
+    :param text: The chunk text.
+    :return: A [kind, number, start, end] list for the first placeholder of every kind
+             in the text, where kind is 'table' or 'figure' and text[start:end] is the
+             placeholder. JSON serializable, so it can be kept in chunk metadata.
+    """
+    found = []
+    for kind, pattern in PLACEHOLDER_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            found.append([kind, int(match.group(1)), match.start(), match.end()])
+    return found
+
+
+def _visible_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Chunk metadata without the keys only used to assemble the context."""
+    if PLACEHOLDERS_KEY not in metadata:
+        return metadata
+    return {key: value for key, value in metadata.items() if key != PLACEHOLDERS_KEY}
+
+
+class TableIndex(object):
+    """
+    A small exact index of the chunks holding a table placeholder, e.g. table
+    summaries, so the table closest to a query is found with one lookup
+    instead of scanning the neighbours of the query for placeholders.
+    Rows are the rows of the vector store the chunks come from.
+    """
+
+    def __init__(self, rows: List[int], vectors: np.ndarray):
+        """
+        Initializes the TableIndex object.
+
+        :param rows: The vector store rows of the table chunks.
+        :param vectors: The (len(rows), dim) vectors of the table chunks.
+        """
+        self.rows = list(rows)
+        self._index = None
+        if self.rows:
+            self._index = faiss.IndexFlatL2(vectors.shape[1])
+            self._index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], index: Any) -> 'TableIndex':
+        """
+        Index the table chunks among texts, taking their vectors from the faiss
+        index holding the texts in the same order.
+        """
+        pattern = re.compile(TABLE_PATTERN)
+        rows = [row for row, text in enumerate(texts) if pattern.search(text)]
+        vectors = np.array([index.reconstruct_n(row, 1)[0] for row in rows], dtype=np.float32)
+        return cls(rows, vectors)
+
+    @classmethod
+    def from_vector_store(cls, vector_store: FAISS) -> 'TableIndex':
+        """Index the table chunks of a FAISS vector store, scanning its docstore once."""
+        texts = (
+            vector_store.docstore.search(vector_store.index_to_docstore_id[row]).page_content
+            for row in range(vector_store.index.ntotal)
+        )
+        return cls.from_texts(texts, vector_store.index)
+
+    def search(self, vector: List[float], k: int = 1) -> List[Tuple[int, float]]:
+        """
+        Return the k table chunks closest to a vector.
+
+        :param vector: The query vector.
+        :param k: The number of table chunks.
+        :return: (vector store row, L2 distance) tuples, closest first.
+        """
+        if self._index is None:
+            return []
+        distances, positions = self._index.search(np.array([vector], dtype=np.float32), min(k, len(self.rows)))
+        return [(self.rows[i], float(d)) for d, i in zip(distances[0], positions[0]) if i != -1]
 
 
 class DocumentVectorizer(object):
@@ -27,6 +175,8 @@ class DocumentVectorizer(object):
        vectors using a specified embedding model.
     """
     CHUNK_KEY = 'Chunk Number'
+    PAGE_START_KEY = 'Page Start'
+    PAGE_END_KEY = 'Page End'
     SUPPORTED_MODELS = ['gpt-3.5-turbo', 'gtp-4']
     METADATA_CORE = {
         CHUNK_KEY: 0
@@ -34,30 +184,39 @@ class DocumentVectorizer(object):
 
     def __init__(
             self,
-            text: Union[str, List[str]],
+            text: Union[str, List[str]] = None,
             metadata: Dict[str, Any] = None,
             size: int = 240,
             overlap: int = 24,
             separators=["\n\n", "\n", " ", ""],
             model: str = 'gpt-3.5-turbo',
+            encoding: Optional[tiktoken.Encoding] = None,
     ):
         """
         Initializes the DocumentVectorizer object.
 
         :param text: The input text to be vectorized. Can be a single string or a list of strings.
+                     May be None when pages are streamed with `iter_chunks` or `vectorize_pages`.
         :param metadata: A dictionary containing metadata for the document.
         :param size: The size of the chunks after splitting the text.
         :param overlap: The number of tokens that adjacent chunks will overlap.
         :param separators: The separators used for splitting the text.
         :param model: The name of the tokenizer model to be used.
+        :param encoding: Optional tiktoken encoding, overrides the tokenizer of `model`.
         """
         self._size = size
         self._overlap = overlap
         self._separators = separators
 
+        # before the text, which is split with it
+        if encoding is None:
+            self.tokenizer = model
+        else:
+            self._tokenizer = encoding
         self.text = text
         self.metadata = metadata
-        self.tokenizer = model
+        self.lexical_index = None  # the BM25Index of the last vectorized chunks
+        self.table_index = None  # the TableIndex of the last vectorized chunks
 
     @property
     def text(self) -> List[str]:
@@ -72,6 +231,8 @@ class DocumentVectorizer(object):
 
         :param text: The input text to be set and processed.
         """
+        if text is None:
+            text = ''
         if isinstance(text, list):
             text = "\n".join(text)
 
@@ -116,8 +277,7 @@ class DocumentVectorizer(object):
             raise ValueError(
                 f"{model} not among supported models: {self.SUPPORTED_MODELS}"
             )
-        enc_code = tiktoken.encoding_for_model(model).name
-        self._tokenizer = tiktoken.get_encoding(enc_code)
+        self._tokenizer = encoding_for_model(model)
 
     def tiktoken_len(self, text: str) -> int:
         """
@@ -132,30 +292,81 @@ class DocumentVectorizer(object):
         )
         return len(tokens)
 
+    def _splitter(self) -> TokenSpanSplitter:
+        return TokenSpanSplitter(
+            chunk_size=self._size,
+            chunk_overlap=self._overlap,
+            separators=self._separators,
+            encoding=self.tokenizer,
+        )
+
     def split(self, text: str) -> List[str]:
         """
         Splits the input text into chunks based on the specified chunk size, overlap, and separators.
+        The text is tokenized once, see `TokenSpanSplitter`.
 
         :param text: The text to be split.
         :return: A list of text chunks.
         """
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self._size,
-            chunk_overlap=self._overlap,
-            length_function=self.tiktoken_len,
-            separators=self._separators
-        )
-        chunks = text_splitter.split_text(text)
+        chunks = self._splitter().split_text(text)
         logger.info(
             f'The input text of length {len(text)} was split into {len(chunks)} chunks.'
         )
         return chunks
 
+    def iter_chunks(
+            self,
+            pages: Iterable[Tuple[int, str]],
+            metadata: Dict[str, Any] = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Split a stream of pages into chunks while they are read, see `iter_page_chunks`.
+
+        Unlike setting `text`, the document is never held in memory as a whole,
+        and every chunk records the pages it was taken from.
+
+        :param pages: An iterable of (page number, text) tuples, e.g. `Loader.iter_text`.
+        :param metadata: A dictionary containing metadata for the document.
+        :return: An iterator of (chunk, metadata) tuples. The metadata holds the chunk
+                 number, the first and last page of the chunk and its placeholders.
+        """
+        metadata = {**self.METADATA_CORE, **(metadata or {})}
+        n_chunks = 0
+        for n_chunks, (chunk, first_page, last_page) in enumerate(
+                iter_page_chunks(self._splitter(), pages), start=1
+        ):
+            _metadata = metadata.copy()
+            _metadata[self.CHUNK_KEY] = n_chunks
+            _metadata[self.PAGE_START_KEY] = first_page
+            _metadata[self.PAGE_END_KEY] = last_page
+            _metadata[PLACEHOLDERS_KEY] = find_placeholders(chunk)
+            yield chunk, _metadata
+        logger.info(f'The input pages were streamed into {n_chunks} chunks.')
+
+    def _embeddings(
+            self,
+            embedding_model: str,
+            cache: Optional[EmbeddingCache],
+            embeddings: Optional[Embeddings],
+            backend: Optional[str],
+    ) -> Embeddings:
+        embed = embeddings if embeddings is not None else embedding_backend(backend, embedding_model)
+        if cache is not None and not isinstance(embed, HashingEmbeddings):
+            # local embeddings are cheaper to recompute than to look up, so never cached
+            embed = CachedEmbeddings(embed, cache, embedding_model)
+        return embed
+
     def vectorize(
             self,
-            embedding_model: str = 'text-embedding-ada-002',
+            embedding_model: str = EMBEDDING_MODEL,
             extra_text: List[str] = None,
-            extra_metadata: List[Any] = None
+            extra_metadata: List[Any] = None,
+            cache: Optional[EmbeddingCache] = None,
+            embeddings: Optional[Embeddings] = None,
+            backend: Optional[str] = None,
+            index_type: str = FLAT_INDEX,
+            index_params: Optional[Dict[str, Any]] = None,
+            lexical: bool = True,
     ) -> FAISS:
         """
         Converts text chunks into vectors and stores them in a FAISS vector store.
@@ -168,7 +379,21 @@ class DocumentVectorizer(object):
         :param embedding_model: The name of the embedding model to be used.
         :param extra_text: Additional text chunks to be vectorized.
         :param extra_metadata: Additional metadata for the extra text chunks.
-        :return: A FAISS vector store containing vectors of all text chunks.
+        :param cache: Optional embedding cache. Only chunks missing from the cache are
+                      sent to the embedding model.
+        :param embeddings: Optional embeddings to use instead of the backend's, e.g.
+                           AsyncBatchEmbeddings for concurrent, rate limited requests.
+        :param backend: The embedding backend key, see `embedding_backend`. Local backends
+                        are fitted on the chunks if they need fitting, and are not cached.
+        :param index_type: The faiss index type, 'flat' (exact), 'hnsw', 'ivf' or 'ivfpq',
+                           see `ann_index.build_index`.
+        :param index_params: Optional parameters of the index type, e.g. {'M': 32, 'ef_search': 64}.
+        :param lexical: Whether to also build a BM25 index of the chunks, kept as `lexical_index`
+                        and aligned with the rows of the store, for hybrid search in ContextRetrieval.
+        :return: A FAISS vector store containing vectors of all text chunks. The table and
+                 figure placeholders of every chunk are resolved into its metadata, see
+                 `find_placeholders`, and the chunks holding table placeholders are also
+                 indexed on their own as `table_index`.
         :raises ValueError: If the lengths of extra_text and extra_metadata do not match.
         """
         if extra_text is not None:
@@ -194,14 +419,106 @@ class DocumentVectorizer(object):
         else:
             text = self._text
             metadata = self._metadata
+        metadata = [{**_metadata, PLACEHOLDERS_KEY: find_placeholders(chunk)} for chunk, _metadata in zip(text, metadata)]
 
-        embed = OpenAIEmbeddings(
-            model=embedding_model,
-        )
+        embed = self._embeddings(embedding_model, cache, embeddings, backend)
+        if isinstance(embed, HashingEmbeddings) and not embed.is_fitted:
+            embed.fit(text)
         vector_store = FAISS.from_texts(
             text, embedding=embed,
             metadatas=metadata,
         )
+        self.table_index = TableIndex.from_texts(text, vector_store.index)  # exact vectors of the flat index
+        vector_store = rebuild_vector_store(vector_store, index_type, **(index_params or {}))
+        self.lexical_index = BM25Index.from_texts(text) if lexical else None
+        if isinstance(embed, CachedEmbeddings):
+            logger.info(f'Embedding cache hits and misses so far: {cache.stats()}')
+        return vector_store
+
+    def vectorize_pages(
+            self,
+            pages: Iterable[Tuple[int, str]],
+            metadata: Dict[str, Any] = None,
+            embedding_model: str = EMBEDDING_MODEL,
+            cache: Optional[EmbeddingCache] = None,
+            embeddings: Optional[Embeddings] = None,
+            backend: Optional[str] = None,
+            batch_size: int = STREAM_BATCH,
+            index_type: str = FLAT_INDEX,
+            index_params: Optional[Dict[str, Any]] = None,
+            lexical: bool = True,
+    ) -> Optional[FAISS]:
+        """
+        Stream pages into a FAISS vector store, embedding chunks while later pages are extracted.
+
+        Chunks are collected from `iter_chunks` into batches of `batch_size`, and
+        every batch is embedded on a background thread while the next one is being
+        extracted and split. At most one batch waits for its embeddings at a time,
+        so memory stays flat apart from the vector store itself.
+
+        :param pages: An iterable of (page number, text) tuples, e.g. `Loader.iter_text`.
+        :param metadata: A dictionary containing metadata for the document.
+        :param embedding_model: The name of the embedding model to be used.
+        :param cache: Optional embedding cache, see `vectorize`.
+        :param embeddings: Optional embeddings to use instead of the backend's, see `vectorize`.
+        :param backend: The embedding backend key, see `vectorize`.
+        :param batch_size: The number of chunks embedded at once.
+        :param index_type: The faiss index type, see `vectorize`. Built once all chunks are added.
+        :param index_params: Optional parameters of the index type, see `vectorize`.
+        :param lexical: Whether to also build a BM25 index of the chunks, see `vectorize`.
+        :return: A FAISS vector store of all chunks with their page metadata, None if there is no text.
+                 Like `vectorize`, sets `lexical_index` and `table_index`.
+        """
+        embed = self._embeddings(embedding_model, cache, embeddings, backend)
+        chunks = self.iter_chunks(pages, metadata)
+        if isinstance(embed, HashingEmbeddings) and not embed.is_fitted:
+            # the IDF weights need the whole corpus, so there is nothing to overlap
+            chunks = list(chunks)
+            embed.fit([chunk for chunk, _ in chunks])
+
+        vector_store = None
+        lexical_index = BM25Index() if lexical else None
+        table_pattern = re.compile(TABLE_PATTERN)
+        table_rows, table_vectors, n_rows = [], [], 0
+
+        def _add(batch: List[Tuple[str, Dict[str, Any]]], vectors: List[List[float]]):
+            nonlocal vector_store, n_rows
+            text_embeddings = [(chunk, vector) for (chunk, _), vector in zip(batch, vectors)]
+            batch_metadata = [_metadata for _, _metadata in batch]
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(text_embeddings, embed, metadatas=batch_metadata)
+            else:
+                vector_store.add_embeddings(text_embeddings, metadatas=batch_metadata)
+            if lexical_index is not None:
+                lexical_index.add(chunk for chunk, _ in batch)
+            for row, (chunk, vector) in enumerate(text_embeddings, start=n_rows):
+                if table_pattern.search(chunk):
+                    table_rows.append(row)
+                    table_vectors.append(vector)
+            n_rows += len(batch)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending, batch = None, []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) < batch_size:
+                    continue
+                if pending is not None:
+                    _add(pending[0], pending[1].result())
+                pending = (batch, executor.submit(embed.embed_documents, [text for text, _ in batch]))
+                batch = []
+            if pending is not None:
+                _add(pending[0], pending[1].result())
+            if batch:
+                _add(batch, embed.embed_documents([text for text, _ in batch]))
+
+        if isinstance(embed, CachedEmbeddings):
+            logger.info(f'Embedding cache hits and misses so far: {cache.stats()}')
+        if vector_store is not None:
+            vector_store = rebuild_vector_store(vector_store, index_type, **(index_params or {}))
+        self.lexical_index = lexical_index if vector_store is not None else None
+        self.table_index = TableIndex(table_rows, np.array(table_vectors, dtype=np.float32)) \
+            if vector_store is not None else None
         return vector_store
 
 
@@ -214,8 +531,15 @@ class ContextRetrieval(object):
     def __init__(
             self,
             vector_store: FAISS,
-            tables: List[str] = None,
-            is_summary: bool = False
+            tables: Union[List[str], Dict[str, List[str]]] = None,
+            is_summary: bool = False,
+            embeddings: Optional[Embeddings] = None,
+            search_params: Optional[Dict[str, Any]] = None,
+            lexical_index: Optional[BM25Index] = None,
+            search_mode: Optional[str] = None,
+            table_index: Optional[TableIndex] = None,
+            query_cache: Optional[QueryCache] = None,
+            figures: Union[List[str], Dict[str, List[str]]] = None,
     ):
         """
           Initialize the ContextRetrieval instance.
@@ -223,22 +547,76 @@ class ContextRetrieval(object):
           Parameters:
               vector_store (FAISS): The vector store from which to retrieve similar documents.
               tables (List[str], optional): A list of raw tables corresponding to summarized tables in the documents.
+                                            Any object rendering to a string works, e.g. a ColumnarTable.
+                                            With a ShardedRetriever, whose reports each number their own
+                                            tables from <<T1>>, a dict of such lists by shard name.
               is_summary (bool, optional): Flag to determine whether to include summaries in the context
-                                           alongside the raw tables.
+                                           alongside the raw tables and figures.
+              embeddings (Embeddings, optional): Query embeddings to use instead of the vector store's own,
+                                                 e.g. a local backend. Must match the embeddings of the store.
+              search_params (Dict[str, Any], optional): Query time parameters of an approximate index,
+                                                        `nprobe` for IVF and `ef_search` for HNSW indexes.
+              lexical_index (BM25Index, optional): A BM25 index of the chunks of the store, in row order,
+                                                   e.g. `DocumentVectorizer.lexical_index` after `vectorize`.
+                                                   Only for FAISS stores, whose rows are exposed.
+              search_mode (str, optional): 'vector', 'lexical' or 'hybrid', which fuses the vector and
+                                           BM25 rankings and answers code-like queries such as 'CO2e'
+                                           from BM25 alone, without embedding them. Defaults to 'hybrid'
+                                           if a lexical index is given, else 'vector'.
+              table_index (TableIndex, optional): The index of the table chunks of a FAISS store, e.g.
+                                                  `DocumentVectorizer.table_index` or `SharedIndex.table_index`.
+                                                  If not given with `tables`, it is built here, which scans
+                                                  the docstore of the store once.
+              query_cache (QueryCache, optional): A cache of query embeddings and results for this store.
+                                                  It is invalidated whenever the store changes: through a
+                                                  listener if the store takes listeners like IndexManager,
+                                                  else when its version changes, see `store_version`.
+              figures (List[str], optional): A list of raw figures corresponding to summarized figures
+                                             ('<<F1>>:' placeholders) in the documents, like `tables`.
 
           Raises:
-              ValueError: If `tables` is not None and the `TABLE_PATTERN` does not match the expected format.
+              ValueError: If tables or figures of a store with several shards are not given by shard.
+              ValueError: If `tables` is not None and the `TABLE_PATTERN` does not match the expected format,
+                          or if the search mode is unknown, needs a lexical index that is not given,
+                          or is lexical or hybrid for a store that is not a FAISS store.
         """
         self._vector_store = vector_store
         self._tables = tables
+        self._figures = figures
+        self._rendered = {}  # (placeholder kind, number) -> raw table or figure string
         self._is_summary = is_summary
+        self._embeddings = embeddings
+        if search_params and hasattr(vector_store, 'index'):
+            set_search_params(vector_store.index, **search_params)
+        self._lexical_index = lexical_index
+        self._table_index = table_index
+        self._query_cache = query_cache
+        self._batch = threading.local()  # query vectors embedded ahead by a batch search
+        if query_cache is not None and hasattr(vector_store, 'add_listener'):
+            vector_store.add_listener(query_cache.invalidate)
+        self._search_mode = search_mode or (HYBRID_SEARCH if lexical_index is not None else VECTOR_SEARCH)
+        if self._search_mode not in SEARCH_MODES:
+            raise ValueError(f"Search mode {self._search_mode} not among supported modes: {SEARCH_MODES}")
+        if self._search_mode != VECTOR_SEARCH and lexical_index is None:
+            raise ValueError(f"Search mode {self._search_mode} needs a lexical index.")
+        if self._search_mode != VECTOR_SEARCH and not self._is_faiss_store():
+            # BM25 rows are the rows of the store, which only FAISS stores expose
+            raise ValueError(f"Search mode {self._search_mode} needs a FAISS vector store.")
 
         self._table_pattern_compiled = re.compile(TABLE_PATTERN)
 
-        if self._tables is not None and not self._table_pattern_compiled.search('<<T1>>'):
+        if self._tables is not None and not self._table_pattern_compiled.search('<<T1>>:'):
             raise ValueError(
                 "Table pattern must contain an index placeholder ('<<T\\d+>>') to match summarized tables."
             )
+        if self._tables is not None and self._table_index is None and self._is_faiss_store():
+            self._table_index = TableIndex.from_vector_store(vector_store)
+        # the vector store rows holding a table placeholder
+        self._table_rows = set(self._table_index.rows) if self._table_index is not None else set()
+        if isinstance(vector_store, ShardedRetriever) and len(vector_store) > 1 and any(
+                items is not None and not isinstance(items, dict) for items in (tables, figures)
+        ):
+            raise ValueError("Tables and figures of a sharded store must be given by shard name.")
 
     def _find_index(self, docs: List[Any]) -> int:
         """
@@ -252,76 +630,314 @@ class ContextRetrieval(object):
                  or -1 if no such document is found.
         """
         for i, doc in enumerate(docs):
-            if self._table_pattern_compiled.search(doc.page_content):
+            placeholders = doc.metadata.get(PLACEHOLDERS_KEY)
+            if placeholders is None:
+                # chunks vectorized before placeholders were kept in metadata
+                if self._table_pattern_compiled.search(doc.page_content):
+                    return i
+            elif any(kind == TABLE_PLACEHOLDER for kind, *_ in placeholders):
                 return i
         return -1
 
-    def _get_table_index_from_string(self, string: str) -> List[int]:
+    def _embed_query(self, query: str) -> List[float]:
+        vector = getattr(self._batch, 'vectors', {}).get(query)
+        if vector is None and self._query_cache is not None:
+            vector = self._query_cache.vector(query)
+        if vector is None:
+            if self._embeddings is not None:
+                vector = self._embeddings.embed_query(query)
+            else:
+                vector = self._vector_store.embedding_function(query)
+            if self._query_cache is not None:
+                self._query_cache.put_vector(query, vector)
+        return vector
+
+    def _vector_search(self, query: str, k: int) -> List[Any]:
+        if self._embeddings is None and getattr(self._vector_store, 'embeds_per_shard', False):
+            # no single query vector fits every shard, see ShardedRetriever
+            return self._vector_store.similarity_search(query, k)
+        return self._vector_store.similarity_search_by_vector(self._embed_query(query), k)
+
+    def _documents(self, rows: List[int]) -> List[Any]:
+        """The documents of vector store rows, which are the rows of the lexical index."""
+        return [
+            self._vector_store.docstore.search(self._vector_store.index_to_docstore_id[row])
+            for row in rows
+        ]
+
+    def _lexical_rows(self, query: str, k: int) -> List[int]:
+        return [row for row, _ in self._lexical_index.search(query, k)]
+
+    def _vector_rows(self, query: str, k: int) -> List[int]:
+        _, rows = self._vector_store.index.search(np.array([self._embed_query(query)], dtype=np.float32), k)
+        return [int(row) for row in rows[0] if row != -1]
+
+    def _ranked_rows(self, query: str, k: int) -> List[int]:
+        """
+        Rank the rows of a FAISS store in lexical or hybrid mode.
+
+        Parameters:
+            query (str): The query string to search for.
+            k (int): The number of rows to return.
+
+        Returns:
+            List[int]: Up to k rows, most relevant first.
         """
-        Extract table indices from a string containing table placeholders.
+        if self._search_mode == LEXICAL_SEARCH:
+            return self._lexical_rows(query, k)
+
+        n_candidates = k * HYBRID_CANDIDATES
+        lexical_rows = self._lexical_rows(query, n_candidates)
+        if lexical_rows and is_lexical_query(query):
+            # exact terms: BM25 answers on its own, so the query is never embedded
+            return lexical_rows[:k]
+        return reciprocal_rank_fusion([self._vector_rows(query, n_candidates), lexical_rows])[:k]
+
+    def _is_faiss_store(self) -> bool:
+        """Whether the store exposes its faiss index and docstore like a langchain FAISS store."""
+        return all(hasattr(self._vector_store, name) for name in ('index', 'docstore', 'index_to_docstore_id'))
+
+    def _inject_table_row(self, rows: List[int], n: int) -> List[int]:
+        """Inject the first table row among ranked rows into the top n, like `_inject_found_table`."""
+        table_position = next((i for i, row in enumerate(rows) if row in self._table_rows), -1)
+        if table_position < n:
+            return rows[:n]
+        return rows[:n - 1] + [rows[table_position]]
+
+    def _inject_closest_table(
+            self, rows: List[int], distances: List[float], vector: List[float], n: int, max_n: int
+    ) -> List[int]:
+        """
+        Inject the table closest to a query vector into the top n of its max_n nearest rows,
+        if it ranks among them, found with the table index rather than in the rows.
 
         Parameters:
-            string (str): The string to search for table placeholders.
+            rows (List[int]): The nearest rows of the query, closest first.
+            distances (List[float]): The L2 distances of the rows.
+            vector (List[float]): The query vector.
+            n (int): The number of rows to return.
+            max_n (int): The rank within which a table is injected.
 
         Returns:
-            List[int]: A list of table indices found within the string.
+            List[int]: The top n rows, the last one replaced by the closest table if none is among them.
         """
-        matches = self._table_pattern_compiled.findall(string)
-        return [int(match) for match in matches]
+        if any(row in self._table_rows for row in rows[:n]):
+            return rows[:n]
+        tables = self._table_index.search(vector, 1)
+        if not tables or (len(rows) == max_n and tables[0][1] > distances[-1]):
+            # no table, or one ranking below max_n
+            return rows[:n]
+        return rows[:n - 1] + [tables[0][0]]
+
+    def _inject_found_table(self, docs: List[Any], n: int) -> List[Any]:
+        """Inject the first table among documents into the top n."""
+        table_index = self._find_index(docs)
+        if (table_index < n) or (table_index == -1):
+            # no need to process as table either in context
+            # window or not similar enough to input query
+            return docs[:n]
+        else:
+            # inject table into context.
+            return docs[:n - 1] + [docs[table_index]]
+
+    def _embeds(self, query: str) -> bool:
+        """Whether searching for a query embeds it."""
+        if self._search_mode == HYBRID_SEARCH:
+            return not is_lexical_query(query)
+        return self._search_mode == VECTOR_SEARCH
 
     def search_vector_store(self, query: str, n: int, max_n: int = 30) -> List[Any]:
         """
         Search the vector store for documents similar to a query and return a context window of documents.
+        Results are served from the query cache if one is given, see `_search_vector_store`.
+
+        Parameters:
+            query (str): The query string to search for.
+            n (int): The number of documents to return.
+            max_n (int, optional): The rank within which a table chunk is injected into the top n.
+
+        Returns:
+            List[Any]: A list of document objects similar to the query, with at least one containing a table if
+            available.
+        """
+        if self._query_cache is None:
+            return self._search_vector_store(query, n, max_n)
+
+        params = (n, max_n)
+        self._query_cache.check_version(store_version(self._vector_store))
+        docs = self._query_cache.results(query, params)
+        if docs is not None:
+            return list(docs)
+        if self._query_cache.similarity_threshold is not None and self._embeds(query):
+            docs = self._query_cache.similar_results(self._embed_query(query), params)
+        else:
+            self._query_cache.miss()
+        if docs is None:
+            docs = self._search_vector_store(query, n, max_n)
+        self._query_cache.put_results(query, params, docs)
+        return list(docs)
+
+    def _search_vector_store(self, query: str, n: int, max_n: int = 30) -> List[Any]:
+        """
+        Search the vector store for documents similar to a query and return a context window of documents.
+
+        With tables, the first table chunk ranking within the top max_n replaces the last of the
+        top n documents, unless one is among them already. The rows of FAISS stores are ranked
+        without fetching any document beyond the top n; in vector mode the closest table is
+        looked up in the table index. Other stores are searched for the top n, and for the top
+        max_n documents only when no table is among the top n.
 
         Parameters:
             query (str): The query string to search for.
             n (int): The number of documents to return.
-            max_n (int, optional): The maximum number of documents to search through to find tables.
+            max_n (int, optional): The rank within which a table chunk is injected into the top n.
 
         Returns:
             List[Any]: A list of document objects similar to the query, with at least one containing a table if
             available.
         """
+        if self._is_faiss_store():
+            if self._search_mode == VECTOR_SEARCH:
+                return self._matrix_search([query], n, max_n)[0]
+            if self._tables is None:
+                return self._documents(self._ranked_rows(query, n))
+            return self._documents(self._inject_table_row(self._ranked_rows(query, max_n), n))
+
+        docs = self._vector_search(query, n)
+        if self._tables is None or self._find_index(docs) != -1:
+            return docs
+        return self._inject_found_table(self._vector_search(query, max_n), n)
+
+    def _batch_embeddings(self) -> Optional[Embeddings]:
+        """The embeddings that can embed many queries in one call: the given ones, else the store's."""
+        if self._embeddings is not None:
+            return self._embeddings
+        if getattr(self._vector_store, 'embeds_per_shard', False):
+            return None
+        # a store's embedding_function is usually the bound embed_query of its embeddings
+        embeddings = getattr(getattr(self._vector_store, 'embedding_function', None), '__self__', None)
+        return embeddings if isinstance(embeddings, Embeddings) else None
+
+    def search_vector_store_batch(self, queries: List[str], n: int, max_n: int = 30) -> List[List[Any]]:
+        """
+        Search the vector store for several queries at once, like `search_vector_store` for each query.
+
+        Queries are embedded in one call, and in vector mode a FAISS store is searched
+        with all query vectors in one matrix search. Cached results are reused.
 
-        if self._tables is not None:
-            docs = self._vector_store.similarity_search(query, max_n)
-            table_index = self._find_index(docs)
-            if (table_index < n) or (table_index == -1):
-                # no need to process as table either in context
-                # window or not similar enough to input query
-                return docs[:n]
+        Parameters:
+            queries (List[str]): The query strings to search for.
+            n (int): The number of documents to return per query.
+            max_n (int, optional): See `search_vector_store`.
+
+        Returns:
+            List[List[Any]]: The documents of every query, in the order of the queries.
+        """
+        params = (n, max_n)
+        if self._query_cache is not None:
+            self._query_cache.check_version(store_version(self._vector_store))
+        results = [
+            self._query_cache.results(query, params) if self._query_cache is not None else None
+            for query in queries
+        ]
+        pending = [i for i, docs in enumerate(results) if docs is None]
+
+        vectors = {}
+        to_embed = list(dict.fromkeys(
+            queries[i] for i in pending
+            if self._embeds(queries[i]) and (self._query_cache is None or self._query_cache.vector(queries[i]) is None)
+        ))
+        embeddings = self._batch_embeddings()
+        if to_embed and embeddings is not None:
+            vectors = dict(zip(to_embed, embeddings.embed_documents(to_embed)))
+            logger.info(f'Embedded {len(to_embed)} queries in one call.')
+            if self._query_cache is not None:
+                for query, vector in vectors.items():
+                    self._query_cache.put_vector(query, vector)
+
+        self._batch.vectors = vectors
+        try:
+            if self._search_mode == VECTOR_SEARCH and self._is_faiss_store() and pending:
+                for i, docs in zip(pending, self._matrix_search([queries[i] for i in pending], n, max_n)):
+                    results[i] = docs
+                    if self._query_cache is not None:
+                        self._query_cache.miss()
+                        self._query_cache.put_results(queries[i], params, docs)
             else:
-                # inject table into context.
-                return docs[:n - 1] + [docs[table_index]]
-        else:
-            return self._vector_store.similarity_search(query, n)
+                for i in pending:
+                    results[i] = self.search_vector_store(queries[i], n, max_n)
+        finally:
+            self._batch.vectors = {}
+        return [list(docs) for docs in results]
+
+    def _matrix_search(self, queries: List[str], n: int, max_n: int) -> List[List[Any]]:
+        """Vector mode search of a FAISS store for several queries with one faiss search, see `_search_vector_store`."""
+        vectors = np.array([self._embed_query(query) for query in queries], dtype=np.float32)
+        distances, rows = self._vector_store.index.search(vectors, max_n if self._tables is not None else n)
+
+        results = []
+        for vector, query_distances, query_rows in zip(vectors, distances, rows):
+            hits = [(int(row), float(distance)) for distance, row in zip(query_distances, query_rows) if row != -1]
+            hit_rows = [row for row, _ in hits]
+            if self._tables is not None:
+                hit_rows = self._inject_closest_table(hit_rows, [d for _, d in hits], vector, n, max_n)
+            results.append(self._documents(hit_rows[:n]))
+        return results
+
+    def _render(self, kind: str, number: int, shard: Optional[str] = None) -> Optional[str]:
+        """The raw table or figure of a placeholder as a string, rendered once, None if there is none."""
+        items = self._tables if kind == TABLE_PLACEHOLDER else self._figures
+        if isinstance(items, dict):
+            items = items.get(shard)
+        if items is None or number - 1 >= len(items):
+            return None
+        key = (kind, number, shard)
+        if key not in self._rendered:
+            self._rendered[key] = f"{items[number - 1]}"  # Adjust index since list is 0-indexed
+        return self._rendered[key]
 
     def process_content(
         self,
         chunk: str,
+        placeholders: Optional[List[List[Any]]] = None,
+        shard: Optional[str] = None,
     ) -> str:
         """
-        Process a chunk of text to replace table placeholders with actual raw tables, if applicable.
+        Process a chunk of text to replace table and figure placeholders with actual raw
+        tables and figures, if applicable.
 
         Parameters:
             chunk (str): The text chunk to process.
+            placeholders (List[List[Any]], optional): The placeholders of the chunk resolved at
+                                                      vectorize time, see `find_placeholders`.
+                                                      Found with the patterns if not given.
+            shard (str, optional): The shard of the chunk, for tables and figures given by shard.
 
         Returns:
-            str: The processed text chunk with raw tables included if found and applicable.
+            str: The processed text chunk with raw tables and figures included if found and applicable.
         """
-        table_indexes = self._get_table_index_from_string(chunk)
-        if not table_indexes or self._tables is None:
+        if self._tables is None and self._figures is None:
             return chunk
-
-        table_idx = table_indexes[0]
-        if table_idx - 1 < len(self._tables):
-            table = self._tables[table_idx - 1]  # Adjust index since list is 0-indexed
-            match = self._table_pattern_compiled.search(chunk)
-            if match and self._is_summary:
-                chunk = f"{chunk[:match.start()]}RAW TABLE: {table} \n TABLE SUMMARY:{chunk[match.end():]}"
-            elif match:
-                chunk = f"{chunk[:match.start()]}RAW TABLE: {table}"
-        return chunk
+        if placeholders is None:
+            placeholders = find_placeholders(chunk)
+
+        placeholders = sorted(placeholders, key=lambda placeholder: placeholder[2])
+        parts, position = [], 0
+        for i, (kind, number, start, end) in enumerate(placeholders):
+            raw = self._render(kind, number, shard)
+            if raw is None:
+                continue
+            label = kind.upper()
+            parts.append(chunk[position:start])
+            if self._is_summary:
+                parts.append(f"RAW {label}: {raw} \n {label} SUMMARY:")
+                position = end
+            else:
+                # the raw item replaces its summary, which runs up to the next placeholder
+                parts.append(f"RAW {label}: {raw}")
+                position = placeholders[i + 1][2] if i + 1 < len(placeholders) else len(chunk)
+        parts.append(chunk[position:])
+        return ''.join(parts)
 
     def get_context(self, query: str, n: int = 4) -> str:
         """
@@ -336,9 +952,28 @@ class ContextRetrieval(object):
             str: A formatted string of contextual chunks with their rank and metadata,
                  sorted from most to least relevant.
         """
+        return self._format_context(self.search_vector_store(query, n=n))
+
+    def get_context_batch(self, queries: List[str], n: int = 4) -> List[str]:
+        """
+        Retrieve the contextual summaries of several queries, e.g. the fixed questions of a
+        KPI extraction run, with one embedding call and one vector store search.
+
+        Parameters:
+            queries (List[str]): The search queries.
+            n (int, optional): The number of contextual chunks to retrieve per query.
+
+        Returns:
+            List[str]: The context of every query as `get_context` formats it, in the order of the queries.
+        """
+        return [self._format_context(docs) for docs in self.search_vector_store_batch(queries, n=n)]
+
+    def _format_context(self, docs: List[Any]) -> str:
         contexts = [
-            f"Rank: {rank} | {self.process_content(doc.page_content)} | Metadata: {doc.metadata}"
-            for rank, doc in enumerate(self.search_vector_store(query, n=n), start=1)
+            f"Rank: {rank} | "
+            f"{self.process_content(doc.page_content, doc.metadata.get(PLACEHOLDERS_KEY), doc.metadata.get(SHARD_KEY))} | "
+            f"Metadata: {_visible_metadata(doc.metadata)}"
+            for rank, doc in enumerate(docs, start=1)
         ]
         message = "Contextual information sorted from most relevant to least relevant."
 
@@ -0,0 +1,250 @@
+import os
+import heapq
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+
+from src.utils.ann_index import set_search_params
+from src.utils.query_cache import store_version
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+MAX_WORKERS = 32
+SHARD_KEY = 'Shard'  # metadata key naming the shard of a result
+
+
+class ShardedRetriever(object):
+    """
+    Searches several vector stores, e.g. one per report, as if they were one.
+
+    The query is embedded once and every shard is searched concurrently on a
+    thread pool; faiss releases the GIL while searching, so latency follows
+    the slowest shard rather than the sum of all of them. The per-shard
+    results are merged into a global top k on their L2 distances, which are
+    comparable because all shards share one embedding model.
+
+    Without query embeddings, every shard embeds the query with its own
+    embedding function, once per distinct embeddings object. Artifacts built
+    with local hashing embeddings store the IDF weights fitted on their own
+    report, so each is queried with those; their vectors are L2 normalized,
+    so the merged distances are still cosine distances, each weighted by the
+    term statistics of its report.
+
+    The retriever answers `similarity_search` like a langchain FAISS store, so
+    it can be passed to ContextRetrieval as the vector store. Every result
+    carries the name of its shard in its metadata under SHARD_KEY; every
+    report numbers its own table and figure placeholders, so ContextRetrieval
+    takes its tables and figures by shard name with a sharded store.
+
+    The retriever owns its thread pool unless one is given: use it as a
+    context manager, or call `close` once it is no longer needed. Subsets
+    share the pool of the retriever they were taken from.
+    """
+
+    def __init__(
+            self,
+            shards: Dict[str, Any],
+            embeddings: Optional[Embeddings] = None,
+            max_workers: Optional[int] = None,
+            search_params: Optional[Dict[str, Any]] = None,
+            executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        """
+        Initializes the ShardedRetriever object.
+
+        :param shards: The vector stores by shard name, e.g. the report name. Every store must
+                       answer `similarity_search_with_score_by_vector` with L2 distances, like
+                       FAISS stores and IndexManager do.
+        :param embeddings: The query embeddings for all shards. Defaults to the embedding function of each shard.
+        :param max_workers: The number of search threads, defaults to one per shard up to MAX_WORKERS.
+        :param search_params: Optional query time parameters of approximate indexes, see
+                              `ann_index.set_search_params`.
+        :param executor: Optional thread pool to search on, e.g. shared with another retriever.
+        :raises ValueError: If there are no shards.
+        """
+        if not shards:
+            raise ValueError("A sharded retriever needs at least one shard.")
+        self._shards = dict(shards)
+        self._embeddings = embeddings
+        if search_params:
+            for store in self._shards.values():
+                if hasattr(store, 'index'):
+                    set_search_params(store.index, **search_params)
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers or min(MAX_WORKERS, len(self._shards)),
+            thread_name_prefix='shard',
+        )
+        self._owns_executor = executor is None
+
+    @classmethod
+    def from_artifacts(cls, dir_paths: Iterable[str], embeddings: Optional[Embeddings] = None, **kwargs):
+        """
+        Build a retriever over artifacts, named after their directories, with the
+        process-wide shared indexes of `index_registry`.
+
+        :param dir_paths: The artifact directories, e.g. one per report under ARTIFACT_DIR.
+        :param embeddings: The query embeddings, defaults to the deployment's embedding backend.
+                           Artifacts storing local embeddings are queried with those instead.
+        :param kwargs: Options passed to ShardedRetriever.
+        :return: The ShardedRetriever.
+        """
+        from src.utils.index_registry import shared_index
+        shards = {}
+        for dir_path in dir_paths:
+            shared = shared_index(dir_path)
+            if embeddings is None and shared.artifact.embeddings is None:
+                from src.utils.search import embedding_backend
+                embeddings = embedding_backend()
+            shards[os.path.basename(os.path.normpath(dir_path))] = shared.vector_store(embeddings)
+        # each shard keeps the embedding function it was given, shared or stored with its artifact
+        return cls(shards, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    @property
+    def shard_names(self) -> List[str]:
+        return list(self._shards.keys())
+
+    def subset(self, names: Iterable[str]) -> 'ShardedRetriever':
+        """
+        A retriever searching only some of the shards, sharing this one's thread pool.
+
+        :param names: The shard names.
+        :return: The ShardedRetriever.
+        :raises KeyError: If a name is not a shard.
+        """
+        names = list(names)
+        unknown = [name for name in names if name not in self._shards]
+        if unknown:
+            raise KeyError(
+                f"The following shards: {list(self._shards.keys())} are supported. "
+                f"Not {unknown}"
+            )
+        return ShardedRetriever(
+            {name: self._shards[name] for name in names}, self._embeddings, executor=self._executor
+        )
+
+    @property
+    def version(self) -> Tuple:
+        """The versions of the shards, see `query_cache.store_version`."""
+        return tuple(store_version(store) for store in self._shards.values())
+
+    def _embedding_function(self, name: str):
+        if self._embeddings is not None:
+            return self._embeddings.embed_query
+        return self._shards[name].embedding_function
+
+    @property
+    def embedding_function(self):
+        """The query embedding function of the first shard, like a langchain FAISS store's."""
+        return self._embedding_function(next(iter(self._shards)))
+
+    @property
+    def embeds_per_shard(self) -> bool:
+        """Whether shards embed queries differently, so a query must be searched by text, not by vector."""
+        if self._embeddings is not None:
+            return False
+        # a bound embed_query is identified by its embeddings object
+        return len({
+            id(getattr(store.embedding_function, '__self__', store.embedding_function))
+            for store in self._shards.values()
+        }) > 1
+
+    def _query_vectors(self, query: str, names: List[str]) -> Dict[str, List[float]]:
+        """The query vector of each shard, embedding the query once per distinct embeddings."""
+        vectors, by_embeddings = {}, {}
+        for name in names:
+            function = self._embedding_function(name)
+            key = id(getattr(function, '__self__', function))
+            if key not in by_embeddings:
+                by_embeddings[key] = function(query)
+            vectors[name] = by_embeddings[key]
+        return vectors
+
+    def search_by_vector(
+            self, embedding: List[float], k: int = 4, shards: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, Document, float]]:
+        """
+        Return the k chunks closest to a vector across shards.
+
+        :param embedding: The query vector.
+        :param k: The number of chunks.
+        :param shards: Optional shard names to restrict the search to, defaults to all shards.
+        :return: (shard name, document, L2 distance) tuples, closest first.
+        :raises KeyError: If a name is not a shard.
+        """
+        names = list(shards) if shards is not None else list(self._shards.keys())
+        return self._search({name: embedding for name in names}, k)
+
+    def _search(self, vectors: Dict[str, List[float]], k: int) -> List[Tuple[str, Document, float]]:
+        """Search every shard with its query vector and merge the results, see `search_by_vector`."""
+        names = list(vectors.keys())
+        unknown = [name for name in names if name not in self._shards]
+        if unknown:
+            raise KeyError(
+                f"The following shards: {list(self._shards.keys())} are supported. "
+                f"Not {unknown}"
+            )
+        if len(names) == 1:
+            results = self._shards[names[0]].similarity_search_with_score_by_vector(vectors[names[0]], k)
+            return [(names[0], document, float(distance)) for document, distance in results]
+        futures = [
+            (name, self._executor.submit(self._shards[name].similarity_search_with_score_by_vector, vectors[name], k))
+            for name in names
+        ]
+        hits = (
+            (float(distance), i, rank, name, document)
+            for i, (name, future) in enumerate(futures)
+            for rank, (document, distance) in enumerate(future.result())
+        )
+        # shard position and rank break distance ties, so documents are never compared
+        return [(name, document, distance) for distance, _, _, name, document in heapq.nsmallest(k, hits)]
+
+    def search(
+            self, query: str, k: int = 4, shards: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, Document, float]]:
+        """Embed a query once per distinct embeddings and search it across shards, see `search_by_vector`."""
+        names = list(shards) if shards is not None else list(self._shards.keys())
+        return self._search(self._query_vectors(query, names), k)
+
+    @staticmethod
+    def _tagged(results: List[Tuple[str, Document, float]]) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=document.page_content, metadata={**document.metadata, SHARD_KEY: name}), distance)
+            for name, document, distance in results
+        ]
+
+    def similarity_search_with_score_by_vector(
+            self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        return self._tagged(self.search_by_vector(embedding, k))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return self._tagged(self.search(query, k))
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def close(self):
+        """Shut down the thread pool, unless it was given."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def __enter__(self) -> 'ShardedRetriever':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
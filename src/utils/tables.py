@@ -0,0 +1,138 @@
+import math
+
+from array import array
+from typing import List, Dict, Optional, Any, Sequence
+
+
+COLUMN_SEPARATOR = ' | '
+# DICT KEYS
+TITLE_KEY = "title"
+HEADERS_KEY = "col_headers"
+TABLE_ROWS_KEY = "table"
+
+
+def _typed_column(cells: Sequence[str]):
+    """
+    Store a column of cell strings as an array of 64-bit integers or doubles
+    when every cell can be restored exactly from the number, else as a tuple
+    of strings. Empty cells are NaN in float columns, so non-finite cells keep
+    the column as strings.
+    """
+    values = [cell for cell in cells if cell]
+    if not values:
+        return tuple(cells)
+
+    try:
+        if len(values) == len(cells) and all(str(int(cell)) == cell for cell in values):
+            return array('q', [int(cell) for cell in values])
+    except (ValueError, OverflowError):
+        pass
+
+    try:
+        # non-finite cells such as 'nan' would render like empty cells
+        if all(math.isfinite(float(cell)) and repr(float(cell)) == cell for cell in values):
+            return array('d', [float(cell) if cell else math.nan for cell in cells])
+    except ValueError:
+        pass
+
+    return tuple(cells)
+
+
+def _cell(column, i: int) -> str:
+    value = column[i]
+    if isinstance(column, tuple):
+        return value
+    if column.typecode == 'd':
+        return '' if math.isnan(value) else repr(value)
+    return str(value)
+
+
+class ColumnarTable(object):
+    """
+    A compact, column oriented table.
+
+    The headers are stored once and every column as a typed array: integer
+    and float columns as `array.array`, other columns as tuples of strings.
+    Rows without any data are dropped, as are columns with neither a header
+    nor data and columns repeating the previous column (cells spanning
+    several grid columns are repeated per grid column when read from a .doxc
+    table). A table of headers only keeps its headers.
+
+    For compatibility with the dict tables the loaders used to return,
+    `table['title']`, `table['col_headers']` and `table['table']` are
+    supported, the latter building the list of row dicts on demand.
+    `str(table)` renders the table as compact pipe separated rows.
+    """
+
+    __slots__ = ('title', 'headers', 'columns', 'n_rows')
+
+    def __init__(self, headers: List[str], rows: List[List[str]], title: Optional[str] = None):
+        """
+        Initializes the ColumnarTable object.
+
+        :param headers: The column headers.
+        :param rows: The data rows, each a list of cell strings aligned with the headers.
+        :param title: Optional table title.
+        """
+        self.title = title
+
+        rows = [row for row in rows if any(row)]
+        columns = [[row[j] if j < len(row) else '' for row in rows] for j in range(len(headers))]
+
+        keep = []
+        for j, (header, column) in enumerate(zip(headers, columns)):
+            if not header and not any(column):
+                continue
+            if keep and headers[keep[-1]] == header and columns[keep[-1]] == column:
+                continue
+            keep.append(j)
+
+        self.headers = tuple(headers[j] for j in keep)
+        self.columns = tuple(_typed_column(columns[j]) for j in keep)
+        self.n_rows = len(rows)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def row(self, i: int) -> List[str]:
+        """Returns the cells of the i-th row as strings."""
+        return [_cell(column, i) for column in self.columns]
+
+    def rows(self) -> List[List[str]]:
+        """Returns every row as a list of cell strings."""
+        return [self.row(i) for i in range(self.n_rows)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the table in the legacy dict layout: title, headers and one dict per row."""
+        return {
+            TITLE_KEY: self.title,
+            HEADERS_KEY: list(self.headers),
+            TABLE_ROWS_KEY: [dict(zip(self.headers, row)) for row in self.rows()],
+        }
+
+    def keys(self) -> List[str]:
+        return [TITLE_KEY, HEADERS_KEY, TABLE_ROWS_KEY]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == TITLE_KEY:
+            return self.title
+        if key == HEADERS_KEY:
+            return list(self.headers)
+        if key == TABLE_ROWS_KEY:
+            return self.to_dict()[TABLE_ROWS_KEY]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __str__(self) -> str:
+        lines = [self.title] if self.title else []
+        lines.append(COLUMN_SEPARATOR.join(self.headers))
+        lines.extend(COLUMN_SEPARATOR.join(row) for row in self.rows())
+        return '\n'.join(lines)
+
+    def __repr__(self) -> str:
+        return f"ColumnarTable(title={self.title!r}, headers={list(self.headers)!r}, n_rows={self.n_rows})"
@@ -0,0 +1,255 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import subprocess
+
+import PyPDF2
+import numpy as np
+import pandas as pd
+import tabula
+
+from collections import defaultdict
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+JAVA_OPTIONS = ['-Djava.awt.headless=true', '-Dfile.encoding=UTF8']
+BATCH_FORMAT = 'json'
+BATCH_PDF_TEMPLATE = '{:06d}.pdf'  # tabula-java only picks up lower case .pdf files in batch mode
+
+
+def _error_message(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def _write_page_range(file_path: str, pages: Tuple[int, int], output_path: str):
+    """Write pages (first, last) of a PDF, 1-based and inclusive, to a new PDF."""
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        writer = PyPDF2.PdfWriter()
+        first, last = pages
+        for page_num in range(first - 1, min(last, len(reader.pages))):
+            writer.add_page(reader.pages[page_num])
+        with open(output_path, 'wb') as out:
+            writer.write(out)
+
+
+def _data_frames(raw_json: List[Dict[str, Any]]) -> List[pd.DataFrame]:
+    """
+    Convert the JSON output of tabula-java into DataFrames the way tabula.read_pdf
+    does by default: the first row holds the column names, unnamed columns are
+    called 'Unnamed: i', repeated names get a '.n' suffix, empty cells are NaN
+    and numeric columns are converted to numbers. Tables without rows are skipped.
+    """
+    data_frames = []
+    for table in raw_json:
+        if not table['data']:
+            continue
+        rows = [[cell['text'] or np.nan for cell in row] for row in table['data']]
+        columns = rows.pop(0)
+
+        n_unnamed = 0
+        for j, column in enumerate(columns):
+            if column is np.nan:
+                columns[j] = f"Unnamed: {n_unnamed}"
+                n_unnamed += 1
+
+        counts = defaultdict(int)
+        for j, column in enumerate(columns):
+            count = counts[column]
+            while count > 0:
+                counts[column] = count + 1
+                column = f"{column}.{count}"
+                count = counts[column]
+            columns[j] = column
+            counts[column] = count + 1
+
+        df = pd.DataFrame(data=rows, columns=columns)
+        for column in df.columns:
+            try:
+                df[column] = pd.to_numeric(df[column])
+            except (ValueError, TypeError):
+                pass
+        data_frames.append(df)
+    return data_frames
+
+
+def _link_or_copy(file_path: str, output_path: str):
+    try:
+        os.symlink(os.path.abspath(file_path), output_path)
+    except OSError:  # e.g. no symlink permission on Windows
+        shutil.copyfile(file_path, output_path)
+
+
+class TabulaBatch(object):
+    """
+    Extracts tables from many PDFs with a single tabula-java process.
+
+    `tabula.read_pdf` starts a new JVM for every call, which costs more than
+    the extraction itself on small reports. Here, every queued PDF or page
+    range is staged into one working directory and the whole queue is
+    extracted by one tabula-java run in batch mode, so a directory of reports
+    pays for one JVM start-up. Page ranges are cut into their own small PDFs
+    while staging, so different ranges of different files still share the run.
+
+    Usage:
+        batch = TabulaBatch()
+        batch.submit('report.pdf')
+        batch.submit('other.pdf', pages=(10, 12))
+        for file_path, pages, dfs, error in batch.run():
+            ...
+    """
+
+    def __init__(
+            self,
+            java_options: Optional[List[str]] = None,
+            lattice: bool = False,
+            stream: bool = False,
+            guess: bool = True,
+            batch_size: Optional[int] = None,
+    ):
+        """
+        Initializes the TabulaBatch object.
+
+        :param java_options: Extra JVM options, e.g. ['-Xmx1g'].
+        :param lattice: Force lattice-mode extraction.
+        :param stream: Force stream-mode extraction.
+        :param guess: Guess the table area of each page, as tabula.read_pdf does by default.
+        :param batch_size: Optional maximum number of queued items per JVM. The whole
+                           queue goes to one JVM if None.
+        """
+        self._java_options = JAVA_OPTIONS + list(java_options or [])
+        self._lattice = lattice
+        self._stream = stream
+        self._guess = guess
+        self._batch_size = batch_size
+        self._queue = []
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, file_path: str, pages: Optional[Tuple[int, int]] = None):
+        """
+        Queue a PDF for table extraction.
+
+        :param file_path: The path to the PDF file.
+        :param pages: Optional (first, last) page numbers, 1-based and inclusive.
+                      All pages are extracted if None.
+        """
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"The file {file_path} does not exist.")
+        self._queue.append((file_path, pages))
+
+    def _convert(self, input_dir: str):
+        tabula.convert_into_by_batch(
+            input_dir,
+            output_format=BATCH_FORMAT,
+            java_options=list(self._java_options),
+            pages='all',
+            guess=self._guess,
+            lattice=self._lattice,
+            stream=self._stream,
+            silent=True,
+        )
+
+    def _run_batch(
+            self, items: List[Tuple[str, Optional[Tuple[int, int]]]]
+    ) -> Iterator[Tuple[str, Optional[Tuple[int, int]], List[pd.DataFrame], Optional[str]]]:
+        with tempfile.TemporaryDirectory() as work_dir:
+            staged, errors = [], {}
+            for i, (file_path, pages) in enumerate(items):
+                staged_path = os.path.join(work_dir, BATCH_PDF_TEMPLATE.format(i))
+                staged.append(staged_path)
+                try:
+                    if pages is None:
+                        _link_or_copy(file_path, staged_path)
+                    else:
+                        _write_page_range(file_path, pages, staged_path)
+                except Exception as e:
+                    errors[i] = _error_message(e)
+
+            batch_error = None
+            try:
+                self._convert(work_dir)
+            except subprocess.CalledProcessError as e:
+                # tabula-java stops at the first PDF it cannot parse. Outputs written
+                # before that are kept, the rest is retried below one file at a time.
+                logger.warning(f'tabula-java batch run failed, retrying unfinished files: {e}')
+            except Exception as e:
+                # e.g. no Java runtime, so retries would fail alike: the error is recorded on every unfinished file
+                batch_error = _error_message(e)
+                logger.warning(f'tabula-java batch run failed: {e}')
+
+            for i, (file_path, pages) in enumerate(items):
+                if i in errors:
+                    yield file_path, pages, [], errors[i]
+                    continue
+
+                output_path = os.path.splitext(staged[i])[0] + f'.{BATCH_FORMAT}'
+                try:
+                    with open(output_path, 'r', encoding='utf-8') as f:
+                        raw_json = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    raw_json = None
+
+                if raw_json is None and batch_error is not None:
+                    yield file_path, pages, [], batch_error
+                    continue
+                if raw_json is None:
+                    try:
+                        raw_json = self._retry(staged[i], work_dir)
+                    except Exception as e:
+                        yield file_path, pages, [], _error_message(e)
+                        continue
+                yield file_path, pages, _data_frames(raw_json), None
+
+    def _retry(self, staged_path: str, work_dir: str) -> List:
+        """Extract a single staged PDF on its own, in a directory of its own."""
+        retry_dir = tempfile.mkdtemp(dir=work_dir)
+        retry_path = os.path.join(retry_dir, os.path.basename(staged_path))
+        os.replace(staged_path, retry_path)
+        self._convert(retry_dir)
+        with open(os.path.splitext(retry_path)[0] + f'.{BATCH_FORMAT}', 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def run(self) -> Iterator[Tuple[str, Optional[Tuple[int, int]], List[pd.DataFrame], Optional[str]]]:
+        """
+        Extract the tables of every queued item and empty the queue.
+
+        Results are yielded in submission order, parsed one item at a time, so
+        only the DataFrames of the current item are held in memory. A PDF that
+        fails does not abort the batch, its error is reported instead.
+
+        :return: An iterator of (file path, pages, DataFrames, error) tuples.
+                 DataFrames is empty and error holds the message if extraction failed.
+        """
+        items, self._queue = self._queue, []
+        batch_size = self._batch_size or max(len(items), 1)
+        for start in range(0, len(items), batch_size):
+            yield from self._run_batch(items[start:start + batch_size])
+
+
+def read_pdfs(
+        file_paths: List[str], pages: Optional[Tuple[int, int]] = None, **kwargs
+) -> Iterator[Tuple[str, List[pd.DataFrame], Optional[str]]]:
+    """
+    Extract the tables of many PDFs with a single JVM.
+
+    :param file_paths: The paths to the PDF files.
+    :param pages: Optional (first, last) page numbers applied to every file.
+    :param kwargs: Options passed to `TabulaBatch`.
+    :return: An iterator of (file path, DataFrames, error) tuples, in the order of `file_paths`.
+    """
+    batch = TabulaBatch(**kwargs)
+    for file_path in file_paths:
+        batch.submit(file_path, pages)
+    for file_path, _, dfs, error in batch.run():
+        yield file_path, dfs, error
@@ -0,0 +1,268 @@
+import re
+import bisect
+import logging
+
+import numpy as np
+import tiktoken
+
+from functools import lru_cache
+from typing import List, Tuple, Optional, Iterable, Iterator
+
+
+# Create a logger object
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler()
+handler.setFormatter(logging.Formatter('%(asctime)s:%(name)s:%(levelname)s:%(message)s'))
+logger.addHandler(handler)
+
+SEPARATORS = ["\n\n", "\n", " ", ""]
+PAGE_JOINER = "\n"  # pages are joined like DocumentVectorizer joins a list of texts
+UTF8_CONTINUATION_MASK = 0xC0
+UTF8_CONTINUATION = 0x80
+
+
+@lru_cache(maxsize=None)
+def encoding_for_model(model: str) -> tiktoken.Encoding:
+    """The tiktoken encoding of a model, resolved once per process."""
+    return tiktoken.get_encoding(tiktoken.encoding_for_model(model).name)
+
+
+@lru_cache(maxsize=None)
+def token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """The UTF-8 byte length of every token of an encoding, 0 for unused token values."""
+    lengths = np.zeros(encoding.max_token_value + 1, dtype=np.int64)
+    for token in range(len(lengths)):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return lengths
+
+
+def token_char_offsets(text: str, encoding: tiktoken.Encoding) -> np.ndarray:
+    """
+    Encode a text once and return the character offset at which every token starts.
+
+    Tokens are mapped to characters through their UTF-8 byte offsets. A token
+    starting inside a multi-byte character starts at that character.
+
+    :param text: The text to encode.
+    :param encoding: The tiktoken encoding.
+    :return: An int64 array of non-decreasing character offsets, one per token.
+    """
+    tokens = np.array(encoding.encode(text, disallowed_special=()), dtype=np.int64)
+    token_bytes = token_byte_lengths(encoding)[tokens]
+    byte_starts = np.cumsum(token_bytes) - token_bytes
+
+    utf8 = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    char_of_byte = np.cumsum((utf8 & UTF8_CONTINUATION_MASK) != UTF8_CONTINUATION) - 1
+    return char_of_byte[byte_starts]
+
+
+class TokenSpanSplitter(object):
+    """
+    A recursive splitter measuring chunks in tokens of a single encoding pass.
+
+    It makes the same decisions as langchain's RecursiveCharacterTextSplitter
+    with a token `length_function` and kept separators: split on the first
+    separator (a regex) found in the text, recurse with the next separators
+    into splits that are too long, and merge consecutive splits into chunks
+    of at most `chunk_size` tokens that repeat up to `chunk_overlap` tokens of
+    the previous chunk.
+
+    Instead of re-encoding every candidate fragment, the document is encoded
+    once and the length of any span is read from a prefix count of token
+    start offsets, so splitting is linear in the length of the document.
+    Splits are kept as (start, end) character spans and only sliced from the
+    text at the end, which also gives every chunk its position in the source.
+
+    A span counts the tokens that start inside it, so lengths can differ by a
+    token from encoding the span on its own where a split cuts through a token.
+    """
+
+    def __init__(
+            self,
+            chunk_size: int = 240,
+            chunk_overlap: int = 24,
+            separators: Optional[List[str]] = None,
+            model: str = 'gpt-3.5-turbo',
+            encoding: Optional[tiktoken.Encoding] = None,
+    ):
+        """
+        Initializes the TokenSpanSplitter object.
+
+        :param chunk_size: The maximum number of tokens in a chunk.
+        :param chunk_overlap: The maximum number of tokens adjacent chunks share.
+        :param separators: The separator regexes, in order of priority.
+        :param model: The name of the model whose tokenizer measures the chunks.
+        :param encoding: Optional tiktoken encoding, overrides `model`.
+        :raises ValueError: If the overlap is larger than the chunk size.
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
+                f"({chunk_size}), should be smaller."
+            )
+        self._chunk_size = chunk_size
+        self._chunk_overlap = chunk_overlap
+        self._separators = list(separators or SEPARATORS)
+        self._patterns = [re.compile(separator) if separator else None for separator in self._separators]
+        self._encoding = encoding if encoding is not None else encoding_for_model(model)
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Split a text into chunks, returned as character spans.
+
+        :param text: The text to split.
+        :return: A list of (start, end) spans such that text[start:end] is a
+                 chunk, stripped of surrounding whitespace.
+        """
+        starts = token_char_offsets(text, self._encoding)
+        # prefix[i] is the number of tokens starting before character i
+        prefix = np.searchsorted(starts, np.arange(len(text) + 1), side='left')
+        return _SplitRun(self, text, prefix).split(0, len(text), 0)
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split a text into chunks.
+
+        :param text: The text to split.
+        :return: A list of text chunks.
+        """
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+
+class _SplitRun(object):
+    """The state of one `TokenSpanSplitter.split_spans` call."""
+
+    def __init__(self, splitter: TokenSpanSplitter, text: str, prefix: np.ndarray):
+        self.splitter = splitter
+        self.text = text
+        self.prefix = prefix.tolist()  # list indexing is faster than numpy scalars here
+
+    def length(self, start: int, end: int) -> int:
+        return self.prefix[end] - self.prefix[start]
+
+    def _splits(self, start: int, end: int, level: int) -> Tuple[List[Tuple[int, int]], int]:
+        """Split a span on its highest priority separator, keeping separators at split starts."""
+        patterns = self.splitter._patterns
+        for i in range(level, len(patterns)):
+            pattern = patterns[i]
+            if pattern is None:
+                return [(j, j + 1) for j in range(start, end)], len(patterns)
+            cuts = [m.start() for m in pattern.finditer(self.text, start, end) if m.end() > m.start()]
+            if cuts:
+                bounds = [start] + cuts + [end]
+                return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a], i + 1
+        return [(start, end)], len(patterns)
+
+    def split(self, start: int, end: int, level: int) -> List[Tuple[int, int]]:
+        chunk_size = self.splitter._chunk_size
+        splits, next_level = self._splits(start, end, level)
+        has_next = next_level < len(self.splitter._patterns)
+
+        chunks, good = [], []
+        for split in splits:
+            if self.length(*split) < chunk_size:
+                good.append(split)
+                continue
+            if good:
+                chunks.extend(self.merge(good))
+                good = []
+            if has_next:
+                chunks.extend(self.split(split[0], split[1], next_level))
+            else:
+                chunks.append(split)  # unsplittable, kept as is
+        if good:
+            chunks.extend(self.merge(good))
+        return chunks
+
+    def merge(self, splits: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Merge consecutive splits into chunks, carrying the overlap over from chunk to chunk."""
+        chunk_size, chunk_overlap = self.splitter._chunk_size, self.splitter._chunk_overlap
+        chunks = []
+        first, total = 0, 0  # current chunk: splits[first:i]
+        for i, (start, end) in enumerate(splits):
+            n_tokens = self.length(start, end)
+            if total + n_tokens > chunk_size:
+                if total > chunk_size:
+                    logger.warning(
+                        f"Created a chunk of size {total}, "
+                        f"which is longer than the specified {chunk_size}"
+                    )
+                if first < i:
+                    chunks.extend(self._strip(splits[first][0], splits[i - 1][1]))
+                    while total > chunk_overlap or (total + n_tokens > chunk_size and total > 0):
+                        total -= self.length(*splits[first])
+                        first += 1
+            total += n_tokens
+        if first < len(splits):
+            chunks.extend(self._strip(splits[first][0], splits[-1][1]))
+        return chunks
+
+    def _strip(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """The span without surrounding whitespace, as a list holding nothing if it is blank."""
+        chunk = self.text[start:end]
+        stripped = chunk.lstrip()
+        if not stripped:
+            return []
+        start += len(chunk) - len(stripped)
+        return [(start, start + len(stripped.rstrip()))]
+
+
+def iter_page_chunks(
+        splitter: TokenSpanSplitter, pages: Iterable[Tuple[int, str]]
+) -> Iterator[Tuple[str, int, int]]:
+    """
+    Split a stream of pages into chunks, yielding chunks while later pages
+    are still being read.
+
+    Pages are appended to a buffer that is split after every page. All chunks
+    but the last one are yielded; the buffer then restarts at the last chunk,
+    which may still grow with the next page. As chunks overlap, the restarted
+    buffer also holds the overlap with the last yielded chunk. Only about a
+    page of text is held in memory at any time.
+
+    Every chunk is a chunk of its buffer, so chunk sizes hold as for
+    `splitter.split_text`, and the chunks cover all of the text in order.
+    They are not always the chunks of splitting the joined pages at once:
+    the recursive splitter picks its separator per text, so a buffer may be
+    cut on a line break where the whole document is first cut on a blank
+    line further on. Chunks near the page ends can therefore differ.
+
+    :param splitter: The splitter.
+    :param pages: An iterable of (page number, text) tuples, e.g. `Loader.iter_text`.
+    :return: An iterator of (chunk, first page, last page) tuples.
+    """
+    buffer, page_starts, page_numbers = '', [], []
+
+    def _chunk(start: int, end: int) -> Tuple[str, int, int]:
+        return (
+            buffer[start:end],
+            page_numbers[bisect.bisect_right(page_starts, start) - 1],
+            page_numbers[bisect.bisect_right(page_starts, end - 1) - 1],
+        )
+
+    for page_number, page_text in pages:
+        if not page_text:
+            continue
+        if buffer:
+            buffer += PAGE_JOINER
+        page_starts.append(len(buffer))
+        page_numbers.append(page_number)
+        buffer += page_text
+
+        spans = splitter.split_spans(buffer)
+        for start, end in spans[:-1]:
+            yield _chunk(start, end)
+        if len(spans) > 1:
+            # drop the text and pages before the last chunk
+            keep_from = spans[-1][0]
+            first_page = bisect.bisect_right(page_starts, keep_from) - 1
+            page_starts = [max(start - keep_from, 0) for start in page_starts[first_page:]]
+            page_numbers = page_numbers[first_page:]
+            buffer = buffer[keep_from:]
+
+    for start, end in splitter.split_spans(buffer):
+        yield _chunk(start, end)
@@ -0,0 +1,53 @@
+import pytest
+import tiktoken
+
+from typing import List, Callable
+
+
+# words, numbers and punctuation with their leading space, like the GPT-2 pattern
+PATTERN = r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+
+
+@pytest.fixture(scope='session')
+def encoding() -> tiktoken.Encoding:
+    """A byte level encoding, one token per UTF-8 byte, so tests never download a tokenizer."""
+    return tiktoken.Encoding(
+        'bytes',
+        pat_str=PATTERN,
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+
+
+def _write_pdf(path: str, pages: List[str]) -> str:
+    """Write a PDF with one line of Helvetica text per page."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in pages:
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects))
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    pdf, offsets = b'%PDF-1.4\n', []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (i, obj)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(pdf)
+    return str(path)
+
+
+@pytest.fixture
+def write_pdf() -> Callable[[str, List[str]], str]:
+    """Writes a PDF with one line of text per page to a path and returns the path."""
+    return _write_pdf
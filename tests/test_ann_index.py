@@ -0,0 +1,83 @@
+import faiss
+import pytest
+import numpy as np
+
+from src.utils.ann_index import (
+    build_index, set_search_params, rebuild_vector_store, recall_at_k, tune, default_nlist, default_pq_m,
+    _synthetic_vectors, FLAT_INDEX, HNSW_INDEX, IVF_INDEX, IVFPQ_INDEX,
+)
+from src.utils.search import DocumentVectorizer, ContextRetrieval
+
+
+VECTORS = _synthetic_vectors(2000, 32, n_clusters=20)
+QUERIES = VECTORS[::40]
+
+
+def _neighbours(index, k=10):
+    return index.search(QUERIES, k)[1]
+
+
+def test_defaults():
+    assert default_nlist(2000) == 51 and default_nlist(10) == 1
+    assert default_pq_m(32) == 2 and default_pq_m(1536) == 96 and default_pq_m(100) == 5
+
+
+@pytest.mark.parametrize('index_type, params', [
+    (HNSW_INDEX, {'M': 16, 'ef_search': 128}),
+    (IVF_INDEX, {'nprobe': 16}),
+    (IVFPQ_INDEX, {'nprobe': 16, 'm': 8}),
+])
+def test_approximate_indexes_recall_the_flat_neighbours(index_type, params):
+    truth = _neighbours(build_index(VECTORS, FLAT_INDEX))
+    index = build_index(VECTORS, index_type, **params)
+    assert index.ntotal == len(VECTORS)
+    assert recall_at_k(truth, _neighbours(index)) >= (0.5 if index_type == IVFPQ_INDEX else 0.9)
+    np.testing.assert_allclose(index.reconstruct(7), VECTORS[7], atol=0.5 if index_type == IVFPQ_INDEX else 1e-6)
+
+
+def test_build_errors():
+    with pytest.raises(KeyError):
+        build_index(VECTORS, 'lsh')
+    with pytest.raises(ValueError):
+        build_index(VECTORS[:100], IVFPQ_INDEX)
+
+
+def test_search_params():
+    ivf = build_index(VECTORS, IVF_INDEX, nlist=8)
+    set_search_params(ivf, nprobe=100, ef_search=10)  # ef_search does not apply to IVF
+    assert faiss.downcast_index(ivf).nprobe == 8
+    truth = _neighbours(build_index(VECTORS, FLAT_INDEX))
+    assert recall_at_k(truth, _neighbours(ivf)) == 1.
+
+    hnsw = build_index(VECTORS, HNSW_INDEX)
+    set_search_params(hnsw, ef_search=17)
+    assert hnsw.hnsw.efSearch == 17
+
+
+def test_tune_reports_every_setting():
+    grid = [
+        (FLAT_INDEX, {}, [{}]),
+        (IVF_INDEX, {'nlist': 16}, [{'nprobe': 1}, {'nprobe': 16}]),
+        (IVFPQ_INDEX, {}, [{'nprobe': 4}]),
+    ]
+    results = tune(VECTORS[:200], k=5, n_queries=20, grid=grid)  # too few vectors for IVF-PQ
+    assert [(row['index'], row['params']) for row in results] == [
+        (FLAT_INDEX, {}), (IVF_INDEX, {'nlist': 16, 'nprobe': 1}), (IVF_INDEX, {'nlist': 16, 'nprobe': 16}),
+    ]
+    assert results[0]['recall@5'] == 1. and results[2]['recall@5'] == 1.
+    assert results[1]['recall@5'] <= results[2]['recall@5']
+    assert all(row['p50_ms'] <= row['p99_ms'] for row in results)
+
+
+def test_vector_store_indexes(encoding):
+    texts = [f"Site {i} reported {i * 3} tonnes of waste and {i * 5} MWh of energy use." for i in range(40)]
+    vectorizer = DocumentVectorizer(texts, {'Source': 'report.pdf'}, size=30, overlap=0, encoding=encoding)
+    flat = vectorizer.vectorize(backend='hashing')
+    hnsw = vectorizer.vectorize(backend='hashing', index_type=HNSW_INDEX, index_params={'M': 8})
+    assert isinstance(faiss.downcast_index(hnsw.index), faiss.IndexHNSWFlat)
+    assert rebuild_vector_store(flat) is flat
+
+    retrieval = ContextRetrieval(hnsw, search_params={'ef_search': 256})
+    assert hnsw.index.hnsw.efSearch == 256
+    for query in ("Site 7", "energy use of site 12"):
+        assert retrieval.search_vector_store(query, 3) == flat.similarity_search(query, 3)
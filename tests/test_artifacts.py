@@ -0,0 +1,138 @@
+import os
+import json
+import pickle
+import datetime
+
+import faiss
+import numpy as np
+import pytest
+
+from src.utils.artifacts import (
+    Artifact, StringBuffer, write_strings, write_artifact, save_vector_store, convert_pickles,
+    MANIFEST_FILE, VERSION_KEY, FORMAT_VERSION, HAS_INDEX_KEY,
+)
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.search import DocumentVectorizer
+from src.utils.tables import ColumnarTable
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+    "Employees completed 12 hours of safety training on average.",
+    "Waste sent to landfill dropped by a third since 2019.",
+]
+QUERIES = ["scope 2 electricity", "landfill waste", "safety training hours"]
+LOADER_OUTPUT = {
+    'metadata': {'title': 'Report', 'author': 'ACME', 'created': datetime.datetime(2023, 3, 1, 12, 30)},
+    'text': ['Scope 1 emissions', 'Émissions de portée 2', ''],
+    'table': [ColumnarTable(['Year', 'tCO2e'], [['2021', '1300'], ['2022', '1234']], title='Emissions')],
+    'potential_figure': [{'title': 'Energy', 'data': ['45%', '3.5 GWh']}],
+}
+
+
+def test_string_buffer_round_trip(tmp_path):
+    strings = ['Scope 1', '', 'Émissions 中文', 'a' * 1000]
+    write_strings(str(tmp_path), 'texts', strings)
+    buffer = StringBuffer(str(tmp_path), 'texts')
+    assert len(buffer) == 4
+    assert list(buffer) == strings
+    assert buffer[-1] == strings[-1] and buffer[1:3] == strings[1:3]
+    with pytest.raises(IndexError):
+        buffer[4]
+
+    write_strings(str(tmp_path), 'empty', [])
+    assert list(StringBuffer(str(tmp_path), 'empty')) == []
+
+
+def test_loader_output_round_trip(tmp_path):
+    dir_path = str(tmp_path / 'report')
+    write_artifact(dir_path, loader_output=LOADER_OUTPUT)
+    output = Artifact(dir_path).loader_output
+
+    assert output['metadata'] == LOADER_OUTPUT['metadata']
+    assert isinstance(output['text'], StringBuffer) and list(output['text']) == LOADER_OUTPUT['text']
+    table, = output['table']
+    assert (table.title, table.headers, table.rows()) == ('Emissions', ('Year', 'tCO2e'), [['2021', '1300'], ['2022', '1234']])
+    assert output['potential_figure'] == LOADER_OUTPUT['potential_figure']
+
+
+@pytest.fixture
+def vector_store(encoding):
+    return DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding).vectorize(
+        backend='hashing'
+    )
+
+
+def _search(store, query):
+    return [(doc.page_content, doc.metadata) for doc in store.similarity_search(query, 2)]
+
+
+def test_vector_store_round_trip(tmp_path, vector_store):
+    dir_path = str(tmp_path / 'report')
+    manifest = save_vector_store(vector_store, dir_path, LOADER_OUTPUT)
+    assert manifest[VERSION_KEY] == FORMAT_VERSION and not manifest[HAS_INDEX_KEY]
+
+    artifact = Artifact(dir_path)
+    assert len(artifact) == len(REPORT)
+    assert list(artifact.chunks) == REPORT
+    assert np.array_equal(artifact.vectors, vector_store.index.reconstruct_n(0, len(REPORT)))
+    assert isinstance(artifact.embeddings, HashingEmbeddings)
+
+    loaded = artifact.to_vector_store()  # queried with the stored embeddings and IDF weights
+    for query in QUERIES:
+        assert _search(loaded, query) == _search(vector_store, query)
+
+
+def test_non_flat_indexes_are_stored(tmp_path):
+    vectors = np.random.default_rng(0).random((50, 8), dtype=np.float32)
+    index = faiss.IndexHNSWFlat(8, 8)
+    index.add(vectors)
+    write_artifact(str(tmp_path / 'hnsw'), chunks=[str(i) for i in range(50)], vectors=vectors, index=index)
+    assert isinstance(Artifact(str(tmp_path / 'hnsw')).load_index(), faiss.IndexHNSWFlat)
+
+
+def test_write_artifact_checks_and_replaces(tmp_path):
+    dir_path = str(tmp_path / 'report')
+    with pytest.raises(ValueError):
+        write_artifact(dir_path, chunks=['a', 'b'], metadata=[{}])
+    with pytest.raises(ValueError):
+        write_artifact(dir_path, chunks=['a', 'b'], vectors=np.zeros((1, 4)))
+    assert not os.path.exists(dir_path)
+
+    write_artifact(dir_path, chunks=['a'], vectors=np.zeros((1, 4)))
+    write_artifact(dir_path, chunks=['b', 'c'], vectors=np.ones((2, 4)))
+    assert list(Artifact(dir_path).chunks) == ['b', 'c']
+    assert sorted(os.listdir(tmp_path)) == ['report']  # no temporary directories left behind
+
+
+def test_newer_format_versions_are_rejected(tmp_path):
+    dir_path = str(tmp_path / 'report')
+    write_artifact(dir_path, chunks=['a'])
+    manifest_path = os.path.join(dir_path, MANIFEST_FILE)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest[VERSION_KEY] = FORMAT_VERSION + 1
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError):
+        Artifact(dir_path)
+
+
+def test_convert_pickles(tmp_path, vector_store):
+    pickle_dir, faiss_dir = tmp_path / 'pickle_db', tmp_path / 'faiss_db'
+    pickle_dir.mkdir()
+    faiss_dir.mkdir()
+    with open(faiss_dir / 'acme.pkl', 'wb') as f:
+        pickle.dump(vector_store, f)
+    with open(pickle_dir / 'acme_inputs.pkl', 'wb') as f:
+        pickle.dump({'text': LOADER_OUTPUT['text']}, f)
+    with open(pickle_dir / 'other_inputs.pkl', 'wb') as f:
+        pickle.dump({'text': ['Other report']}, f)
+
+    written = convert_pickles(str(pickle_dir), str(faiss_dir), str(tmp_path / 'artifact_db'))
+    assert [os.path.basename(path) for path in written] == ['acme', 'other']
+    acme, other = (Artifact(path) for path in written)
+    assert list(acme.chunks) == REPORT and list(acme.loader_output['text']) == LOADER_OUTPUT['text']
+    assert len(other) == 0 and list(other.loader_output['text']) == ['Other report']
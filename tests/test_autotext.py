@@ -0,0 +1,98 @@
+import os
+import time
+
+import PyPDF2
+import pytest
+
+from src.utils.autotext import (
+    BackendSelector, score_text, document_family, race_backends,
+    ERROR_KEY, SCORE_KEY, SELECTION_FILE_NAME,
+)
+from src.utils.cache import ExtractionCache
+from src.utils.loader import PDFLoader
+
+
+GOOD_PAGE = "Scope 1 emissions fell by 8% in 2022. " * 40
+
+
+def good_loader(file_path):
+    return [GOOD_PAGE, GOOD_PAGE]
+
+
+def slow_loader(file_path):
+    time.sleep(5)
+    return [GOOD_PAGE, GOOD_PAGE]
+
+
+def garbage_loader(file_path):
+    return ["(cid:12)(cid:13) �" * 50, ""]
+
+
+def failing_loader(file_path):
+    raise ValueError("cannot parse")
+
+
+def test_score_text():
+    assert score_text([]) == 0.
+    assert score_text([GOOD_PAGE]) == 1.
+    assert score_text(garbage_loader('')) < 0.1
+    assert score_text([GOOD_PAGE, '']) < score_text([GOOD_PAGE, GOOD_PAGE])
+
+
+def test_document_family():
+    assert document_family('data/Colruyt_Group_annual-report-2022-2023.pdf') == 'colruyt_group_annual_report'
+    assert document_family('ACME 2021.pdf') == document_family('acme-2022.pdf')
+
+
+def test_race_backends_keeps_the_best_output():
+    backend, pages, runs = race_backends(
+        'report.pdf', {'garbage': garbage_loader, 'good': good_loader, 'failing': failing_loader}, accept_score=1.1
+    )
+    assert backend == 'good' and pages == good_loader('')
+    assert runs['failing'][ERROR_KEY].startswith('ValueError')
+    assert runs['garbage'][SCORE_KEY] < runs['good'][SCORE_KEY]
+
+
+def test_race_backends_stops_at_a_good_enough_result():
+    start = time.perf_counter()
+    backend, _, runs = race_backends('report.pdf', {'good': good_loader, 'slow': slow_loader})
+    assert backend == 'good'
+    assert 'slow' not in runs
+    assert time.perf_counter() - start < 4.
+
+
+def test_race_backends_times_out():
+    backend, _, runs = race_backends('report.pdf', {'slow': slow_loader}, timeouts={'slow': 0.2})
+    assert backend is None
+    assert runs['slow'][ERROR_KEY] == 'timeout'
+
+
+def test_selector_remembers_in_memory_by_default(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    selector = BackendSelector()
+    loaders = {'garbage': garbage_loader, 'good': good_loader}
+    assert selector.select('acme-2021.pdf', loaders)[0] == 'good'
+    assert selector.remembered_backend('acme-2022.pdf') == 'good'
+    assert BackendSelector().remembered_backend('acme-2022.pdf') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_selector_persists_to_its_selection_file(tmp_path):
+    selection_file = str(tmp_path / 'selections' / SELECTION_FILE_NAME)
+    BackendSelector(selection_file).select('acme-2021.pdf', {'garbage': garbage_loader, 'good': good_loader})
+    assert BackendSelector(selection_file).remembered_backend('acme-2022.pdf') == 'good'
+
+    with pytest.raises(RuntimeError):
+        BackendSelector(selection_file).select('other.pdf', {'failing': failing_loader})
+
+
+def test_pdf_loader_keeps_selections_next_to_the_cache(tmp_path):
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    with open(tmp_path / 'report.pdf', 'wb') as f:
+        writer.write(f)
+
+    assert PDFLoader('report.pdf', dir_path=str(tmp_path)).selector._selection_file is None
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    loader = PDFLoader('report.pdf', dir_path=str(tmp_path), cache=cache)
+    assert loader.selector._selection_file == os.path.join(str(tmp_path / 'cache'), SELECTION_FILE_NAME)
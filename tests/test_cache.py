@@ -0,0 +1,82 @@
+import os
+import glob
+import shutil
+
+from src.utils import cache as cache_module
+from src.utils.cache import ExtractionCache, file_hash, CACHE_EXTENSION
+from src.utils.loader import PDFLoader, PYPDF2_KEY
+
+
+calls = []  # files count_words ran on
+
+
+def count_words(file_path):
+    calls.append(file_path)
+    with open(file_path) as f:
+        return len(f.read().split())
+
+
+def _entries(cache_dir):
+    return glob.glob(os.path.join(str(cache_dir), f"*{CACHE_EXTENSION}"))
+
+
+def test_get_or_compute_keys_on_file_content(tmp_path):
+    calls.clear()
+    report = tmp_path / 'report.txt'
+    report.write_text('scope one emissions')
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+
+    assert cache.get_or_compute(str(report), 'words', count_words, str(report)) == 3
+    assert cache.get_or_compute(str(report), 'words', count_words, str(report)) == 3
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+    copy = tmp_path / 'copy.txt'
+    shutil.copyfile(report, copy)  # same content, same entry
+    assert file_hash(str(copy)) == file_hash(str(report))
+    assert cache.get_or_compute(str(copy), 'words', count_words, str(copy)) == 3
+    assert len(calls) == 1
+
+    report.write_text('scope one and two emissions')
+    os.utime(report, ns=(0, 10 ** 9))  # a different mtime, as after an edit
+    assert cache.get_or_compute(str(report), 'words', count_words, str(report)) == 5
+    assert len(calls) == 2
+    assert cache.get(str(report), 'other key', count_words) == (False, None)
+
+
+def test_new_code_versions_drop_stale_entries(tmp_path, monkeypatch):
+    report = tmp_path / 'report.txt'
+    report.write_text('scope one emissions')
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    cache.get_or_compute(str(report), 'words', count_words, str(report))
+
+    monkeypatch.setattr(cache_module, 'code_version', lambda loader: 'f' * 16)
+    assert cache.get(str(report), 'words', count_words) == (False, None)
+    cache.get_or_compute(str(report), 'words', count_words, str(report))
+    assert [os.path.basename(path) for path in _entries(tmp_path / 'cache')] == [
+        f"{file_hash(str(report))}_words_{'f' * 16}{CACHE_EXTENSION}"
+    ]
+
+
+def test_eviction_and_clear(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'cache'), max_bytes=1)
+    for i in range(3):
+        report = tmp_path / f'report{i}.txt'
+        report.write_text('word ' * (i + 1))
+        cache.get_or_compute(str(report), 'words', count_words, str(report))
+    assert len(_entries(tmp_path / 'cache')) <= 1
+
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    cache.get_or_compute(str(report), 'other', count_words, str(report))
+    cache.clear()
+    assert _entries(tmp_path / 'cache') == []
+
+
+def test_loader_goes_through_the_cache(tmp_path, write_pdf):
+    write_pdf(str(tmp_path / 'report.pdf'), ['Scope 1', 'Scope 2', 'Scope 3'])
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    loader = PDFLoader('report.pdf', dir_path=str(tmp_path), cache=cache)
+
+    assert loader.load_text(PYPDF2_KEY) == ['Scope 1', 'Scope 2', 'Scope 3']
+    assert loader.load_text(PYPDF2_KEY) == ['Scope 1', 'Scope 2', 'Scope 3']
+    assert loader.load_text(PYPDF2_KEY, (2, 3)) == ['Scope 2', 'Scope 3']  # its own entry
+    assert cache.stats() == {'hits': 1, 'misses': 2}
@@ -0,0 +1,96 @@
+import zipfile
+import datetime
+
+import docx
+import pytest
+
+from src.utils.doxc_parser import (
+    W_P, W_TBL, iter_body, iter_body_pages, iter_numbered_body_pages, paragraph_text, table_rows,
+    document_part_name, read_core_properties,
+)
+from src.utils.loader import DOXCLoader, TABLE_KEY
+
+
+@pytest.fixture
+def report(tmp_path):
+    document = docx.Document()
+    document.core_properties.title = 'Sustainability report'
+    document.core_properties.author = 'ACME'
+    document.core_properties.created = datetime.datetime(2023, 3, 1, 12, 30)
+
+    document.add_paragraph('Introduction')
+    paragraph = document.add_paragraph('Scope 1')
+    paragraph.add_run('\temissions')
+    paragraph.add_run().add_break()
+    paragraph.add_run('fell by 8%')
+    document.add_paragraph('')
+
+    table = document.add_table(rows=4, cols=3)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"r{i}c{j}"
+    table.cell(0, 0).merge(table.cell(0, 1))  # spans two grid columns
+    table.cell(1, 2).merge(table.cell(3, 2))  # spans three rows
+    table.cell(2, 0).add_paragraph('second line')
+
+    document.add_page_break()
+    document.add_paragraph('Water use was stable.')
+    document.add_page_break()
+    document.add_paragraph('Waste was halved.')
+
+    path = str(tmp_path / 'report.docx')
+    document.save(path)
+    return path
+
+
+def _body(path):
+    with zipfile.ZipFile(path) as archive:
+        return list(iter_body(archive, document_part_name(archive)))
+
+
+def test_paragraph_text_matches_python_docx(report):
+    texts = [paragraph_text(elem) for elem, _ in _body(report) if elem.tag == W_P]
+    assert texts == [paragraph.text for paragraph in docx.Document(report).paragraphs]
+
+
+def test_table_rows_match_python_docx(report):
+    tables = [table_rows(elem) for elem, _ in _body(report) if elem.tag == W_TBL]
+    expected = [[[cell.text for cell in row.cells] for row in table.rows] for table in docx.Document(report).tables]
+    assert tables == expected
+    assert tables[0][0][0] == tables[0][0][1]
+    assert tables[0][1][2] == tables[0][2][2] == tables[0][3][2]
+
+
+def test_iter_body_pairs_every_element_with_the_next(report):
+    body = _body(report)
+    assert [next_elem for _, next_elem in body[:-1]] == [elem for elem, _ in body[1:]]
+    assert body[-1][1] is None
+
+
+def test_read_core_properties_match_python_docx(report):
+    with zipfile.ZipFile(report) as archive:
+        properties = read_core_properties(archive)
+    core = docx.Document(report).core_properties
+    assert properties == {'title': core.title, 'author': core.author, 'created': core.created}
+
+
+def test_iter_body_pages_follow_page_breaks(report):
+    with zipfile.ZipFile(report) as archive:
+        part = document_part_name(archive)
+        texts = {
+            page: paragraph_text(elem)
+            for page, elem, _ in iter_numbered_body_pages(archive, part, (1, None))
+            if elem.tag == W_P and paragraph_text(elem).strip()
+        }
+        second = [paragraph_text(elem) for elem, _ in iter_body_pages(archive, part, (2, 2))]
+    assert texts[2] == 'Water use was stable.' and texts[3] == 'Waste was halved.'
+    assert 'Water use was stable.' in second and 'Waste was halved.' not in second
+
+
+def test_load_all_tables_match_the_table_loader(report):
+    tables = DOXCLoader.doxc_all_loader(report)[TABLE_KEY]
+    expected = DOXCLoader.doxc_table_loader(report)
+    assert [(table.headers, table.rows()) for table in tables] == [
+        (table.headers, table.rows()) for table in expected
+    ]
+    assert tables[0].title == 'Scope 1\temissions\nfell by 8%'  # the paragraph before the table
@@ -0,0 +1,94 @@
+import pickle
+
+import numpy as np
+
+from typing import List
+from langchain.embeddings.base import Embeddings
+from src.utils.embedding_cache import EmbeddingCache, CachedEmbeddings, embedding_key
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.search import DocumentVectorizer, EMBEDDING_MODEL
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+]
+
+
+class CountingEmbeddings(Embeddings):
+    """Fitted local embeddings that record every text sent to them."""
+
+    def __init__(self):
+        self.embeddings = HashingEmbeddings(dimensions=32).fit(REPORT)
+        self.texts = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.texts.append(text)
+        return self.embeddings.embed_query(text)
+
+
+def test_get_and_put(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'))
+    assert cache.get_many('model', ['a b', 'c']) == [None, None]
+
+    cache.put_many('model', ['a b'], [[0.5, 0.25]])
+    assert cache.get_many('model', ['a b', '  a\n b ', 'c']) == [[0.5, 0.25], [0.5, 0.25], None]
+    assert cache.get_many('other-model', ['a b']) == [None]
+    assert cache.stats() == {'hits': 2, 'misses': 4}
+    assert embedding_key('model', 'a b') == embedding_key('model', 'a  b')
+
+    cache.clear()
+    assert cache.get_many('model', ['a b']) == [None]
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'), max_entries=2)
+    cache.put_many('model', ['first'], [[1.]])
+    cache.put_many('model', ['second'], [[2.]])
+    cache.get_many('model', ['first'])  # now more recently used than 'second'
+    cache.put_many('model', ['third'], [[3.]])
+    assert cache.get_many('model', ['first', 'second', 'third']) == [[1.], None, [3.]]
+
+
+def test_cached_embeddings_only_embed_misses(tmp_path):
+    inner = CountingEmbeddings()
+    embed = CachedEmbeddings(inner, EmbeddingCache(str(tmp_path / 'embeddings.sqlite')), 'hashing')
+
+    texts = [REPORT[0], REPORT[1], ' '.join(REPORT[0].split(' ')) + ' ']
+    vectors = embed.embed_documents(texts)
+    assert inner.texts == REPORT[:2]  # the repeated text is embedded once
+    expected = np.asarray(inner.embeddings.embed_documents([REPORT[0], REPORT[1], REPORT[0]]), dtype=np.float32)
+    np.testing.assert_allclose(vectors, expected)
+
+    assert np.allclose(embed.embed_documents(REPORT), inner.embeddings.embed_documents(REPORT))
+    assert inner.texts == REPORT  # only the new text was sent
+    assert embed.embed_query(REPORT[2]) == embed.embed_documents([REPORT[2]])[0]
+    assert inner.texts == REPORT
+
+
+def test_cache_survives_pickling(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'))
+    cache.put_many('model', ['a'], [[1.]])
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.get_many('model', ['a']) == [[1.]]
+
+
+def test_vectorize_with_cache(tmp_path, encoding):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.sqlite'))
+    vectorizer = DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+
+    inner = CountingEmbeddings()
+    vectorizer.vectorize(embedding_model='hashing', cache=cache, embeddings=inner)
+    assert inner.texts == REPORT
+    store = vectorizer.vectorize(embedding_model='hashing', cache=cache, embeddings=inner)
+    assert inner.texts == REPORT  # every chunk came from the cache
+    assert store.similarity_search("water withdrawal", 1)[0].page_content == REPORT[2]
+
+    # local backends are cheaper to recompute than to look up
+    vectorizer.vectorize(cache=cache, backend='hashing')
+    assert cache.get_many(EMBEDDING_MODEL, REPORT) == [None] * len(REPORT)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from src.utils.benchmark import StandInEmbeddingServer
+from src.utils.embedding_scheduler import AsyncBatchEmbeddings, TokenBucket, pack_batches
+
+
+def token_len(text: str) -> int:
+    return len(text.split())
+
+
+def test_pack_batches_keeps_input_order():
+    assert pack_batches([3, 3, 3, 10, 1, 1], max_tokens=6) == [[0, 1], [2], [3], [4, 5]]
+    assert pack_batches([1] * 5, max_tokens=100, max_items=2) == [[0, 1], [2, 3], [4]]
+    assert pack_batches([]) == []
+
+
+def test_token_bucket_serves_reservations_in_order():
+    bucket = TokenBucket(rate=10., capacity=1.)
+    waits = [bucket.wait_time(1.) for _ in range(3)]
+    assert waits[0] == 0.
+    assert waits[1] == pytest.approx(0.1, abs=0.01)
+    assert waits[2] == pytest.approx(0.2, abs=0.01)
+
+
+def test_token_bucket_throttle_and_recover():
+    bucket = TokenBucket(rate=10.)
+    bucket.throttle()
+    assert bucket.rate == 5.
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.rate == 10.
+    bucket.throttle(retry_after=0.5)
+    assert bucket.wait_time(0.) == pytest.approx(0.5, abs=0.05)
+
+
+def test_embed_documents_in_input_order():
+    texts = [f"chunk {i} " + "word " * (i % 7) for i in range(50)]
+    with StandInEmbeddingServer(latency=0.) as server:
+        embeddings = AsyncBatchEmbeddings(
+            model='stand-in', api_base=server.url, api_key='stand-in',
+            batch_tokens=20, max_concurrency=4, token_len=token_len,
+        )
+        vectors = embeddings.embed_documents(texts)
+    assert vectors == [server.vector(text, server.dim) for text in texts]
+    assert embeddings.n_requests == len(pack_batches([token_len(text) for text in texts], 20))
+
+
+def test_rate_limits_hold_across_calls():
+    with StandInEmbeddingServer(latency=0., requests_per_second=1.) as server:
+        embeddings = AsyncBatchEmbeddings(
+            model='stand-in', api_base=server.url, api_key='stand-in',
+            batch_tokens=1, max_concurrency=2, token_len=token_len,
+        )
+        assert embeddings.embed_documents(['a', 'b']) == [server.vector(text, server.dim) for text in 'ab']
+        assert server.n_rate_limited >= 1
+        requests_rate = embeddings._requests.rate
+        assert requests_rate < embeddings._requests.max_rate
+
+        # a new event loop, the same buckets
+        assert asyncio.run(embeddings.aembed_query('c')) == server.vector('c', server.dim)
+        assert embeddings._requests.rate <= requests_rate * 1.05
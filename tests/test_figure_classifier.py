@@ -0,0 +1,32 @@
+import random
+
+from src.utils.loader import classify_figure_data, is_potential_figure_data, contains_unit
+
+
+CASES = [
+    None, '', ' ', '2022', '12.5%', '1,200 tCO2e', '45 kg', '45kg', '3 kms', '0.5 m',
+    'Scope 1 emissions', 'Scope 1 emissions 2022', 'Energy 12%', '-3.2', '100.', '100:',
+    'Total waste (tonnes)', 'ééé 12 ñ', '中文 2022 年', '  42  ', '5 l', '12 mm rain',
+]
+ALPHABET = 'abcdefgkmlsh0123456789 .%-,:;é中'
+
+
+def test_contains_unit():
+    assert contains_unit('45 kg') and contains_unit('0.5m')
+    assert not contains_unit('3 kms') and not contains_unit('kg')
+
+
+def test_batch_classifier_matches_the_scalar_classifier():
+    assert classify_figure_data(CASES) == [is_potential_figure_data(text) for text in CASES]
+
+    rnd = random.Random(0)
+    texts = [
+        ''.join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 40))) if rnd.random() > 0.05 else None
+        for _ in range(2000)
+    ]
+    assert classify_figure_data(texts) == [is_potential_figure_data(text) for text in texts]
+
+
+def test_batch_classifier_edge_cases():
+    assert classify_figure_data([]) == []
+    assert classify_figure_data([None, None]) == [False, False]
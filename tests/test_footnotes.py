@@ -0,0 +1,112 @@
+import re
+import random
+import zipfile
+
+import docx
+import pytest
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from src.utils.doxc_parser import read_footnotes, document_part_name
+from src.utils.loader import DOXCLoader, process_footnotes, extract_footnotes_from_para, TEXT_KEY
+
+
+def reference_process_footnotes(text, footnotes):
+    """The two passes per footnote process_footnotes replaced."""
+    for idx, footnote in enumerate(footnotes, 1):
+        text = re.sub(r"\[{}\]".format(idx), "[{}]".format(footnote), text)
+    for idx, footnote in enumerate(footnotes, 1):
+        text = re.sub(r'(?<![0-9])' + str(idx) + r'(?![0-9])', "[{}]".format(footnote), text)
+    return text
+
+
+def test_process_footnotes():
+    footnotes = ['Restated', 'Excluding leased sites']
+    assert process_footnotes('Emissions fell[1] by 8%2', footnotes) == (
+        'Emissions fell[Restated] by 8%[Excluding leased sites]'
+    )
+    assert process_footnotes('In 2021 and 12 sites', footnotes) == 'In 2021 and 12 sites'
+    assert process_footnotes('Scope 1', []) == 'Scope 1'
+
+
+def test_process_footnotes_matches_the_two_pass_version():
+    rnd = random.Random(0)
+    for _ in range(2000):
+        text = ''.join(rnd.choice('ab [ ] 0123 ') for _ in range(rnd.randint(0, 30)))
+        footnotes = [rnd.choice(['note', 'see annex', 'restated']) for _ in range(rnd.randint(0, 4))]
+        assert process_footnotes(text, footnotes) == reference_process_footnotes(text, footnotes)
+
+
+FOOTNOTES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:footnotes xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:footnote w:type="separator" w:id="-1"><w:p><w:r><w:t></w:t></w:r></w:p></w:footnote>'
+    '<w:footnote w:id="1"><w:p><w:r><w:t>Restated for 2021</w:t></w:r></w:p></w:footnote>'
+    '<w:footnote w:id="2"><w:p><w:r><w:t>Excluding leased sites</w:t></w:r></w:p></w:footnote>'
+    '</w:footnotes>'
+)
+FOOTNOTES_REL = (
+    '<Relationship Id="rIdFootnotes" Target="footnotes.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/footnotes"/>'
+)
+FOOTNOTES_TYPE = (
+    '<Override PartName="/word/footnotes.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"/>'
+)
+
+
+def _add_reference(paragraph, footnote_id):
+    run = paragraph.add_run()
+    reference = OxmlElement('w:footnoteReference')
+    reference.set(qn('w:id'), footnote_id)
+    run._r.append(reference)
+
+
+@pytest.fixture
+def report(tmp_path):
+    document = docx.Document()
+    paragraph = document.add_paragraph('Emissions fell 1')
+    _add_reference(paragraph, '1')
+    paragraph = document.add_paragraph('Water use was stable')
+    _add_reference(paragraph, '2')
+    document.add_paragraph('Waste was halved')
+    path = str(tmp_path / 'plain.docx')
+    document.save(path)
+
+    # add the footnotes part python-docx cannot write
+    footnoted = str(tmp_path / 'report.doxc')
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(footnoted, 'w') as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == 'word/_rels/document.xml.rels':
+                data = data.replace(b'</Relationships>', FOOTNOTES_REL.encode() + b'</Relationships>')
+            elif item.filename == '[Content_Types].xml':
+                data = data.replace(b'</Types>', FOOTNOTES_TYPE.encode() + b'</Types>')
+            target.writestr(item, data)
+        target.writestr('word/footnotes.xml', FOOTNOTES_XML)
+    return footnoted
+
+
+def test_read_footnotes(report):
+    with zipfile.ZipFile(report) as archive:
+        footnotes = read_footnotes(archive, document_part_name(archive))
+    assert footnotes['1'] == 'Restated for 2021'
+    assert footnotes['2'] == 'Excluding leased sites'
+
+
+def test_footnotes_of_a_paragraph_and_the_next(report):
+    with zipfile.ZipFile(report) as archive:
+        footnote_dict = read_footnotes(archive, document_part_name(archive))
+    paragraphs = docx.Document(report).paragraphs
+    assert extract_footnotes_from_para(paragraphs[0], paragraphs[1], footnote_dict) == [
+        'Restated for 2021', 'Excluding leased sites'
+    ]
+    assert extract_footnotes_from_para(paragraphs[2], footnote_dict=footnote_dict) == []
+
+
+def test_load_all_resolves_footnotes(report):
+    texts = DOXCLoader.doxc_all_loader(report)[TEXT_KEY]
+    # a paragraph takes its own footnotes and those of the next paragraph
+    assert texts[0] == 'Emissions fell [Restated for 2021]'
+    assert texts[1:] == ['Water use was stable', 'Waste was halved']
@@ -0,0 +1,122 @@
+import pytest
+import numpy as np
+
+from typing import List
+from langchain.embeddings.base import Embeddings
+from src.utils.index_manager import IndexManager, DOC_ID_KEY, ADD_EVENT, DELETE_EVENT, COMPACT_EVENT
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.search import DocumentVectorizer
+
+
+ACME = [
+    "Acme Scope 1 emissions were 1,234 tCO2e in 2022.",
+    "Acme bought renewable electricity for every site.",
+    "Acme water withdrawal was 10m litres.",
+]
+GLOBEX = [
+    "Globex employees completed 12 hours of safety training.",
+    "Globex waste sent to landfill dropped by a third.",
+]
+
+
+class CountingEmbeddings(Embeddings):
+    """Fitted local embeddings that record every text they embed for documents."""
+
+    def __init__(self):
+        self.embeddings = HashingEmbeddings(dimensions=64).fit(ACME + GLOBEX)
+        self.texts = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def _contents(manager, query, k=10):
+    return [document.page_content for document in manager.similarity_search(query, k)]
+
+
+def test_upsert_only_embeds_new_chunks():
+    embedding = CountingEmbeddings()
+    manager = IndexManager(embedding, compact_ratio=1.)
+    assert manager.add_document('acme', ACME, [{'Page': i} for i in range(3)]) == \
+        {'added': 3, 'kept': 0, 'deleted': 0}
+    manager.add_document('globex', GLOBEX + [GLOBEX[0]])  # a repeated chunk is indexed once
+    assert len(manager) == 5 and sorted(manager.document_ids()) == ['acme', 'globex']
+    with pytest.raises(ValueError):
+        manager.add_document('acme', ACME)
+
+    embedding.texts.clear()
+    revised = [ACME[0], "Acme water withdrawal fell to 8m litres.", ACME[1]]
+    assert manager.upsert_document('acme', revised, [{'Page': 9}] * 3) == {'added': 1, 'kept': 2, 'deleted': 1}
+    assert embedding.texts == [revised[1]]
+    assert len(manager) == 5
+    assert ACME[2] not in _contents(manager, "water withdrawal")
+    document = manager.similarity_search(ACME[0], 1)[0]
+    assert document.page_content == ACME[0]
+    assert document.metadata == {'Page': 9, DOC_ID_KEY: 'acme', 'Chunk Hash': document.metadata['Chunk Hash']}
+
+    with pytest.raises(ValueError):
+        manager.upsert_document('acme', ACME, [{}])
+
+
+def test_delete_and_compact():
+    events = []
+    manager = IndexManager(CountingEmbeddings(), compact_ratio=0.5)
+    manager.add_listener(lambda event, doc_id: events.append((event, doc_id)))
+    manager.add_document('acme', ACME)
+    manager.add_document('globex', GLOBEX)
+
+    assert manager.delete_document('globex') == 2
+    assert 'globex' not in manager and len(manager) == 3
+    assert all(content in ACME for content in _contents(manager, "safety training"))
+    with pytest.raises(KeyError):
+        manager.delete_document('globex')
+
+    manager.upsert_document('acme', ACME[:1])  # 4 of 5 rows deleted, past the compact ratio
+    assert manager._index.ntotal == 1 and len(manager) == 1
+    assert events == [
+        (ADD_EVENT, 'acme'), (ADD_EVENT, 'globex'), (DELETE_EVENT, 'globex'), (ADD_EVENT, 'acme'),
+        (COMPACT_EVENT, None),
+    ]
+    assert _contents(manager, "renewable electricity") == ACME[:1]
+
+    manager.upsert_document('acme', [])
+    assert len(manager) == 0 and manager.document_ids() == []
+    assert manager.similarity_search("emissions") == []
+
+
+def test_search_skips_deleted_rows_exactly():
+    embedding = CountingEmbeddings()
+    manager = IndexManager(embedding, compact_ratio=1.)
+    manager.add_document('acme', ACME)
+    manager.add_document('globex', GLOBEX)
+    manager.delete_document('acme')
+
+    query = "Acme emissions and electricity"
+    vectors = np.asarray(embedding.embeddings.embed_documents(GLOBEX))
+    distances = ((vectors - np.asarray(embedding.embed_query(query))) ** 2).sum(axis=1)
+    results = manager.similarity_search_with_score(query, 2)
+    assert [document.page_content for document, _ in results] == [GLOBEX[i] for i in np.argsort(distances)]
+    np.testing.assert_allclose([score for _, score in results], np.sort(distances), rtol=1e-4)
+
+
+def test_vector_store_round_trip(encoding):
+    vectorizer = DocumentVectorizer(ACME + GLOBEX, {'Source': 'acme.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    embedding = CountingEmbeddings()
+    embedding.embeddings = vector_store.embedding_function.__self__
+
+    manager = IndexManager.from_vector_store(vector_store, embedding, 'Source')
+    assert embedding.texts == []  # the store's vectors are reused
+    assert manager.document_ids() == ['acme.pdf'] and len(manager) == len(vectorizer.text)
+    for query in ("water withdrawal", "safety training"):
+        assert _contents(manager, query, 3) == [doc.page_content for doc in vector_store.similarity_search(query, 3)]
+
+    manager.upsert_document('acme.pdf', ACME)
+    store = manager.to_vector_store()
+    assert store.index.ntotal == len(ACME)
+    assert store.similarity_search("water withdrawal", 1)[0].page_content == ACME[2]
+    assert IndexManager(embedding).to_vector_store() is None
@@ -0,0 +1,89 @@
+import faiss
+import pytest
+import numpy as np
+
+from src.utils import index_registry
+from src.utils.ann_index import HNSW_INDEX
+from src.utils.artifacts import save_vector_store, write_artifact
+from src.utils.index_registry import MmapFlatIndex, shared_index, get_vector_store, preload
+from src.utils.search import DocumentVectorizer, ContextRetrieval
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+    "Employees completed 12 hours of safety training on average.",
+    "Waste sent to landfill dropped by a third since 2019.",
+]
+QUERIES = ["scope 2 electricity", "landfill waste", "GRI 305-1"]
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    yield
+    index_registry.clear()
+
+
+@pytest.fixture
+def vectorizer(encoding):
+    return DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+
+
+@pytest.mark.parametrize('block', [7, index_registry.SEARCH_BLOCK])
+def test_mmap_index_matches_faiss(monkeypatch, block):
+    monkeypatch.setattr(index_registry, 'SEARCH_BLOCK', block)
+    rng = np.random.default_rng(0)
+    vectors, queries = rng.random((50, 8), dtype=np.float32), rng.random((4, 8), dtype=np.float32)
+    flat = faiss.IndexFlatL2(8)
+    flat.add(vectors)
+
+    index = MmapFlatIndex(vectors)
+    distances, rows = index.search(queries, 5)
+    expected_distances, expected_rows = flat.search(queries, 5)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-5)
+
+    distances, rows = MmapFlatIndex(vectors[:3]).search(queries, 5)
+    assert (rows[:, 3:] == -1).all() and np.isinf(distances[:, 3:]).all()
+    with pytest.raises(TypeError):
+        index.add(vectors)
+
+
+def test_sessions_share_one_index(tmp_path, vectorizer):
+    vector_store = vectorizer.vectorize(backend='hashing')
+    dir_path = str(tmp_path / 'report')
+    save_vector_store(vector_store, dir_path)
+
+    first, second = get_vector_store(dir_path), get_vector_store(str(tmp_path / '.' / 'report'))
+    assert first is not second and first.index is second.index
+    assert isinstance(first.index, MmapFlatIndex)
+    for query in QUERIES:
+        assert first.similarity_search(query, 2) == vector_store.similarity_search(query, 2)
+
+    shared = shared_index(dir_path)
+    assert shared.lexical_index is shared.lexical_index
+    retrieval = ContextRetrieval(first, lexical_index=shared.lexical_index)
+    assert retrieval.search_vector_store("GRI 305-1", 1)[0].page_content == REPORT[0]
+    assert first.docstore.search('99') == "ID 99 not found."
+    assert preload([dir_path]) == {dir_path: len(REPORT)}
+
+
+def test_rewritten_artifacts_are_reloaded(tmp_path, vectorizer):
+    dir_path = str(tmp_path / 'report')
+    save_vector_store(vectorizer.vectorize(backend='hashing'), dir_path)
+    old = shared_index(dir_path)
+
+    save_vector_store(vectorizer.vectorize(backend='hashing', index_type=HNSW_INDEX), dir_path)
+    new = shared_index(dir_path)
+    assert new is not old and new.version != old.version
+    assert isinstance(new.index, faiss.IndexHNSWFlat)
+    assert len(old.artifact) == len(new.artifact) == len(REPORT)  # the old version stays usable
+    assert shared_index(dir_path) is new
+
+
+def test_artifacts_without_vectors(tmp_path):
+    dir_path = str(tmp_path / 'report')
+    write_artifact(dir_path, chunks=REPORT)
+    with pytest.raises(ValueError):
+        shared_index(dir_path)
@@ -0,0 +1,46 @@
+import docx
+import pytest
+
+from src.utils.ingest import (
+    ingest_directory, list_reports, _page_ranges, FILE_KEY, ERROR_KEY,
+)
+from src.utils.loader import TEXT_KEY
+
+
+def test_page_ranges():
+    assert _page_ranges(5, 2) == [(1, 2), (3, 4), (5, 5)]
+    assert _page_ranges(4, 4) == [(1, 4)]
+    assert _page_ranges(0, 4) == []
+
+
+@pytest.fixture
+def reports(tmp_path, write_pdf):
+    write_pdf(str(tmp_path / 'b_long.pdf'), [f"Page {i} of the long report" for i in range(1, 8)])
+    write_pdf(str(tmp_path / 'a_short.pdf'), ['Scope 1 emissions fell', 'Water use was stable'])
+    (tmp_path / 'c_broken.pdf').write_bytes(b'not a pdf')
+    document = docx.Document()
+    document.add_paragraph('Our climate targets')
+    document.save(str(tmp_path / 'd_targets.doxc'))
+    (tmp_path / 'notes.txt').write_text('not a report')
+    return tmp_path
+
+
+def test_list_reports(reports):
+    assert list_reports(str(reports)) == ['a_short.pdf', 'b_long.pdf', 'c_broken.pdf', 'd_targets.doxc']
+
+
+def test_ingest_directory(reports):
+    results = ingest_directory(str(reports), max_workers=2, pages_per_task=2)
+    assert [result[FILE_KEY] for result in results] == list_reports(str(reports))
+
+    short, long, broken, targets = results
+    assert short[ERROR_KEY] is None
+    assert short[TEXT_KEY] == ['Scope 1 emissions fell', 'Water use was stable']
+    assert long[TEXT_KEY] == [f"Page {i} of the long report" for i in range(1, 8)]  # in page order
+    assert broken[ERROR_KEY] is not None and TEXT_KEY not in broken
+    assert targets[ERROR_KEY] is None and targets[TEXT_KEY] == ['Our climate targets']
+
+
+def test_ingest_directory_unknown_text_key(reports):
+    with pytest.raises(KeyError):
+        ingest_directory(str(reports), text_key='unknown')
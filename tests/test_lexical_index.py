@@ -0,0 +1,51 @@
+from src.utils.lexical_index import BM25Index, is_lexical_query, reciprocal_rank_fusion, terms
+
+
+TEXTS = [
+    "Scope 1 emissions were 1,234.5 tCO2e, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+    "Scope 3 emissions cover purchased goods and business travel.",
+]
+
+
+def test_terms_keep_codes_and_bigrams():
+    assert terms("GRI 305-1 and 1,234.5 tCO2e") == [
+        'gri', '305-1', 'and', '1,234.5', 'tco2e',
+        'gri 305-1', '305-1 and', 'and 1,234.5', '1,234.5 tco2e',
+    ]
+    assert terms("Scope 2", bigrams=False) == ['scope', '2']
+
+
+def test_search_ranks_rows_by_bm25():
+    index = BM25Index.from_texts(TEXTS)
+    assert len(index) == len(TEXTS)
+
+    rows = [row for row, _ in index.search("305-1", k=4)]
+    assert rows == [0]  # only rows sharing a term are returned
+    # the bigram 'scope 2' ranks its row above the other scope rows
+    assert index.search("scope 2 emissions", k=2)[0][0] == 1
+    scores = [score for _, score in index.search("scope emissions", k=4)]
+    assert scores == sorted(scores, reverse=True) and len(scores) == 3
+
+
+def test_add_numbers_rows_in_order():
+    index = BM25Index()
+    assert index.add(TEXTS[:2]) == [0, 1]
+    assert index.add(TEXTS[2:]) == [2, 3]
+    assert index.search("water", k=1)[0][0] == 2
+    assert index.scores("unknown term").tolist() == [0.0] * 4
+
+
+def test_is_lexical_query():
+    assert is_lexical_query("CO2e")
+    assert is_lexical_query("GRI 305-1")
+    assert is_lexical_query('"market-based"')
+    assert not is_lexical_query("How much water did the company use?")
+    assert not is_lexical_query("")
+
+
+def test_reciprocal_rank_fusion():
+    # 2 is second in both rankings, so it beats ids first in only one of them
+    assert reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]]) == [2, 1, 4, 3, 5]
+    assert reciprocal_rank_fusion([[7, 8]], k=0) == [7, 8]
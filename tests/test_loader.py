@@ -0,0 +1,57 @@
+import docx
+import pytest
+
+from src.utils.loader import DOXCLoader, PDFLoader, DOXC_KEY, PYPDF2_KEY
+
+
+PAGES = [
+    ['Sustainability report 2022', 'Our approach to climate'],
+    ['Scope 1 emissions fell by 8%.'],
+    ['Water use was stable.', '', 'Waste was halved.'],
+]
+
+
+@pytest.fixture
+def report(tmp_path):
+    document = docx.Document()
+    for i, paragraphs in enumerate(PAGES):
+        if i:
+            document.add_page_break()
+        for text in paragraphs:
+            document.add_paragraph(text)
+    document.save(str(tmp_path / 'report.doxc'))
+    return DOXCLoader('report.doxc', dir_path=str(tmp_path))
+
+
+def test_doxc_iter_text_follows_page_breaks(report):
+    expected = [(i + 1, '\n'.join(text for text in page if text)) for i, page in enumerate(PAGES)]
+    assert list(report.iter_text(DOXC_KEY)) == expected
+    assert list(report.iter_text(DOXC_KEY, (2, 3))) == expected[1:]
+    assert '\n'.join(text for _, text in report.iter_text(DOXC_KEY)) == '\n'.join(report.load_text(DOXC_KEY))
+
+
+def test_iter_text_without_page_tracking_has_no_page_numbers(report, monkeypatch):
+    monkeypatch.setattr(DOXCLoader, 'TEXT_ITERATORS', {})  # fall back to the paragraph loader
+    assert list(report.iter_text(DOXC_KEY)) == [(None, text) for page in PAGES for text in page if text]
+
+
+PDF_PAGES = ['Scope 1 emissions (tCO2e) fell by 8%', 'Water use was stable', 'Waste was halved']
+
+
+@pytest.fixture
+def pdf_report(tmp_path, write_pdf):
+    write_pdf(str(tmp_path / 'report.pdf'), PDF_PAGES)
+    return PDFLoader('report.pdf', dir_path=str(tmp_path))
+
+
+def test_pdf_iter_text_streams_pages(pdf_report):
+    pages = pdf_report.iter_text(PYPDF2_KEY)
+    assert next(pages) == (1, PDF_PAGES[0])  # the first page comes before the rest is read
+    assert list(pages) == [(2, PDF_PAGES[1]), (3, PDF_PAGES[2])]
+    assert [text for _, text in pdf_report.iter_text(PYPDF2_KEY)] == pdf_report.load_text(PYPDF2_KEY)
+    assert PDFLoader.count_pages(pdf_report.path) == 3
+
+
+def test_pdf_iter_text_unknown_backend(pdf_report):
+    with pytest.raises(KeyError):
+        pdf_report.iter_text('unknown')
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.search import DocumentVectorizer, ContextRetrieval, embedding_backend
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+    "Employees completed 12 hours of safety training on average.",
+]
+
+
+def test_vectors_are_deterministic_and_normalized():
+    embeddings = HashingEmbeddings(dimensions=64)
+    vectors = embeddings.embed_array(REPORT, batch_size=3)
+    assert vectors.shape == (len(REPORT), 64) and vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1., rtol=1e-5)
+    np.testing.assert_array_equal(vectors, HashingEmbeddings(dimensions=64).embed_array(REPORT))
+    assert embeddings.embed_query(REPORT[1]) == embeddings.embed_documents(REPORT)[1]
+    assert embeddings.embed_array([]).shape == (0, 64)
+    assert not np.allclose(vectors, HashingEmbeddings(dimensions=64, seed=1).embed_array(REPORT))
+
+
+def test_similar_texts_are_close():
+    embeddings = HashingEmbeddings().fit(REPORT)
+    vectors = embeddings.embed_array(REPORT)
+    query = np.asarray(embeddings.embed_query("water withdrawal at the production sites"))
+    assert int(np.argmax(vectors @ query)) == 2
+    assert np.dot(embeddings.embed_query("Water  WITHDRAWAL"), embeddings.embed_query("water withdrawal")) \
+        == pytest.approx(1.)
+
+
+def test_fit_weights_rare_terms():
+    embeddings = HashingEmbeddings()
+    assert not embeddings.is_fitted
+    embeddings.fit(REPORT)
+    assert embeddings.is_fitted
+    common, rare = embeddings._buckets("emissions water")
+    assert embeddings.idf[rare] > embeddings.idf[common]
+
+
+def test_config_round_trip():
+    embeddings = HashingEmbeddings(dimensions=32, ngram_range=(1, 2), seed=3).fit(REPORT)
+    copy = HashingEmbeddings.from_config(embeddings.config(), embeddings.idf)
+    assert copy.is_fitted
+    np.testing.assert_array_equal(copy.embed_array(REPORT), embeddings.embed_array(REPORT))
+
+
+def test_backends():
+    assert isinstance(embedding_backend('hashing'), HashingEmbeddings)
+    with pytest.raises(KeyError):
+        embedding_backend('unknown')
+
+
+def test_index_and_query_offline(encoding):
+    vectorizer = DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    embeddings = vector_store.embedding_function.__self__
+    assert isinstance(embeddings, HashingEmbeddings) and embeddings.is_fitted
+
+    retrieval = ContextRetrieval(vector_store, embeddings=embeddings)
+    assert retrieval.search_vector_store("safety training hours", 1)[0].page_content == REPORT[3]
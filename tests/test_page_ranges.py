@@ -0,0 +1,79 @@
+import docx
+import pytest
+
+from xml.etree.ElementTree import fromstring
+
+from src.utils.doxc_parser import W_NAMESPACE, page_breaks
+from src.utils.loader import (
+    DOXCLoader, PDFLoader, _page_bounds, DOXC_KEY, DOXC2PYTHON_KEY, PYPDF2_KEY, TABLE_KEY, TEXT_KEY,
+)
+
+
+def _paragraph(runs: str):
+    return fromstring(f'<w:p xmlns:w="{W_NAMESPACE}">{runs}</w:p>')
+
+
+def test_page_bounds():
+    assert _page_bounds(None) == (1, None)
+    assert _page_bounds(None, 7) == (1, 7)
+    assert _page_bounds((2, 9), 7) == (2, 7)
+    assert _page_bounds((3, None), 7) == (3, 7)
+    for pages in [(0, 2), (3, 2)]:
+        with pytest.raises(ValueError):
+            _page_bounds(pages)
+
+
+def test_page_breaks_count_explicit_and_rendered_breaks_once():
+    explicit = '<w:r><w:br w:type="page"/></w:r>'
+    rendered = '<w:r><w:lastRenderedPageBreak/></w:r>'
+    text = '<w:r><w:t>Scope 1</w:t></w:r>'
+
+    assert page_breaks(_paragraph(text + explicit)) == (0, 1, True)
+    assert page_breaks(_paragraph(explicit + rendered + text)) == (1, 1, False)
+    # Word writes a rendered break after an explicit one at the end of the previous paragraph
+    assert page_breaks(_paragraph(rendered + text), explicit_pending=True) == (0, 0, False)
+    assert page_breaks(_paragraph(text + rendered + text)) == (0, 1, False)
+    assert page_breaks(_paragraph('<w:pPr><w:pageBreakBefore/></w:pPr>' + text)) == (1, 1, False)
+
+
+@pytest.fixture
+def pdf_report(tmp_path, write_pdf):
+    write_pdf(str(tmp_path / 'report.pdf'), [f"Page {i}" for i in range(1, 6)])
+    return PDFLoader('report.pdf', dir_path=str(tmp_path))
+
+
+def test_pdf_page_ranges(pdf_report):
+    assert pdf_report.load_text(PYPDF2_KEY, (2, 3)) == ['Page 2', 'Page 3']
+    assert pdf_report.load_text(PYPDF2_KEY, (4, 10)) == ['Page 4', 'Page 5']
+    assert list(pdf_report.iter_text(PYPDF2_KEY, (5, 5))) == [(5, 'Page 5')]
+    with pytest.raises(ValueError):
+        pdf_report.load_text(PYPDF2_KEY, (3, 2))
+
+
+@pytest.fixture
+def doxc_report(tmp_path):
+    document = docx.Document()
+    for page in range(1, 4):
+        if page > 1:
+            document.add_page_break()
+        document.add_paragraph(f"Text of page {page}")
+        table = document.add_table(rows=2, cols=2)
+        for row, cells in zip(table.rows, [['Year', 'Value'], [str(2020 + page), str(page)]]):
+            for cell, text in zip(row.cells, cells):
+                cell.text = text
+    document.save(str(tmp_path / 'report.doxc'))
+    return DOXCLoader('report.doxc', dir_path=str(tmp_path))
+
+
+def test_doxc_page_ranges(doxc_report):
+    assert doxc_report.load_text(DOXC_KEY, (2, 3)) == ['Text of page 2', 'Text of page 3']
+    assert [table.rows() for table in doxc_report.load_tables(DOXC_KEY, (3, 3))] == [[['2023', '3']]]
+
+    content = doxc_report.doxc_load_all((2, 2))
+    assert content[TEXT_KEY] == ['Text of page 2']
+    assert [table.title for table in content[TABLE_KEY]] == ['Text of page 2']
+
+
+def test_loaders_without_page_support_reject_ranges(doxc_report):
+    with pytest.raises(ValueError):
+        doxc_report.load_text(DOXC2PYTHON_KEY, (1, 1))
@@ -0,0 +1,59 @@
+from src.utils import search
+from src.utils.artifacts import Artifact, save_vector_store
+from src.utils.search import (
+    DocumentVectorizer, ContextRetrieval, find_placeholders, PLACEHOLDERS_KEY, TABLE_PLACEHOLDER, FIGURE_PLACEHOLDER,
+)
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "<<T1>>: Table summary of water withdrawal by site. <<F2>>: Figure of water use by year.",
+    "<<T2>>: Table summary of energy use by site.",
+]
+TABLES = ["| site | water |", "| site | energy |"]
+FIGURES = ["bars per year", "water use 2019-2022"]
+
+
+def test_find_placeholders():
+    assert find_placeholders(REPORT[0]) == []
+    assert find_placeholders(REPORT[1]) == [[TABLE_PLACEHOLDER, 1, 0, 7], [FIGURE_PLACEHOLDER, 2, 51, 58]]
+    # only the first placeholder of every kind, as the context always resolved them
+    assert find_placeholders("<<T3>>: a <<T4>>: b") == [[TABLE_PLACEHOLDER, 3, 0, 7]]
+    assert REPORT[1][51:58] == "<<F2>>:"
+
+
+def test_placeholders_are_kept_in_metadata(tmp_path, encoding):
+    vectorizer = DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    documents = [vector_store.docstore.search(vector_store.index_to_docstore_id[row]) for row in range(3)]
+    assert [document.metadata[PLACEHOLDERS_KEY] for document in documents] == \
+        [find_placeholders(text) for text in REPORT]
+
+    save_vector_store(vector_store, str(tmp_path / 'report'))
+    assert [metadata[PLACEHOLDERS_KEY] for metadata in Artifact(str(tmp_path / 'report')).metadata] == \
+        [find_placeholders(text) for text in REPORT]
+
+
+def test_context_uses_stored_placeholders(monkeypatch, encoding):
+    vectorizer = DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    retrieval = ContextRetrieval(vector_store, tables=TABLES, figures=FIGURES)
+    expected = retrieval.process_content(REPORT[1])
+    assert expected == "RAW TABLE: | site | water |RAW FIGURE: water use 2019-2022"
+
+    def _fail(text):
+        raise AssertionError("placeholders were searched at query time")
+
+    monkeypatch.setattr(search, 'find_placeholders', _fail)
+    context = retrieval.get_context("water withdrawal by site", n=3)
+    assert f"| {expected} |" in context
+    assert PLACEHOLDERS_KEY not in context  # hidden from the model
+    assert "Metadata: {'Chunk Number': 2, 'Source': 'report.pdf'}" in context
+
+
+def test_unknown_placeholders_are_left_alone():
+    retrieval = ContextRetrieval(None, tables=TABLES[:1])
+    assert retrieval.process_content(REPORT[2]) == REPORT[2]
+    # a summary is only replaced up to the next placeholder, which stays if it cannot be resolved
+    assert retrieval.process_content(REPORT[1]) == "RAW TABLE: | site | water |<<F2>>: Figure of water use by year."
+    assert ContextRetrieval(None).process_content(REPORT[1]) == REPORT[1]
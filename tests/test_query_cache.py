@@ -0,0 +1,129 @@
+from typing import List
+from langchain.embeddings.base import Embeddings
+from src.utils import query_cache
+from src.utils.index_manager import IndexManager
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.query_cache import QueryCache, store_version
+from src.utils.search import DocumentVectorizer, ContextRetrieval
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+    "Employees completed 12 hours of safety training on average.",
+]
+
+
+class Clock(object):
+    """A stand-in for the time module whose clock only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class CountingEmbeddings(Embeddings):
+    """Fitted local embeddings that count the queries they embed."""
+
+    def __init__(self):
+        self.embeddings = HashingEmbeddings(dimensions=64).fit(REPORT)
+        self.queries = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return self.embeddings.embed_query(text)
+
+
+def test_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache, 'time', clock)
+    cache = QueryCache(ttl=10.)
+    cache.put_vector("Scope 1", [1., 0.])
+    cache.put_results("Scope 1", (2, 4), ['doc'])
+    assert cache.vector("  scope   1 ") == [1., 0.]
+    assert cache.results("SCOPE 1", (2, 4)) == ['doc'] and cache.results("Scope 1", (3, 4)) is None
+
+    clock.now = 10.5
+    assert cache.vector("Scope 1") is None and cache.results("Scope 1", (2, 4)) is None
+    assert len(cache) == 0
+    assert cache.stats() == {'hits': 1, 'near_hits': 0, 'misses': 0}
+
+
+def test_least_recently_used_are_dropped():
+    cache = QueryCache(max_entries=2, similarity_threshold=0.9)
+    cache.put_vector("a", [1., 0.])
+    cache.put_vector("b", [0., 1.])
+    cache.vector("a")
+    cache.put_vector("c", [1., 1.])
+    assert (cache.vector("a"), cache.vector("b"), cache.vector("c")) == ([1., 0.], None, [1., 1.])
+    cache.put_vector("d", [0., 1.])  # takes the matrix row freed by 'b'
+    assert len(cache) == 2
+
+
+def test_similar_queries_share_results():
+    cache = QueryCache(similarity_threshold=0.95)
+    cache.put_vector("water use", [1., 0., 0.])
+    cache.put_results("water use", 3, ['water'])
+    cache.put_vector("energy use", [0., 1., 0.])
+    cache.put_results("energy use", 3, ['energy'])
+
+    assert cache.similar_results([0.99, 0.05, 0.], 3) == ['water']
+    assert cache.similar_results([0.99, 0.05, 0.], 5) is None  # other search parameters
+    assert cache.similar_results([0.7, 0.7, 0.], 3) is None
+    assert cache.similar_results([1., 0.], 3) is None  # another embedding size
+    assert cache.stats() == {'hits': 0, 'near_hits': 1, 'misses': 3}
+    assert QueryCache().similar_results([1., 0., 0.], 3) is None
+
+
+def test_invalidate_and_versions():
+    cache = QueryCache()
+    cache.put_results("a", 1, ['doc'])
+    cache.invalidate('add', 'report.pdf')
+    assert cache.results("a", 1) is None
+
+    cache.put_results("a", 1, ['doc'])
+    cache.check_version(1)
+    cache.check_version(None)
+    cache.check_version(1)
+    assert cache.results("a", 1) == ['doc']
+    cache.check_version(2)
+    assert cache.results("a", 1) is None
+
+
+def test_retrieval_reuses_cached_queries(encoding):
+    embeddings = CountingEmbeddings()
+    vectorizer = DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(embeddings=embeddings)
+    cache = QueryCache()
+    retrieval = ContextRetrieval(vector_store, query_cache=cache)
+
+    embeddings.queries.clear()
+    first = retrieval.search_vector_store("water withdrawal", 2)
+    assert retrieval.search_vector_store("Water  withdrawal", 2) == first
+    assert embeddings.queries == ["water withdrawal"] and cache.stats()['hits'] == 1
+
+    assert len(retrieval.search_vector_store("water withdrawal", 5)) == len(REPORT)
+    version = store_version(vector_store)
+    vector_store.add_texts(["Water withdrawal rose to 12m litres in 2023."])
+    assert store_version(vector_store) != version
+    assert len(retrieval.search_vector_store("water withdrawal", 5)) == len(REPORT) + 1
+
+
+def test_index_manager_changes_invalidate(encoding):
+    embeddings = CountingEmbeddings()
+    manager = IndexManager(embeddings)
+    manager.add_document('report.pdf', REPORT)
+    cache = QueryCache()
+    retrieval = ContextRetrieval(manager, query_cache=cache)
+
+    assert retrieval.search_vector_store("water withdrawal", 1)[0].page_content == REPORT[2]
+    manager.upsert_document('report.pdf', REPORT[:2] + REPORT[3:])
+    assert len(cache) == 0
+    assert retrieval.search_vector_store("water withdrawal", 1)[0].page_content != REPORT[2]
+    assert embeddings.queries == ["water withdrawal"] * 2  # invalidation also drops the query vectors
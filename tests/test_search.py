@@ -0,0 +1,170 @@
+import pytest
+
+from src.utils.index_manager import IndexManager
+from src.utils.query_cache import QueryCache
+from src.utils.search import DocumentVectorizer, ContextRetrieval, PLACEHOLDERS_KEY, TABLE_PLACEHOLDER
+
+
+PAGES = [
+    (1, "Scope 1 emissions fell by 12% in 2022 compared to the 2019 baseline. " * 12),
+    (2, "<<T1>>: Table summary of scope 2 emissions by site and year.\n"
+        + "Energy consumption was 3.5 GWh, of which 45% renewable. " * 12),
+    (3, "Water withdrawal was 10m litres across all production sites. " * 12),
+]
+
+
+def test_vectorize_pages_streams_table_placeholders(encoding):
+    vectorizer = DocumentVectorizer(size=40, overlap=4, encoding=encoding)
+    vector_store = vectorizer.vectorize_pages(PAGES, {'Source': 'report.pdf'}, backend='hashing', batch_size=4)
+
+    documents = [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[row])
+        for row in range(vector_store.index.ntotal)
+    ]
+    assert len(documents) > 4  # more than one batch
+    assert [document.metadata[DocumentVectorizer.CHUNK_KEY] for document in documents] == \
+        list(range(1, len(documents) + 1))
+    assert all(document.metadata['Source'] == 'report.pdf' for document in documents)
+    assert documents[0].metadata[DocumentVectorizer.PAGE_START_KEY] == 1
+    assert documents[-1].metadata[DocumentVectorizer.PAGE_END_KEY] == 3
+
+    table_rows = [
+        row for row, document in enumerate(documents)
+        if any(kind == TABLE_PLACEHOLDER for kind, *_ in document.metadata[PLACEHOLDERS_KEY])
+    ]
+    assert table_rows and vectorizer.table_index.rows == table_rows
+    assert all(documents[row].metadata[DocumentVectorizer.PAGE_START_KEY] == 2 for row in table_rows)
+    assert len(vectorizer.lexical_index) == len(documents)
+
+
+def test_process_content_keeps_every_placeholder():
+    chunk = "Intro. <<T1>>: Table summary. <<F1>>: Figure summary."
+    tables, figures = ["| site | tCO2e |"], ["emissions by year"]
+
+    retrieval = ContextRetrieval(None, tables=tables, figures=figures)
+    assert retrieval.process_content(chunk) == \
+        "Intro. RAW TABLE: | site | tCO2e |RAW FIGURE: emissions by year"
+
+    retrieval = ContextRetrieval(None, tables=tables, figures=figures, is_summary=True)
+    assert retrieval.process_content(chunk) == (
+        "Intro. RAW TABLE: | site | tCO2e | \n TABLE SUMMARY: Table summary. "
+        "RAW FIGURE: emissions by year \n FIGURE SUMMARY: Figure summary."
+    )
+
+
+REPORT = [
+    "Scope 1 emissions were 1,234 tCO2e in 2022, reported under GRI 305-1.",
+    "Scope 2 emissions fell as the sites bought renewable electricity.",
+    "Water withdrawal was 10m litres across all production sites.",
+    "Employees completed 12 hours of safety training on average.",
+    "Waste sent to landfill dropped by a third since 2019.",
+]
+
+
+def _report_store(encoding):
+    vectorizer = DocumentVectorizer(REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    return vectorizer, vectorizer.vectorize(backend='hashing')
+
+
+def test_hybrid_search_over_faiss_store(encoding):
+    vectorizer, vector_store = _report_store(encoding)
+    assert len(vectorizer.text) == len(REPORT)
+
+    retrieval = ContextRetrieval(vector_store, lexical_index=vectorizer.lexical_index)
+    # code-like queries are answered by BM25 alone
+    assert retrieval.search_vector_store("GRI 305-1", 1)[0].page_content == REPORT[0]
+    docs = retrieval.search_vector_store("water withdrawal of the production sites", 2)
+    assert docs[0].page_content == REPORT[2] and len(docs) == 2
+
+    lexical = ContextRetrieval(vector_store, lexical_index=vectorizer.lexical_index, search_mode='lexical')
+    assert [doc.page_content for doc in lexical.search_vector_store("landfill", 3)] == [REPORT[4]]
+
+
+def test_hybrid_search_needs_faiss_store(encoding):
+    vectorizer, vector_store = _report_store(encoding)
+    manager = IndexManager.from_vector_store(vector_store, vector_store.embedding_function.__self__, 'Source')
+
+    with pytest.raises(ValueError):
+        ContextRetrieval(manager, lexical_index=vectorizer.lexical_index)
+    # vector search works on any store answering similarity_search
+    docs = ContextRetrieval(manager).search_vector_store("water withdrawal of the production sites", 1)
+    assert docs[0].page_content == REPORT[2]
+
+
+TABLE_REPORT = [
+    f"Site {i} reported {i * 3} tonnes of waste and {i * 5} MWh of energy use in 2022." for i in range(12)
+] + [
+    "<<T1>>: Table summary of water withdrawal by site and year.",
+    "<<T2>>: Table summary of energy use and waste by site.",
+]
+TABLES = ["| site | water |", "| site | energy | waste |"]
+QUERIES = ["energy use of the sites", "water withdrawal by site", "waste in 2022", "Site 7"]
+
+
+def _baseline_search(vector_store, query, n, max_n):
+    """The table handling of ContextRetrieval before the table index: over-fetch max_n documents."""
+    docs = vector_store.similarity_search(query, max_n)
+    table_position = next((i for i, doc in enumerate(docs) if '<<T' in doc.page_content), -1)
+    if table_position < n:
+        return docs[:n]
+    return docs[:n - 1] + [docs[table_position]]
+
+
+@pytest.mark.parametrize('n, max_n', [(2, 30), (3, 5), (4, 14), (1, 3)])
+def test_table_injection_matches_over_fetching(encoding, n, max_n):
+    vectorizer = DocumentVectorizer(TABLE_REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    assert vectorizer.table_index.rows == [12, 13]
+
+    for table_index in (vectorizer.table_index, None):  # given, or built from the store
+        retrieval = ContextRetrieval(vector_store, tables=TABLES, table_index=table_index)
+        for query in QUERIES:
+            expected = _baseline_search(vector_store, query, n, max_n)
+            assert retrieval.search_vector_store(query, n, max_n) == expected
+
+
+@pytest.mark.parametrize('search_mode', ['lexical', 'hybrid'])
+def test_table_injection_in_lexical_modes(encoding, search_mode):
+    vectorizer = DocumentVectorizer(TABLE_REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    plain = ContextRetrieval(vector_store, lexical_index=vectorizer.lexical_index, search_mode=search_mode)
+    retrieval = ContextRetrieval(
+        vector_store, tables=TABLES, lexical_index=vectorizer.lexical_index, search_mode=search_mode
+    )
+    n, max_n = 2, 10
+    for query in QUERIES:
+        ranked = plain.search_vector_store(query, max_n)
+        table_position = next((i for i, doc in enumerate(ranked) if '<<T' in doc.page_content), -1)
+        expected = ranked[:n] if table_position < n else ranked[:n - 1] + [ranked[table_position]]
+        assert retrieval.search_vector_store(query, n, max_n) == expected
+
+
+def test_table_injection_over_index_manager(encoding):
+    vectorizer = DocumentVectorizer(TABLE_REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    manager = IndexManager.from_vector_store(vector_store, vector_store.embedding_function.__self__, 'Source')
+
+    retrieval = ContextRetrieval(manager, tables=TABLES)
+    for query in QUERIES:
+        assert retrieval.search_vector_store(query, 2, 14) == _baseline_search(manager, query, 2, 14)
+
+
+@pytest.mark.parametrize('tables', [None, TABLES])
+@pytest.mark.parametrize('search_mode', ['vector', 'hybrid'])
+def test_batch_search_matches_per_query_search(encoding, tables, search_mode):
+    vectorizer = DocumentVectorizer(TABLE_REPORT, {'Source': 'report.pdf'}, size=100, overlap=0, encoding=encoding)
+    vector_store = vectorizer.vectorize(backend='hashing')
+    retrieval = ContextRetrieval(
+        vector_store, tables=tables, lexical_index=vectorizer.lexical_index, search_mode=search_mode
+    )
+    queries = QUERIES + [QUERIES[0]]  # a repeated query
+    for n, max_n in [(2, 30), (3, 5)]:
+        expected = [retrieval.search_vector_store(query, n, max_n) for query in queries]
+        assert retrieval.search_vector_store_batch(queries, n, max_n) == expected
+
+        cached = ContextRetrieval(
+            vector_store, tables=tables, lexical_index=vectorizer.lexical_index,
+            search_mode=search_mode, query_cache=QueryCache(),
+        )
+        assert cached.search_vector_store_batch(queries, n, max_n) == expected
+        assert cached.search_vector_store_batch(queries, n, max_n) == expected  # from the cache
@@ -0,0 +1,100 @@
+import pytest
+
+from langchain.vectorstores import FAISS
+from src.utils.artifacts import save_vector_store
+from src.utils.index_manager import IndexManager
+from src.utils.index_registry import clear
+from src.utils.local_embeddings import HashingEmbeddings
+from src.utils.search import DocumentVectorizer, ContextRetrieval
+from src.utils.sharded_retrieval import ShardedRetriever, SHARD_KEY
+
+
+REPORTS = {
+    'acme': [
+        "Acme Scope 1 emissions were 1,234 tCO2e in 2022.",
+        "<<T1>>: Table summary of Acme water withdrawal by site.",
+        "Acme employees completed 12 hours of safety training.",
+    ],
+    'globex': [
+        "Globex Scope 1 emissions were 560 tCO2e in 2022.",
+        "<<T1>>: Table summary of Globex energy use by site.",
+        "Globex waste sent to landfill dropped by a third.",
+    ],
+}
+TABLES = {'acme': ["| site | water |"], 'globex': ["| site | energy |"]}
+QUERIES = ["Scope 1 emissions in 2022", "water withdrawal by site", "safety training", "energy use"]
+
+
+@pytest.fixture
+def embeddings():
+    return HashingEmbeddings(dimensions=64).fit([text for texts in REPORTS.values() for text in texts])
+
+
+def _store(texts, source, embeddings):
+    return FAISS.from_texts(texts, embeddings, metadatas=[{'Source': source} for _ in texts])
+
+
+def test_merge_matches_one_store(embeddings):
+    shards = {name: _store(texts, f'{name}.pdf', embeddings) for name, texts in REPORTS.items()}
+    combined = _store(REPORTS['acme'] + REPORTS['globex'], 'all.pdf', embeddings)
+
+    with ShardedRetriever(shards) as retriever:
+        assert not retriever.embeds_per_shard and retriever.shard_names == ['acme', 'globex']
+        for query in QUERIES:
+            for k in (1, 4, 10):
+                results = retriever.similarity_search_with_score(query, k)
+                expected = combined.similarity_search_with_score(query, k)
+                assert [doc.page_content for doc, _ in results] == [doc.page_content for doc, _ in expected]
+                assert [score for _, score in results] == pytest.approx([score for _, score in expected], abs=1e-5)
+                assert all(
+                    doc.page_content in REPORTS[doc.metadata[SHARD_KEY]]
+                    and doc.metadata['Source'] == f"{doc.metadata[SHARD_KEY]}.pdf"
+                    for doc, _ in results
+                )
+
+        only = retriever.subset(['globex'])
+        assert [doc.metadata[SHARD_KEY] for doc in only.similarity_search(QUERIES[0], 3)] == ['globex'] * 3
+        with pytest.raises(KeyError):
+            retriever.subset(['initech'])
+        with pytest.raises(KeyError):
+            retriever.search(QUERIES[0], shards=['initech'])
+
+
+def test_ties_keep_shard_order(embeddings):
+    texts = REPORTS['acme']
+    shards = {}
+    for name in ('b', 'a', 'c'):
+        shards[name] = IndexManager(embeddings)
+        shards[name].add_document(name, texts)
+
+    with ShardedRetriever(shards) as retriever:
+        results = retriever.search(texts[0], k=4)
+    assert [name for name, _, _ in results] == ['b', 'a', 'c', 'b']
+    assert [document.page_content for _, document, _ in results[:3]] == [texts[0]] * 3
+
+
+def test_retriever_needs_shards():
+    with pytest.raises(ValueError):
+        ShardedRetriever({})
+
+
+def test_artifacts_keep_their_own_embeddings(tmp_path, encoding):
+    dir_paths = []
+    for name, texts in REPORTS.items():
+        dir_paths.append(str(tmp_path / name))
+        vectorizer = DocumentVectorizer(texts, {'Source': f'{name}.pdf'}, size=100, overlap=0, encoding=encoding)
+        save_vector_store(vectorizer.vectorize(backend='hashing'), dir_paths[-1])
+
+    try:
+        with ShardedRetriever.from_artifacts(dir_paths) as retriever:
+            assert retriever.shard_names == ['acme', 'globex'] and retriever.embeds_per_shard
+            retrieval = ContextRetrieval(retriever, tables=TABLES)
+            docs = retrieval.search_vector_store("water withdrawal by site", 1)
+            assert (docs[0].metadata[SHARD_KEY], docs[0].page_content) == ('acme', REPORTS['acme'][1])
+
+            context = retrieval.get_context("table summary of energy use", n=2)
+            assert "RAW TABLE: | site | energy |" in context
+            with pytest.raises(ValueError):
+                ContextRetrieval(retriever, tables=TABLES['acme'])
+    finally:
+        clear()
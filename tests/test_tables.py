@@ -0,0 +1,86 @@
+import math
+
+import docx
+import pytest
+
+from src.utils.loader import DOXCLoader
+from src.utils.tables import ColumnarTable, HEADERS_KEY, TABLE_ROWS_KEY, TITLE_KEY
+
+
+HEADERS = ['Scope', 'Unit', '2021', '2022', 'Share']
+ROWS = [
+    ['Scope 1', 'tCO2e', '1200', '1100', '0.25'],
+    ['Scope 2', 'tCO2e', '800', '', '0.5'],
+    ['', '', '', '', ''],
+    ['Scope 3', 'tCO2e', '15000', '14000', ''],
+]
+
+
+def test_typed_columns_restore_every_cell():
+    table = ColumnarTable(HEADERS, ROWS, title='GHG emissions')
+    assert len(table) == 3  # the blank row is dropped
+    assert [column.typecode if not isinstance(column, tuple) else None for column in table.columns] == [
+        None, None, 'q', None, 'd'
+    ]
+    assert table.rows() == [row for row in ROWS if any(row)]
+    assert math.isnan(table.columns[4][2])
+
+
+def test_cells_that_do_not_round_trip_stay_strings():
+    table = ColumnarTable(['a', 'b', 'c'], [['007', '1.50', 'nan'], ['8', '2.5', '1.0']])
+    assert all(isinstance(column, tuple) for column in table.columns)
+    assert table.rows() == [['007', '1.50', 'nan'], ['8', '2.5', '1.0']]
+
+
+def test_legacy_dict_access():
+    table = ColumnarTable(HEADERS, ROWS, title='GHG emissions')
+    assert table[TITLE_KEY] == 'GHG emissions'
+    assert table[HEADERS_KEY] == HEADERS
+    assert table[TABLE_ROWS_KEY][1] == dict(zip(HEADERS, ROWS[1]))
+    assert table.get('missing') is None
+    assert str(table).splitlines()[:2] == ['GHG emissions', 'Scope | Unit | 2021 | 2022 | Share']
+
+
+def test_header_only_table_keeps_its_headers():
+    table = ColumnarTable(['Target', 'Year', ''], [], title='Targets')
+    assert table.headers == ('Target', 'Year')
+    assert len(table) == 0
+    assert table[HEADERS_KEY] == ['Target', 'Year']
+    assert table[TABLE_ROWS_KEY] == []
+    assert str(table) == 'Targets\nTarget | Year'
+
+    table = ColumnarTable(['Target', 'Year'], [['', '']])
+    assert table.headers == ('Target', 'Year')
+    assert str(table) == 'Target | Year'
+
+
+def test_columns_without_data_keep_their_headers():
+    table = ColumnarTable(['Site', 'Comment', ''], [['A', '', ''], ['B', '', '']])
+    assert table.headers == ('Site', 'Comment')
+    assert table.rows() == [['A', ''], ['B', '']]
+
+
+@pytest.fixture
+def merged_cell_docx(tmp_path):
+    document = docx.Document()
+    document.add_paragraph('Emissions by scope')
+    table = document.add_table(rows=3, cols=3)
+    for row, cells in zip(table.rows, [['Scope', 'Emissions', ''], ['Scope 1', '1200', ''], ['Scope 2', '800', '']]):
+        for cell, text in zip(row.cells, cells):
+            cell.text = text
+    # a header spanning two grid columns, and a data cell spanning two as well
+    table.cell(0, 1).merge(table.cell(0, 2))
+    table.cell(1, 1).merge(table.cell(1, 2))
+    table.cell(2, 1).merge(table.cell(2, 2))
+    path = tmp_path / 'merged.docx'
+    document.save(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize('pages', [None, (1, 1)])
+def test_merged_cells_are_stored_once(merged_cell_docx, pages):
+    tables = DOXCLoader.doxc_table_loader(merged_cell_docx, pages)
+    assert len(tables) == 1
+    table = tables[0]
+    assert table.headers == ('Scope', 'Emissions')
+    assert table.rows() == [['Scope 1', '1200'], ['Scope 2', '800']]
@@ -0,0 +1,119 @@
+import os
+import json
+import subprocess
+
+import numpy as np
+import PyPDF2
+import pytest
+
+from src.utils.tabula_batch import TabulaBatch, _data_frames
+
+
+RAW_JSON = [
+    {'data': []},
+    {'data': [
+        [{'text': 'Scope'}, {'text': ''}, {'text': 'Scope'}, {'text': ''}],
+        [{'text': '1'}, {'text': '1200'}, {'text': 'a'}, {'text': ''}],
+        [{'text': '2'}, {'text': '800.5'}, {'text': ''}, {'text': ''}],
+    ]},
+]
+
+
+def _json_copy():
+    return json.loads(json.dumps(RAW_JSON))
+
+
+def test_data_frames_follow_read_pdf_conventions():
+    dfs = _data_frames(_json_copy())
+    assert len(dfs) == 1
+    df = dfs[0]
+    assert list(df.columns) == ['Scope', 'Unnamed: 0', 'Scope.1', 'Unnamed: 1']
+    assert df['Scope'].tolist() == [1, 2]
+    assert df['Unnamed: 0'].tolist() == [1200., 800.5]
+    assert df['Scope.1'].tolist()[0] == 'a' and np.isnan(df['Scope.1'].tolist()[1])
+
+
+def _pdf(path, n_pages):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(n_pages):
+        writer.add_blank_page(width=200, height=200)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+def _fake_convert(fail_first_run=False, missing_java=False):
+    """Stand in for the tabula-java batch run: one table holding the page count of every PDF."""
+    runs = []
+
+    def _convert(self, input_dir):
+        runs.append(input_dir)
+        if missing_java:
+            raise FileNotFoundError("java")
+        for name in sorted(os.listdir(input_dir)):
+            if not name.endswith('.pdf'):
+                continue
+            if fail_first_run and len(runs) == 1 and name != '000000.pdf':
+                raise subprocess.CalledProcessError(1, 'java')
+            with open(os.path.join(input_dir, name), 'rb') as f:
+                n_pages = len(PyPDF2.PdfReader(f).pages)
+            raw_json = [{'data': [[{'text': 'Pages'}], [{'text': str(n_pages)}]]}]
+            with open(os.path.join(input_dir, name[:-4] + '.json'), 'w', encoding='utf-8') as f:
+                json.dump(raw_json, f)
+
+    return _convert, runs
+
+
+def _submit_reports(tmp_path):
+    batch = TabulaBatch()
+    batch.submit(_pdf(tmp_path / 'a.pdf', 3))
+    batch.submit(_pdf(tmp_path / 'b.pdf', 4), pages=(2, 3))
+    batch.submit(_pdf(tmp_path / 'c.pdf', 1))
+    return batch
+
+
+def test_run_yields_results_in_submission_order(tmp_path, monkeypatch):
+    convert, runs = _fake_convert()
+    monkeypatch.setattr(TabulaBatch, '_convert', convert)
+    batch = _submit_reports(tmp_path)
+
+    results = list(batch.run())
+    assert len(runs) == 1  # one JVM for the whole queue
+    assert [(os.path.basename(path), pages) for path, pages, _, _ in results] == [
+        ('a.pdf', None), ('b.pdf', (2, 3)), ('c.pdf', None)
+    ]
+    assert [dfs[0]['Pages'].tolist() for _, _, dfs, _ in results] == [[3], [2], [1]]
+    assert [error for *_, error in results] == [None] * 3
+    assert len(batch) == 0
+
+
+def test_batch_size_splits_the_queue(tmp_path, monkeypatch):
+    convert, runs = _fake_convert()
+    monkeypatch.setattr(TabulaBatch, '_convert', convert)
+    batch = _submit_reports(tmp_path)
+    batch._batch_size = 2
+    assert [dfs[0]['Pages'].tolist() for _, _, dfs, _ in batch.run()] == [[3], [2], [1]]
+    assert len(runs) == 2
+
+
+def test_failed_run_retries_unfinished_files(tmp_path, monkeypatch):
+    convert, runs = _fake_convert(fail_first_run=True)
+    monkeypatch.setattr(TabulaBatch, '_convert', convert)
+    results = list(_submit_reports(tmp_path).run())
+    assert [dfs[0]['Pages'].tolist() for _, _, dfs, _ in results] == [[3], [2], [1]]
+    assert len(runs) == 3  # the batch, then the two unfinished files on their own
+
+
+def test_errors_are_reported_per_file(tmp_path, monkeypatch):
+    convert, _ = _fake_convert(missing_java=True)
+    monkeypatch.setattr(TabulaBatch, '_convert', convert)
+    batch = _submit_reports(tmp_path)
+    (tmp_path / 'd.pdf').write_text('not a pdf')
+    batch.submit(str(tmp_path / 'd.pdf'), pages=(1, 1))  # fails while staging
+    results = list(batch.run())
+    assert [dfs for _, _, dfs, _ in results] == [[]] * 4
+    assert all(error.startswith('FileNotFoundError') for *_, error in results[:3])
+    assert not results[3][3].startswith('FileNotFoundError')
+
+    with pytest.raises(FileNotFoundError):
+        batch.submit(str(tmp_path / 'missing.pdf'))
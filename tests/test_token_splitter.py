@@ -0,0 +1,95 @@
+import bisect
+
+import pytest
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from src.utils.token_splitter import TokenSpanSplitter, token_char_offsets, iter_page_chunks, PAGE_JOINER
+
+
+TEXT = "\n\n".join(
+    f"Section {i}. Scope {i % 3 + 1} emissions were {i * 17} tCO2e in 2022.\n"
+    f"Energy use fell by {i}% across sites, mostly from renewable sources. " * (i % 4 + 1)
+    for i in range(12)
+)
+
+
+def _langchain_splitter(encoding, chunk_size, chunk_overlap):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=lambda text: len(encoding.encode(text, disallowed_special=())),
+    )
+
+
+@pytest.mark.parametrize('chunk_size, chunk_overlap', [(40, 4), (120, 24), (400, 0)])
+def test_split_text_matches_langchain(encoding, chunk_size, chunk_overlap):
+    splitter = TokenSpanSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, encoding=encoding)
+    expected = _langchain_splitter(encoding, chunk_size, chunk_overlap).split_text(TEXT)
+    assert splitter.split_text(TEXT) == expected
+
+
+def test_split_spans_locate_chunks(encoding):
+    splitter = TokenSpanSplitter(chunk_size=60, chunk_overlap=8, encoding=encoding)
+    for start, end in splitter.split_spans(TEXT):
+        chunk = TEXT[start:end]
+        assert chunk == chunk.strip() and chunk
+        assert len(encoding.encode(chunk)) <= 60
+
+
+def test_token_char_offsets_map_bytes_to_characters(encoding):
+    # 'é' is two bytes, so two byte tokens start at the same character
+    assert token_char_offsets("aé b", encoding).tolist() == [0, 1, 1, 2, 3]
+
+
+def test_overlap_larger_than_chunk_size(encoding):
+    with pytest.raises(ValueError):
+        TokenSpanSplitter(chunk_size=10, chunk_overlap=20, encoding=encoding)
+
+
+# every sentence is unique, so chunks can be located in the joined pages
+REPORT = "\n\n".join(
+    " ".join(f"Site {i}-{j} used {i * 31 + j} MWh, {j}% of it renewable." for j in range(i % 5 + 1))
+    + "\n" + f"Waste at site {i} fell by {i}%."
+    for i in range(24)
+)
+PAGES = [
+    (i + 1, REPORT[start:start + 300].strip())
+    for i, start in enumerate(range(0, len(REPORT), 300))
+]
+
+
+def test_iter_page_chunks_of_one_page(encoding):
+    splitter = TokenSpanSplitter(chunk_size=40, chunk_overlap=4, encoding=encoding)
+    assert list(iter_page_chunks(splitter, [(3, TEXT)])) == [
+        (chunk, 3, 3) for chunk in splitter.split_text(TEXT)
+    ]
+
+
+@pytest.mark.parametrize('chunk_size, chunk_overlap', [(40, 4), (120, 24), (400, 0)])
+def test_iter_page_chunks_cover_the_pages(encoding, chunk_size, chunk_overlap):
+    splitter = TokenSpanSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, encoding=encoding)
+    document = PAGE_JOINER.join(text for _, text in PAGES)
+    page_starts = [0]
+    for _, text in PAGES[:-1]:
+        page_starts.append(page_starts[-1] + len(text) + len(PAGE_JOINER))
+
+    covered = [False] * len(document)
+    start = 0
+    for chunk, first_page, last_page in iter_page_chunks(splitter, PAGES):
+        assert chunk == chunk.strip()
+        assert len(encoding.encode(chunk)) <= chunk_size
+        start = document.index(chunk, start)
+        end = start + len(chunk)
+        covered[start:end] = [True] * len(chunk)
+        assert first_page == PAGES[bisect.bisect_right(page_starts, start) - 1][0]
+        assert last_page == PAGES[bisect.bisect_right(page_starts, end - 1) - 1][0]
+    assert all(covered[i] for i, char in enumerate(document) if not char.isspace())
+
+
+def test_iter_page_chunks_skip_empty_pages(encoding):
+    splitter = TokenSpanSplitter(chunk_size=400, chunk_overlap=0, encoding=encoding)
+    pages = [(1, 'Scope 1 emissions.'), (2, ''), (3, 'Scope 2 emissions.')]
+    assert list(iter_page_chunks(splitter, pages)) == [
+        ('Scope 1 emissions.' + PAGE_JOINER + 'Scope 2 emissions.', 1, 3)
+    ]